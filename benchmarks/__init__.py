@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Microbenchmarks for the crypto, KDF, storage and parsing primitives.
+# Run with: python -m benchmarks.run --help
@@ -0,0 +1,40 @@
+# benchmarks/bench_crypto.py
+import io
+import os
+from core import kdf
+from core.encryption import decrypt_data, decrypt_stream, encrypt_data, encrypt_stream
+from utils.keymanager import derive_capsule_subkey, derive_key_from_password
+
+PAYLOAD_SIZES = (1024, 64 * 1024, 1024 * 1024, 16 * 1024 * 1024)
+QUICK_PAYLOAD_SIZES = (1024, 64 * 1024, 1024 * 1024)
+
+def run(suite):
+    salt = os.urandom(16)
+    # legacy default (kdf_params=None) plus each available KDF at its default cost
+    suite.measure("keymanager.derive_key_from_password[legacy]",
+                  lambda: derive_key_from_password("benchmark-password", salt), repeat=3, number=1)
+    for name in kdf.available_kdfs():
+        params = kdf.default_params(name)
+        suite.measure(f"kdf.derive[{name}]", lambda p=params: kdf.derive("benchmark-password", salt, p),
+                      params=params, repeat=3, number=1)
+
+    key = os.urandom(32)
+    suite.measure("keymanager.derive_capsule_subkey", lambda: derive_capsule_subkey(key, salt))
+
+    for size in (QUICK_PAYLOAD_SIZES if suite.quick else PAYLOAD_SIZES):
+        data = os.urandom(size)
+        params = {"bytes": size}
+        suite.measure(f"encryption.encrypt_data[{size}]", lambda d=data: encrypt_data(d, key),
+                      params=params, bytes_per_call=size)
+        nonce, blob = encrypt_data(data, key)
+        suite.measure(f"encryption.decrypt_data[{size}]", lambda n=nonce, b=blob: decrypt_data(n, b, key),
+                      params=params, bytes_per_call=size)
+        suite.measure(f"encryption.encrypt_stream[{size}]",
+                      lambda d=data: encrypt_stream(d, io.BytesIO(), key),
+                      params=params, bytes_per_call=size)
+        out = io.BytesIO()
+        encrypt_stream(data, out, key)
+        sealed = out.getvalue()
+        suite.measure(f"encryption.decrypt_stream[{size}]",
+                      lambda s=sealed: decrypt_stream(s, io.BytesIO(), key),
+                      params=params, bytes_per_call=size)
@@ -0,0 +1,13 @@
+# benchmarks/bench_parsing.py
+from core.metadata import parse_unlock_time
+
+CASES = {
+    "relative": "3d",
+    "absolute": "2030-08-09 14:00",
+    "absolute_iso": "2030-08-09T14:00:00",
+}
+
+def run(suite):
+    for label, text in CASES.items():
+        suite.measure(f"metadata.parse_unlock_time[{label}]", lambda t=text: parse_unlock_time(t),
+                      params={"input": text})
@@ -0,0 +1,48 @@
+# benchmarks/bench_startup.py
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules a headless command must not load; they are imported only for capture/display.
+HEAVY_MODULES = ("cv2", "numpy", "PIL", "tkinter")
+CASES = {
+    "interpreter": "pass",
+    "import_main": "import main",
+    "import_scheduler": "import core.scheduler",
+    "import_storage": "import core.storage",
+}
+
+def _python(code: str):
+    # -E: ignore PYTHON* environment variables, so runs are comparable
+    subprocess.run([sys.executable, "-E", "-c", code], cwd=REPO_ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def heavy_modules_loaded(module: str) -> list:
+    """Which HEAVY_MODULES importing `module` drags in (checked in a fresh interpreter)."""
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([m for m in {list(HEAVY_MODULES)!r} if m in sys.modules]))")
+    out = subprocess.run([sys.executable, "-E", "-c", code], cwd=REPO_ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def run(suite):
+    for label, code in CASES.items():
+        name = f"startup.{label}"
+        if not suite.wants(name):
+            continue
+        params = {"code": code}
+        if code.startswith("import "):
+            heavy = heavy_modules_loaded(code.split()[1])
+            params["heavy_modules"] = heavy
+            if heavy:
+                print(f"warning: {code!r} loads {', '.join(heavy)} at import time")
+        # cold start of a fresh interpreter each call; one call per sample
+        suite.measure(name, lambda c=code: _python(c), params=params, repeat=7, number=1)
+    name = "startup.cli_help"
+    if suite.wants(name):
+        suite.measure(name, lambda: subprocess.run(
+            [sys.executable, "-E", "main.py", "help"], cwd=REPO_ROOT, check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ), params={"argv": ["main.py", "help"]}, repeat=7, number=1)
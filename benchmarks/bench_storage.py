@@ -0,0 +1,60 @@
+# benchmarks/bench_storage.py
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from core import storage
+
+VAULT_SIZES = (10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+QUICK_VAULT_SIZES = (10 ** 2, 10 ** 3, 10 ** 4)
+SAVE_SIZES = (1024, 256 * 1024, 4 * 1024 * 1024)
+# Share of capsules already due when load_locked_capsules runs.
+DUE_FRACTION = 0.01
+
+def _populate(engine, count: int):
+    """Fill a vault with `count` locked capsule rows (metadata only), DUE_FRACTION of them due."""
+    now = int(time.time())
+    due = max(1, int(count * DUE_FRACTION))
+    rows = (
+        (f"capsule {i}", now - 60 - i if i < due else now + 3600 + i, "text",
+         f"inline:{i + 1}", os.urandom(16), os.urandom(12))
+        for i in range(count)
+    )
+    with engine.transaction() as conn:
+        conn.executemany("""
+            INSERT INTO capsules (title, unlock_time, type, file_path, salt, nonce, status)
+            VALUES (?, ?, ?, ?, ?, ?, 'locked')
+        """, rows)
+    engine.connection().execute("ANALYZE")
+
+def run(suite):
+    with tempfile.TemporaryDirectory(prefix="epoch-capsule-bench-") as scratch:
+        scratch = Path(scratch)
+        try:
+            _run(suite, scratch)
+        finally:
+            storage.configure()  # back to the default vault
+
+def _run(suite, scratch: Path):
+    key, salt = os.urandom(32), os.urandom(16)
+    engine = storage.configure(scratch / "save.db", scratch / "save_files")
+    for size in SAVE_SIZES:
+        # random bytes: the compression probe skips them, so this is storage + encryption cost
+        data = os.urandom(size)
+        suite.measure(f"storage.save_capsule[{size}]",
+                      lambda d=data: storage.save_capsule("bench", datetime(2100, 1, 1), "text", d, key, salt),
+                      params={"bytes": size}, bytes_per_call=size)
+    engine.close()
+
+    for count in (QUICK_VAULT_SIZES if suite.quick else VAULT_SIZES):
+        name = f"storage.load_locked_capsules[{count}]"
+        if not suite.wants(name):
+            continue
+        engine = storage.configure(scratch / f"vault-{count}.db", scratch / f"files-{count}")
+        _populate(engine, count)
+        suite.measure(name, storage.load_locked_capsules,
+                      params={"vault_size": count, "due": max(1, int(count * DUE_FRACTION))})
+        suite.measure(f"storage.next_unlock_time[{count}]", storage.next_unlock_time,
+                      params={"vault_size": count})
+        engine.close()
@@ -0,0 +1,114 @@
+# benchmarks/harness.py
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional
+
+class Suite:
+    """Collects benchmark results; each bench_* module adds to one with measure()."""
+
+    def __init__(self, quick: bool = False, pattern: Optional[str] = None):
+        self.quick = quick
+        self.pattern = pattern
+        self.results: List[Dict[str, Any]] = []
+
+    def wants(self, name: str) -> bool:
+        return self.pattern is None or self.pattern in name
+
+    def measure(self, name: str, fn: Callable[[], Any], params: Dict[str, Any] = None,
+                repeat: int = 5, number: int = None, bytes_per_call: int = None):
+        """
+        Time `fn` like timeit: `number` calls per sample (auto-ranged to >= 0.2 s
+        if not given), `repeat` samples. Seconds are per call.
+        """
+        if not self.wants(name):
+            return
+        if self.quick:
+            repeat = min(repeat, 3)
+        timer = timeit.Timer(fn)
+        if number is None:
+            number, _ = timer.autorange()
+        samples = [t / number for t in timer.repeat(repeat, number)]
+        result = {
+            "name": name,
+            "params": params or {},
+            "number": number,
+            "repeat": repeat,
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        if bytes_per_call:
+            result["mb_per_s"] = bytes_per_call / result["median"] / 1e6
+        self.results.append(result)
+        extra = f"  {result['mb_per_s']:9.1f} MB/s" if bytes_per_call else ""
+        print(f"{name:<56} {_fmt_seconds(result['median']):>10}  ±{_fmt_seconds(result['stdev'])}{extra}")
+
+def _fmt_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+def environment() -> Dict[str, Any]:
+    """What the numbers depend on, recorded with every result file."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "cryptography": _package_version("cryptography"),
+        "zstandard": _package_version("zstandard"),
+        "git_commit": commit,
+    }
+
+def compare(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float = 0.15):
+    """
+    Compare medians with a baseline run. Returns (rows, regressions) where each row
+    is (name, baseline s, current s, ratio, verdict) for benchmarks present in both.
+    """
+    base = {r["name"]: r for r in baseline}
+    rows, regressions = [], []
+    for r in current:
+        b = base.get(r["name"])
+        if b is None:
+            continue
+        ratio = r["median"] / b["median"] if b["median"] else float("inf")
+        if ratio > 1 + threshold:
+            verdict = "REGRESSION"
+            regressions.append(r["name"])
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = "ok"
+        rows.append((r["name"], b["median"], r["median"], ratio, verdict))
+    return rows, regressions
+
+def print_comparison(rows):
+    print(f"\n{'benchmark':<56} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, before, after, ratio, verdict in rows:
+        print(f"{name:<56} {_fmt_seconds(before):>10} {_fmt_seconds(after):>10} {ratio:6.2f}x  {verdict}")
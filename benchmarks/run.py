@@ -0,0 +1,57 @@
+# benchmarks/run.py
+import argparse
+import json
+import sys
+from benchmarks import bench_crypto, bench_parsing, bench_startup, bench_storage
+from benchmarks.harness import Suite, compare, environment, print_comparison
+
+MODULES = {
+    "crypto": bench_crypto,
+    "storage": bench_storage,
+    "parsing": bench_parsing,
+    "startup": bench_startup,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Run the microbenchmarks headless on synthetic data and a scratch vault.",
+    )
+    parser.add_argument("--only", choices=sorted(MODULES), action="append",
+                        help="Run only these groups (repeatable; default: all)")
+    parser.add_argument("--filter", default=None, help="Run only benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true",
+                        help="Smaller payloads and vaults (up to 10^4 capsules) and fewer repeats")
+    parser.add_argument("--output", "-o", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, metavar="BASELINE",
+                        help="Compare against a previous --output file; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown of the median counted as a regression (default 0.15)")
+    args = parser.parse_args(argv)
+
+    suite = Suite(quick=args.quick, pattern=args.filter)
+    for group in args.only or MODULES:
+        print(f"== {group} ==")
+        MODULES[group].run(suite)
+
+    report = {"environment": environment(), "quick": args.quick, "results": suite.results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {len(suite.results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(suite.results, baseline["results"], args.threshold)
+        print_comparison(rows)
+        if baseline.get("environment", {}).get("machine") != report["environment"]["machine"]:
+            print("Note: the baseline was recorded on a different machine type.")
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
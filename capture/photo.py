@@ -1,17 +1,18 @@
 import cv2
-import tempfile
-import os
+from capture.pipeline import encode_photo
+from capture.source import open_source
 
-def capture_photo(retake_allowed=True, resolution=(640, 480)):
+def capture_photo(retake_allowed=True, resolution=(640, 480), source=None):
     """
     Captures a photo from webcam and returns it as JPEG bytes.
     Press 's' to save, 'r' to retake, 'q' to quit/cancel.
+    `source` is a FrameSource or source spec (see capture.source.open_source).
     """
     final_photo_bytes = None
 
     while True:
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+        cap = open_source(source)
+        if not cap.is_opened():
             raise RuntimeError("Could not open camera.")
 
         print("[INFO] Press 's' to save, 'r' to retake, 'q' to cancel.")
@@ -28,16 +29,8 @@ def capture_photo(retake_allowed=True, resolution=(640, 480)):
         cv2.destroyAllWindows()
 
         if key == ord('s'):
-            # Save to temp and read bytes
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_path = temp_file.name
-            temp_file.close()  # <-- Ensure file is closed before writing
-            cv2.imwrite(temp_path, frame)
-
-            with open(temp_path, "rb") as f:
-                final_photo_bytes = f.read()
-
-            os.remove(temp_path)
+            # Encode in memory; nothing is written to disk
+            final_photo_bytes = encode_photo(frame)
             break
         elif key == ord('r') and retake_allowed:
             continue
@@ -45,4 +38,4 @@ def capture_photo(retake_allowed=True, resolution=(640, 480)):
             print("Photo capture cancelled.")
             break
 
-    return final_photo_bytes
\ No newline at end of file
+    return final_photo_bytes
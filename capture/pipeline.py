@@ -0,0 +1,59 @@
+# capture/pipeline.py
+import cv2
+from utils.secure_temp import open_secure_temp_file, secure_delete
+
+def encode_photo(frame, quality: int = 90) -> bytes:
+    """Encode a BGR frame as JPEG entirely in memory."""
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("Failed to encode photo.")
+    return buf.tobytes()
+
+class MemoryVideoSink:
+    """
+    A file path cv2.VideoWriter can write to whose data lives in anonymous memory
+    where possible (a memfd on Linux, see utils.secure_temp), so no plaintext
+    touches the disk. Elsewhere it falls back to tmpfs or a restricted-permission
+    temp file. The data is destroyed by close().
+    """
+
+    def __init__(self, suffix: str = ".mp4"):
+        f, self.path = open_secure_temp_file(suffix=suffix)
+        f.close()
+
+    def read(self) -> bytes:
+        """The encoded bytes; call after the VideoWriter has been released."""
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        if self.path is not None:
+            secure_delete(self.path)
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def encode_video(frames, fps: float, resolution) -> bytes:
+    """
+    Encode an iterable of BGR frames to MP4 in memory. Frames of another size are
+    resized to `resolution`. Returns b"" if there were no frames.
+    """
+    with MemoryVideoSink(".mp4") as sink:
+        out = cv2.VideoWriter(sink.path, cv2.VideoWriter_fourcc(*'mp4v'), fps, resolution)
+        if not out.isOpened():
+            out.release()
+            raise RuntimeError("Unable to open video writer with OpenCV. Your system may lack codec support.")
+        count = 0
+        try:
+            for frame in frames:
+                if (frame.shape[1], frame.shape[0]) != tuple(resolution):
+                    frame = cv2.resize(frame, resolution)
+                out.write(frame)
+                count += 1
+        finally:
+            out.release()
+        return sink.read() if count else b""
@@ -0,0 +1,117 @@
+# capture/source.py
+import abc
+import os
+import re
+import time
+import cv2
+
+class FrameSource(abc.ABC):
+    """
+    Where capture frames come from. read() returns (ok, BGR frame) like
+    cv2.VideoCapture.read(); `fps` is the nominal rate (0 if unknown).
+    """
+    fps = 0.0
+
+    @abc.abstractmethod
+    def read(self):
+        """Return (ok, BGR frame); ok is False once the source is exhausted."""
+
+    def is_opened(self) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class _OpenCVSource(FrameSource):
+    def __init__(self, target):
+        self.cap = cv2.VideoCapture(target)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+    def read(self):
+        return self.cap.read()
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+class WebcamSource(_OpenCVSource):
+    """A local camera, by OpenCV device index."""
+
+    def __init__(self, index: int = 0):
+        super().__init__(index)
+
+class VideoFileSource(_OpenCVSource):
+    """Frames from a video file, optionally looping forever."""
+
+    def __init__(self, path: str, loop: bool = False):
+        super().__init__(path)
+        self.loop = loop
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+class SyntheticSource(FrameSource):
+    """
+    Generated test pattern (scrolling gradient), for headless runs and benchmarks.
+    Ends after `max_frames` if given; with `realtime` it is paced to `fps` like a camera.
+    """
+
+    def __init__(self, resolution=(640, 480), fps: float = 30.0, max_frames: int = None,
+                 realtime: bool = False):
+        import numpy as np
+        width, height = resolution
+        self.fps = fps
+        self.max_frames = max_frames
+        self.realtime = realtime
+        self._count = 0
+        self._next_due = None
+        x = np.linspace(0, 255, width, dtype=np.uint8)
+        y = np.linspace(0, 255, height, dtype=np.uint8)
+        self._base = np.dstack([
+            np.tile(x, (height, 1)),
+            np.tile(y[:, None], (1, width)),
+            np.full((height, width), 128, dtype=np.uint8),
+        ])
+
+    def read(self):
+        import numpy as np
+        if self.max_frames is not None and self._count >= self.max_frames:
+            return False, None
+        if self.realtime:
+            now = time.perf_counter()
+            if self._next_due is not None and now < self._next_due:
+                time.sleep(self._next_due - now)
+            self._next_due = max(now, self._next_due or now) + 1.0 / self.fps
+        frame = np.roll(self._base, self._count * 4, axis=1)
+        self._count += 1
+        return True, frame
+
+def open_source(spec=None) -> FrameSource:
+    """
+    Build a FrameSource from a spec: a camera index ("0"), "synthetic[:WxH[@FPS]]",
+    or a video file path. Defaults to $EPOCH_CAPSULE_SOURCE, else camera 0.
+    """
+    if spec is None:
+        spec = os.environ.get("EPOCH_CAPSULE_SOURCE", "0")
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or str(spec).isdigit():
+        return WebcamSource(int(spec))
+    match = re.fullmatch(r"synthetic(?::(\d+)x(\d+))?(?:@([\d.]+))?", str(spec))
+    if match:
+        width, height, fps = match.groups()
+        resolution = (int(width), int(height)) if width else (640, 480)
+        return SyntheticSource(resolution, fps=float(fps or 30.0), realtime=True)
+    return VideoFileSource(str(spec))
@@ -0,0 +1,63 @@
+# capture/thumbnail.py
+from typing import Optional
+import cv2
+import numpy as np
+from capture.pipeline import MemoryVideoSink, encode_photo
+
+PHOTO_THUMB_SIZE = (320, 240)   # bounding box; aspect ratio is kept
+STRIP_FRAMES = 4                # poster frames sampled across a video
+STRIP_FRAME_SIZE = (160, 120)
+THUMB_QUALITY = 80
+
+def _fit(frame, box):
+    h, w = frame.shape[:2]
+    scale = min(box[0] / w, box[1] / h, 1.0)
+    if scale >= 1.0:
+        return frame
+    return cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+def photo_thumbnail(data: bytes) -> Optional[bytes]:
+    """JPEG thumbnail of an encoded photo, decoded at reduced resolution where possible."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(buf, cv2.IMREAD_REDUCED_COLOR_2)
+    if img is None:
+        return None
+    return encode_photo(_fit(img, PHOTO_THUMB_SIZE), THUMB_QUALITY)
+
+def video_poster_strip(data: bytes) -> Optional[bytes]:
+    """
+    JPEG strip of STRIP_FRAMES frames sampled evenly across an encoded video,
+    side by side. The video is read from anonymous memory, never from disk.
+    """
+    with MemoryVideoSink(".mp4") as sink:
+        with open(sink.path, "wb") as f:
+            f.write(data)
+        cap = cv2.VideoCapture(sink.path)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            positions = [int(total * (i + 0.5) / STRIP_FRAMES) for i in range(STRIP_FRAMES)] if total else [0]
+            frames = []
+            for pos in positions:
+                if pos:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+                ret, frame = cap.read()
+                if ret:
+                    frames.append(cv2.resize(frame, STRIP_FRAME_SIZE, interpolation=cv2.INTER_AREA))
+        finally:
+            cap.release()
+    if not frames:
+        return None
+    return encode_photo(np.hstack(frames), THUMB_QUALITY)
+
+def make_thumbnail(capsule_type: str, content) -> Optional[bytes]:
+    """
+    Preview image for a capsule: a small JPEG for photos, a poster-frame strip
+    for videos, None for other types (or content given as a stream).
+    """
+    if not isinstance(content, (bytes, bytearray)):
+        return None
+    if capsule_type == "photo":
+        return photo_thumbnail(bytes(content))
+    if capsule_type == "video":
+        return video_poster_strip(bytes(content))
+    return None
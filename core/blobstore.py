@@ -0,0 +1,196 @@
+# core/blobstore.py
+import hashlib
+import io
+import os
+import sqlite3
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+# Size tiers for encrypted capsule blobs:
+#   <= INLINE_MAX      stored inline in SQLite (capsule_blobs table)
+#   <= PACK_MAX        appended to a shared pack file, located by offset/length
+#   larger            own file in a hash-sharded tree keyed by capsule id
+INLINE_MAX = 4 * 1024
+PACK_MAX = 1024 * 1024
+PACK_FILE_MAX = 256 * 1024 * 1024
+
+# Locators stored in capsules.file_path: "inline:<capsule id>",
+# "pack:<pack file>:<offset>:<length>". Anything else is a file path, either
+# relative to the blob root (sharded blobs) or absolute (legacy per-title files).
+INLINE_PREFIX = "inline:"
+PACK_PREFIX = "pack:"
+
+# Digest of each ciphertext, computed while it is written and stored with the
+# capsule, so a vault can be verified without any password (see core.scrub).
+DIGEST = hashlib.sha256
+
+class _RangeReader(io.RawIOBase):
+    """Read-only view of [offset, offset + length) of an open pack file."""
+
+    def __init__(self, f: BinaryIO, offset: int, length: int):
+        self._f = f
+        self._f.seek(offset)
+        self._remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self._remaining)
+        if n <= 0:
+            return 0
+        data = self._f.read(n)
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+class BlobWriter:
+    """
+    Write target for one capsule's ciphertext. Data is buffered in memory up to
+    PACK_MAX, then spilled to a partial file in the capsule's shard, so memory
+    stays bounded whatever the capsule size. seal() moves a spilled blob into its
+    shard; one still in memory is put inline or in a pack by BlobStore.place()
+    when it is published. The DIGEST of everything written is kept as it goes
+    (see digest()).
+    """
+
+    def __init__(self, store: "BlobStore", capsule_id: int):
+        self._store = store
+        self._capsule_id = capsule_id
+        self._buf = io.BytesIO()
+        self._file = None
+        self._partial = None
+        self._hash = DIGEST()
+        self.size = 0
+
+    def write(self, data) -> int:
+        if self._file is None and self.size + len(data) > PACK_MAX:
+            self._spill()
+        (self._file or self._buf).write(data)
+        self._hash.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def digest(self) -> bytes:
+        """DIGEST of the ciphertext written so far."""
+        return self._hash.digest()
+
+    def _spill(self):
+        final = self._store.shard_path(self._capsule_id)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        self._partial = final.with_name(final.name + ".partial")
+        self._file = open(self._partial, "wb")
+        self._file.write(self._buf.getbuffer())
+        self._buf = None
+
+    def seal(self) -> Optional[str]:
+        """
+        Finish the part that needs no database: a spilled blob is flushed and moved
+        into its shard, and its locator returned. Returns None for a blob still in
+        memory (see data()), which place() later puts inline or in a pack.
+        """
+        if self._file is None:
+            return None
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self._partial, self._store.shard_path(self._capsule_id))
+        return self._store.shard_path(self._capsule_id).relative_to(self._store.root).as_posix()
+
+    def data(self) -> bytes:
+        """The ciphertext of a blob that was not spilled."""
+        return self._buf.getvalue()
+
+    def abort(self):
+        """Discard whatever was written (the shard file too if seal() already moved it there)."""
+        if self._file is not None:
+            self._file.close()
+            Path(self._partial).unlink(missing_ok=True)
+            self._store.shard_path(self._capsule_id).unlink(missing_ok=True)
+
+class BlobStore:
+    """
+    Size-tiered store for encrypted capsule blobs under `root`
+    (see INLINE_MAX / PACK_MAX for the tiers).
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.packs_path = self.root / "packs"
+        self.shards_path = self.root / "shards"
+
+    def shard_path(self, capsule_id: int) -> Path:
+        digest = hashlib.sha256(str(capsule_id).encode()).hexdigest()
+        return self.shards_path / digest[:2] / digest[2:4] / f"{capsule_id}.tccap"
+
+    def writer(self, capsule_id: int) -> BlobWriter:
+        return BlobWriter(self, capsule_id)
+
+    def place(self, capsule_id: int, data: bytes, conn: sqlite3.Connection) -> str:
+        """
+        Store an in-memory ciphertext inline or in a pack file, whichever tier fits;
+        returns its locator. Call inside the transaction that records the locator.
+        """
+        if len(data) <= INLINE_MAX:
+            conn.execute("INSERT OR REPLACE INTO capsule_blobs (capsule_id, data) VALUES (?, ?)",
+                         (capsule_id, data))
+            return f"{INLINE_PREFIX}{capsule_id}"
+        return self.append_to_pack(data)
+
+    def append_to_pack(self, data: bytes) -> str:
+        """Append to the newest pack file (rolling over at PACK_FILE_MAX); returns the locator."""
+        self.packs_path.mkdir(parents=True, exist_ok=True)
+        packs = sorted(self.packs_path.glob("pack-*.pack"))
+        if packs and packs[-1].stat().st_size + len(data) <= PACK_FILE_MAX:
+            pack = packs[-1]
+        else:
+            number = int(packs[-1].stem.split("-")[1]) + 1 if packs else 1
+            pack = self.packs_path / f"pack-{number:06d}.pack"
+        with open(pack, "ab") as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return f"{PACK_PREFIX}{pack.name}:{offset}:{len(data)}"
+
+    def locate(self, locator: str) -> Tuple[str, Optional[Path], Optional[int], Optional[int]]:
+        """
+        Split a locator into (tier, path, offset, length): ("inline", None, None, None),
+        ("pack", pack file, offset, length) or ("file", path, None, None).
+        """
+        if locator.startswith(INLINE_PREFIX):
+            return "inline", None, None, None
+        if locator.startswith(PACK_PREFIX):
+            name, offset, length = locator[len(PACK_PREFIX):].rsplit(":", 2)
+            return "pack", self.packs_path / name, int(offset), int(length)
+        return "file", self.resolve_path(locator), None, None
+
+    def resolve_path(self, locator: str) -> Optional[Path]:
+        """Filesystem path backing a locator (the pack file for packed blobs; None if inline)."""
+        if locator.startswith(INLINE_PREFIX):
+            return None
+        if locator.startswith(PACK_PREFIX):
+            return self.packs_path / locator[len(PACK_PREFIX):].split(":")[0]
+        path = Path(locator)
+        return path if path.is_absolute() else self.root / path
+
+    def open(self, locator: str, conn: sqlite3.Connection) -> BinaryIO:
+        """
+        Open a blob for streaming reads, whatever its tier.
+        Raises FileNotFoundError if it is missing.
+        """
+        if locator.startswith(INLINE_PREFIX):
+            capsule_id = int(locator[len(INLINE_PREFIX):])
+            row = conn.execute("SELECT data FROM capsule_blobs WHERE capsule_id = ?", (capsule_id,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"inline blob for capsule {capsule_id}")
+            return io.BytesIO(row[0])
+        if locator.startswith(PACK_PREFIX):
+            name, offset, length = locator[len(PACK_PREFIX):].rsplit(":", 2)
+            return io.BufferedReader(_RangeReader(open(self.packs_path / name, "rb"), int(offset), int(length)))
+        return open(self.resolve_path(locator), "rb")
@@ -0,0 +1,152 @@
+# core/compression.py
+import io
+import zlib
+
+# Optional: zstd is faster and compresses better than zlib when installed.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NONE = "none"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+# Capsule types whose payloads are already compressed (JPEG, MP4).
+_PRECOMPRESSED_TYPES = ("photo", "video")
+PROBE_SIZE = 64 * 1024
+# Skip compression unless the probe shrinks by at least this much.
+MIN_SAVING = 0.10
+_READ_SIZE = 64 * 1024
+
+def available_codecs() -> list:
+    return [NONE, ZLIB] + ([ZSTD] if zstandard is not None else [])
+
+def _compressor(codec: str):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if codec == ZLIB:
+        return zlib.compressobj(6)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+def _decompressor(codec: str):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("This capsule is zstd-compressed; install the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    if codec == ZLIB:
+        return zlib.decompressobj()
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+def choose_codec(capsule_type: str, sample: bytes) -> str:
+    """
+    Pick a codec for a payload from its capsule type and a sample of its start.
+    Already-compressed media and samples that barely shrink are stored as-is.
+    """
+    if capsule_type in _PRECOMPRESSED_TYPES or capsule_type.startswith("image") or not sample:
+        return NONE
+    if len(zlib.compress(sample, 1)) > len(sample) * (1 - MIN_SAVING):
+        return NONE
+    return ZSTD if zstandard is not None else ZLIB
+
+class _CompressingReader(io.RawIOBase):
+    """Readable stream yielding `codec`-compressed bytes of `src` (which starts with `head`)."""
+
+    def __init__(self, head: bytes, src, codec: str):
+        self._pending = [head] if head else []
+        self._src = src
+        self._compressor = _compressor(codec)
+        self._buf = bytearray()
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while len(self._buf) < len(b) and not self._done:
+            chunk = self._pending.pop() if self._pending else self._src.read(_READ_SIZE)
+            if chunk:
+                self._buf += self._compressor.compress(chunk)
+            else:
+                self._buf += self._compressor.flush()
+                self._done = True
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        del self._buf[:n]
+        return n
+
+class _Passthrough(io.RawIOBase):
+    """Replays the probed head, then the rest of `src`, unchanged."""
+
+    def __init__(self, head: bytes, src):
+        self._head = io.BytesIO(head)
+        self._src = src
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._head.read(len(b)) or self._src.read(len(b)) or b""
+        b[:len(data)] = data
+        return len(data)
+
+def compress_stream(content, capsule_type: str):
+    """
+    Wrap a payload (bytes or readable binary stream) in the compression stage.
+    Returns (readable stream, codec name) for encrypt_stream and the capsule row.
+    """
+    src = io.BytesIO(content) if isinstance(content, (bytes, bytearray, memoryview)) else content
+    head = src.read(PROBE_SIZE) or b""
+    codec = choose_codec(capsule_type, head)
+    if codec == NONE:
+        return io.BufferedReader(_Passthrough(head, src)), NONE
+    return io.BufferedReader(_CompressingReader(head, src, codec)), codec
+
+class DecompressingWriter:
+    """
+    Writable stream that decompresses into `dst`. close() checks the compressed
+    stream was complete, so truncation is reported rather than silently ignored.
+    """
+
+    def __init__(self, dst, codec: str):
+        self._dst = dst
+        self._decompressor = _decompressor(codec)
+
+    def write(self, data) -> int:
+        out = self._decompressor.decompress(data)
+        if out:
+            self._dst.write(out)
+        return len(data)
+
+    def close(self):
+        if hasattr(self._decompressor, "flush"):
+            tail = self._decompressor.flush()
+            if tail:
+                self._dst.write(tail)
+        if not getattr(self._decompressor, "eof", True):
+            raise ValueError("Compressed capsule payload is truncated.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+
+class _NoClose:
+    def __init__(self, dst):
+        self.write = dst.write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def decompressing_writer(dst, codec: str):
+    """Writable stream for decrypted payload bytes; passes `dst` through for codec 'none'."""
+    if not codec or codec == NONE:
+        return _NoClose(dst)
+    return DecompressingWriter(dst, codec)
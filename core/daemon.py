@@ -0,0 +1,286 @@
+# core/daemon.py
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from core.scheduler import check_and_unlock
+from core.storage import count_capsules, get_engine, list_capsules
+from core.wakeup import WakeupListener
+from utils import metrics
+
+# Upcoming locked capsules the daemon keeps in memory; refreshed after every check
+# and whenever a capsule is created, so requests are answered without the database.
+SCHEDULE_WINDOW = 1000
+MAX_REQUEST = 64 * 1024
+
+def socket_path(db_path=None) -> Path:
+    """Control socket of the daemon serving the vault at `db_path` (default vault if None)."""
+    db_path = Path(db_path or get_engine().db_path)
+    return db_path.with_name(db_path.name + ".sock")
+
+def _capsule_json(cap: dict) -> dict:
+    return {
+        "id": cap["id"],
+        "title": cap["title"],
+        "type": cap["type"],
+        "unlock_time": cap["unlock_time"].isoformat() if cap["unlock_time"] else None,
+    }
+
+class UnlockDaemon:
+    """
+    asyncio version of the autounlock loop.
+    Keeps the upcoming schedule in memory and sleeps until the next capsule is due,
+    woken early by new capsules (core.wakeup) or control requests. Unlocking (KDF,
+    decryption, display) and database reads run on executor threads, so the event
+    loop keeps answering the Unix-socket control API meanwhile:
+        {"cmd": "ping" | "due" | "next" | "notify" | "check" | "stats", "limit": N}
+    one JSON object per line in, one per line out.
+    """
+
+    def __init__(self, poll_interval_seconds: int = 60, auto_password: str = None,
+                 workers: Optional[int] = None, pool: str = "process",
+                 metrics_file: Optional[str] = None, metrics_port: Optional[int] = None):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.auto_password = auto_password
+        self.workers = workers
+        self.pool = pool
+        self.metrics_file = metrics_file
+        self.metrics_port = metrics_port
+        self.db_path = get_engine().db_path
+        self.socket_path = socket_path(self.db_path)
+        self.schedule = []       # locked capsules ordered by unlock time (first SCHEDULE_WINDOW)
+        self.locked_total = 0
+        self.started = time.time()
+        self.checks = 0
+        self.unlocked = 0
+        self.last_check = None
+        self.last_error = None
+        # One thread for unlocking (checks never overlap; batch unlock has its own pool)
+        # and a couple for the schedule queries.
+        self._unlock_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="unlock")
+        self._db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="schedule")
+        self._wake = None
+        self._force_check = False
+        self._retry_ids = set()  # still due after the last check; retried every poll interval
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            print("\n[autounlock] Stopped.")
+
+    async def _main(self):
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            # SIGTERM (service managers, kill) shuts down cleanly like Ctrl-C
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, AttributeError):
+            pass
+        if self.metrics_file or self.metrics_port:
+            metrics.enable()
+        control = await self._start_control_server()
+        server_http = metrics.serve_http(self.metrics_port) if self.metrics_port else None
+        listener = WakeupListener(self.db_path)
+        loop.add_reader(listener.fileno(), self._on_wakeup, listener)
+        print(f"[autounlock] Daemon started (control socket: {self.socket_path if control else 'unavailable'}). "
+              f"Ctrl-C to stop.")
+        try:
+            await self._reload()
+            while True:
+                self._wake.clear()
+                if self._force_check or any(cap["id"] not in self._retry_ids for cap in self.due()):
+                    self._force_check = False
+                    await self._check()
+                    self._retry_ids = {cap["id"] for cap in self.due()}
+                if self.metrics_file:
+                    self._write_metrics()
+                await self._sleep()
+        finally:
+            loop.remove_reader(listener.fileno())
+            listener.close()
+            if control is not None:
+                control.close()
+                try:
+                    self.socket_path.unlink()
+                except OSError:
+                    pass
+            if server_http is not None:
+                server_http.shutdown()
+            self._db_executor.shutdown(wait=False)
+            self._unlock_executor.shutdown(wait=False)
+
+    async def _sleep(self):
+        """Sleep until the next capsule is due, a wake-up, or at most the poll interval."""
+        timeout = self.poll_interval_seconds
+        upcoming = self.upcoming(1)
+        until_due = (upcoming[0]["unlock_time"] - datetime.now()).total_seconds() if upcoming else -1
+        metrics.set_gauge("autounlock_next_due_seconds", until_due)
+        if upcoming:
+            # small margin so we wake just after the due second rather than just before it
+            timeout = max(0.0, min(timeout, until_due + 0.05))
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            # a full poll interval retries failed capsules and catches ones created
+            # without a wake-up, like the blocking loop did
+            self._force_check = timeout >= self.poll_interval_seconds
+
+    def _on_wakeup(self, listener: WakeupListener):
+        listener.drain()
+        print("[autounlock] New capsule created; rescheduling.")
+        asyncio.get_running_loop().create_task(self._reload_and_wake())
+
+    async def _reload_and_wake(self):
+        await self._reload()
+        self._wake.set()
+
+    async def _reload(self):
+        loop = asyncio.get_running_loop()
+        try:
+            schedule = await loop.run_in_executor(
+                self._db_executor, lambda: list_capsules(status="locked", limit=SCHEDULE_WINDOW)
+            )
+            locked_total = await loop.run_in_executor(self._db_executor, lambda: count_capsules(status="locked"))
+        except Exception as e:
+            self.last_error = f"schedule reload failed: {e}"
+            print(f"[autounlock] {self.last_error}")
+            return
+        self.schedule = [cap for cap in schedule if cap["unlock_time"] is not None]
+        self.locked_total = locked_total
+
+    async def _check(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self.unlocked += await loop.run_in_executor(
+                self._unlock_executor,
+                lambda: check_and_unlock(auto_password=self.auto_password, workers=self.workers, pool=self.pool),
+            )
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"check failed: {e}"
+            print(f"[autounlock] Error during check_and_unlock: {e}")
+        self.checks += 1
+        self.last_check = datetime.now()
+        metrics.inc("autounlock_checks_total")
+        await self._reload()
+
+    def _write_metrics(self):
+        try:
+            metrics.write_textfile(self.metrics_file)
+        except OSError as e:
+            print(f"[autounlock] Could not write metrics file: {e}")
+
+    def due(self) -> list:
+        now = datetime.now()
+        return [cap for cap in self.schedule if cap["unlock_time"] <= now]
+
+    def upcoming(self, limit: int = 10) -> list:
+        now = datetime.now()
+        return [cap for cap in self.schedule if cap["unlock_time"] > now][:limit]
+
+    def stats(self) -> dict:
+        upcoming = self.upcoming(1)
+        return {
+            "pid": os.getpid(),
+            "db_path": str(self.db_path),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "locked": self.locked_total,
+            "due": len(self.due()),
+            "next_unlock_time": upcoming[0]["unlock_time"].isoformat() if upcoming else None,
+            "checks": self.checks,
+            "unlocked": self.unlocked,
+            "last_check": self.last_check.isoformat() if self.last_check else None,
+            "last_error": self.last_error,
+        }
+
+    # --- control socket ---
+
+    async def _start_control_server(self):
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        if self.socket_path.exists():
+            if query_daemon("ping", db_path=self.db_path) is not None:
+                raise RuntimeError(f"An autounlock daemon is already serving {self.db_path}.")
+            self.socket_path.unlink()  # stale, from a daemon that did not exit cleanly
+        old_umask = os.umask(0o077)  # socket usable by this user only
+        try:
+            return await asyncio.start_unix_server(self._handle_client, path=str(self.socket_path),
+                                                   limit=MAX_REQUEST)
+        finally:
+            os.umask(old_umask)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than the stream limit: the framing is lost, so answer and hang up
+                    writer.write(json.dumps({"ok": False, "error": "request too long"}).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    response = await self._dispatch(json.loads(line[:MAX_REQUEST]))
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: dict) -> dict:
+        cmd = request.get("cmd")
+        limit = int(request.get("limit", 10))
+        if cmd == "ping":
+            return {"ok": True}
+        if cmd == "due":
+            return {"ok": True, "capsules": [_capsule_json(c) for c in self.due()[:limit]]}
+        if cmd == "next":
+            return {"ok": True, "capsules": [_capsule_json(c) for c in self.upcoming(limit)]}
+        if cmd == "notify":
+            await self._reload()
+            self._wake.set()
+            return {"ok": True, "locked": self.locked_total}
+        if cmd == "check":
+            self._force_check = True
+            self._wake.set()
+            return {"ok": True, "scheduled": True}
+        if cmd == "stats":
+            return {"ok": True, "stats": self.stats()}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+def query_daemon(cmd: str, db_path=None, timeout: float = 2.0, **params) -> Optional[dict]:
+    """
+    Send one request to the autounlock daemon serving `db_path` (default vault).
+    Returns the decoded response, or None if no daemon is running.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    path = socket_path(db_path)
+    if not path.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall(json.dumps(dict(params, cmd=cmd)).encode("utf-8") + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data) if data else None
+    except (OSError, ValueError):
+        return None
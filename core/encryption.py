@@ -1,21 +1,32 @@
+import io
 import os
+import struct
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
+from core import kdf
 
-def derive_key(password: str, salt: bytes, iterations: int = 390000) -> bytes:
+# Streaming capsule format (.tccap v1):
+#   header  = magic "TCAP" | version (1 byte) | chunk size (uint32) | nonce prefix (7 bytes)
+#   segment = AES-256-GCM(chunk) + 16-byte tag, one per chunk
+# Segment nonce = prefix | segment index (uint32) | final flag (1 byte), and the header is
+# the associated data of every segment, so reordered, dropped, truncated or appended
+# segments and header tampering all fail authentication.
+STREAM_MAGIC = b"TCAP"
+STREAM_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+TAG_SIZE = 16
+_HEADER = struct.Struct(">4sBI7s")
+_MAX_SEGMENTS = 2 ** 32
+
+def derive_key(password: str, salt: bytes, iterations: int = 390000, params: dict = None) -> bytes:
     """
-    Derive a 32-byte key from password+salt using PBKDF2-HMAC-SHA256.
+    Derive a 32-byte key from password+salt.
+    Uses PBKDF2-HMAC-SHA256 with `iterations` unless `params` names another KDF
+    from core.kdf.
     """
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=iterations,
-        backend=default_backend()
-    )
-    return kdf.derive(password.encode("utf-8"))
+    if params is None:
+        params = {"name": "pbkdf2-sha256", "iterations": iterations}
+    return kdf.derive(password, salt, params)
 
 def encrypt_data(data: bytes, key: bytes) -> tuple:
     """
@@ -38,4 +49,97 @@ def decrypt_data(nonce: bytes, encrypted: bytes, key: bytes) -> bytes:
         raise ValueError("Key must be 32 bytes for AES-256-GCM")
 
     aesgcm = AESGCM(key)
-    return aesgcm.decrypt(nonce, encrypted, None)
\ No newline at end of file
+    return aesgcm.decrypt(nonce, encrypted, None)
+
+def _as_reader(src):
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return io.BytesIO(src)
+    return src
+
+def _read_full(src, size: int) -> bytes:
+    """Read up to `size` bytes, retrying short reads until EOF."""
+    data = src.read(size)
+    if not data or len(data) == size:
+        return data or b""
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        more = src.read(remaining)
+        if not more:
+            break
+        parts.append(more)
+        remaining -= len(more)
+    return b"".join(parts)
+
+def _segment_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index >= _MAX_SEGMENTS:
+        raise ValueError("Payload too large for a single capsule stream.")
+    return prefix + struct.pack(">I?", index, last)
+
+def encrypt_stream(src, dst, key: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> bytes:
+    """
+    Encrypts `src` (bytes or a readable binary stream) into the writable stream `dst`
+    using the segmented AES-256-GCM capsule format. At most two chunks are held in
+    memory at a time.
+    Returns: the nonce prefix written to the header.
+    """
+    if len(key) != 32:
+        raise ValueError("Key must be 32 bytes for AES-256-GCM")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes")
+
+    src = _as_reader(src)
+    prefix = os.urandom(7)
+    header = _HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, prefix)
+    dst.write(header)
+
+    aesgcm = AESGCM(key)
+    index = 0
+    chunk = _read_full(src, chunk_size)
+    while True:
+        # A full chunk may still be the last one; look ahead to set the final flag.
+        following = _read_full(src, chunk_size) if len(chunk) == chunk_size else b""
+        last = not following
+        dst.write(aesgcm.encrypt(_segment_nonce(prefix, index, last), chunk, header))
+        if last:
+            return prefix
+        chunk = following
+        index += 1
+
+def decrypt_stream(src, dst, key: bytes, legacy_nonce: bytes = None):
+    """
+    Decrypts a capsule from `src` (bytes or a readable binary stream) into `dst`,
+    one segment at a time.
+    Blobs without the stream header are treated as legacy single-shot ciphertexts
+    and need `legacy_nonce`. Raises on any authentication failure; `dst` may then
+    hold partial plaintext and must be discarded by the caller.
+    """
+    if len(key) != 32:
+        raise ValueError("Key must be 32 bytes for AES-256-GCM")
+
+    src = _as_reader(src)
+    header = _read_full(src, _HEADER.size)
+    if len(header) < _HEADER.size or header[:4] != STREAM_MAGIC:
+        if legacy_nonce is None:
+            raise ValueError("Blob is not in the streaming capsule format and no nonce was given.")
+        dst.write(decrypt_data(legacy_nonce, header + src.read(), key))
+        return
+
+    _, version, chunk_size, prefix = _HEADER.unpack(header)
+    if version != STREAM_VERSION:
+        raise ValueError(f"Unsupported capsule format version {version}.")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("Corrupted capsule header (invalid chunk size).")
+
+    aesgcm = AESGCM(key)
+    segment_size = chunk_size + TAG_SIZE
+    index = 0
+    segment = _read_full(src, segment_size)
+    while True:
+        following = _read_full(src, segment_size) if len(segment) == segment_size else b""
+        last = not following
+        dst.write(aesgcm.decrypt(_segment_nonce(prefix, index, last), segment, header))
+        if last:
+            return
+        segment = following
+        index += 1
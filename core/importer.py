@@ -0,0 +1,205 @@
+# core/importer.py
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from core import kdf
+from core.blobstore import BlobStore
+from core.metadata import parse_unlock_time
+from core.storage import PENDING_RECLAIM_SECONDS, get_engine, get_kdf_params, seal_capsule, vault_salt
+from utils.keymanager import (
+    KEY_SCHEME_PASSWORD, KEY_SCHEME_VAULT, derive_capsule_subkey, derive_key_from_password,
+    derive_master_key,
+)
+
+TYPE_BY_SUFFIX = {
+    ".jpg": "photo", ".jpeg": "photo", ".png": "photo", ".bmp": "photo", ".webp": "photo",
+    ".mp4": "video", ".avi": "video", ".mov": "video", ".mkv": "video", ".webm": "video",
+}
+CAPSULE_TYPES = ("text", "photo", "video")
+# Photos/videos up to this size are read into memory so a preview thumbnail can be
+# made; larger payloads are streamed and imported without one.
+THUMBNAIL_MAX_INPUT = 64 * 1024 * 1024
+
+def _infer_type(path: Path) -> str:
+    return TYPE_BY_SUFFIX.get(path.suffix.lower(), "text")
+
+def scan_directory(directory, unlock_time) -> List[Dict[str, Any]]:
+    """
+    One import item per file under `directory` (recursively, in path order), titled
+    by its relative path without extension and typed by extension.
+    `unlock_time` is a datetime or anything parse_unlock_time accepts.
+    """
+    directory = Path(directory)
+    if isinstance(unlock_time, str):
+        unlock_time = parse_unlock_time(unlock_time)
+    if unlock_time is None:
+        raise ValueError("Importing a directory needs an unlock time (--unlock).")
+    items = []
+    for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+        items.append({
+            "title": path.relative_to(directory).with_suffix("").as_posix(),
+            "unlock_time": unlock_time,
+            "type": _infer_type(path),
+            "path": path,
+        })
+    return items
+
+def read_manifest(manifest) -> List[Dict[str, Any]]:
+    """
+    Parse a JSONL manifest: one object per line with "title", "unlock_time"
+    ("30d" or ISO), "path" (relative to the manifest) and optional "type".
+    The whole manifest is validated before anything is imported.
+    """
+    manifest = Path(manifest)
+    items, errors = [], []
+    with open(manifest, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                path = manifest.parent / entry["path"]
+                ctype = entry.get("type") or _infer_type(path)
+                if ctype not in CAPSULE_TYPES:
+                    raise ValueError(f"unknown type {ctype!r}")
+                if not path.is_file():
+                    raise ValueError(f"payload not found: {path}")
+                items.append({
+                    "title": str(entry["title"]),
+                    "unlock_time": parse_unlock_time(str(entry["unlock_time"])),
+                    "type": ctype,
+                    "path": path,
+                })
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append(f"line {lineno}: {e}")
+    if errors:
+        raise ValueError("Invalid manifest:\n  " + "\n  ".join(errors))
+    return items
+
+def _seal_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker: derive the capsule key, read the payload and compress/encrypt it into
+    the blob store. Returns the sealed result for the publishing side.
+    """
+    if job["master_key"] is not None:
+        key = derive_capsule_subkey(job["master_key"], job["salt"])
+    else:
+        key = derive_key_from_password(job["password"], job["salt"], job["kdf_params"])
+    path, ctype = job["path"], job["type"]
+    size = os.path.getsize(path)
+    thumbnail = None
+    with open(path, "rb") as f:
+        content = f
+        if job["thumbnails"] and ctype in ("photo", "video") and size <= THUMBNAIL_MAX_INPUT:
+            content = f.read()
+            try:
+                from capture.thumbnail import make_thumbnail
+                thumbnail = make_thumbnail(ctype, content)
+            except Exception:
+                thumbnail = None
+        sealed = seal_capsule(BlobStore(job["files_path"]), job["capsule_id"], content, ctype, key, thumbnail)
+    sealed["size"] = size
+    return sealed
+
+def import_capsules(items: List[Dict[str, Any]], password: str, use_vault_key: bool = False,
+                    workers: Optional[int] = None, pool: str = "process", batch_size: int = 64,
+                    thumbnails: bool = True) -> Dict[str, Any]:
+    """
+    Create capsules for `items` (see scan_directory / read_manifest) as a pipeline:
+    rows are reserved as 'pending' a batch at a time, payloads are read, keyed and
+    encrypted on a worker pool, and finished capsules are published in batched
+    transactions. Capsules only become visible when their batch commits; if the
+    import fails or is interrupted, capsules not yet published are discarded. A hard
+    crash leaves pending rows that no query treats as capsules; they are reclaimed
+    (see StorageEngine.reclaim_pending) by the next import, `init` or `scrub --repair`
+    once an hour old. Rows of a running import are kept fresh so they never are.
+    Returns counts and timings.
+    """
+    engine = get_engine()
+    reclaimed = engine.reclaim_pending()
+    if reclaimed:
+        print(f"[import] Reclaimed {len(reclaimed)} pending capsules left by an interrupted import.")
+    kdf_params = kdf.encode_params(get_kdf_params())
+    master_key = None
+    key_scheme = KEY_SCHEME_PASSWORD
+    if use_vault_key:
+        master_key = derive_master_key(password, vault_salt(create=True), kdf_params)
+        key_scheme = KEY_SCHEME_VAULT
+    workers = workers or os.cpu_count() or 1
+    executor_cls = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+
+    stats = {"total": len(items), "imported": 0, "failed": 0, "bytes": 0}
+    started = time.perf_counter()
+    source = iter(items)
+    queued = deque()   # (capsule_id, item, salt) reserved but not yet submitted
+    in_flight = {}     # future -> (capsule_id, item)
+    reserved = set()   # ids reserved and not yet published or discarded
+    ready = []
+    refreshed = time.monotonic()
+
+    def publish():
+        engine.publish_capsules(ready)
+        for sealed in ready:
+            reserved.discard(sealed["capsule_id"])
+            stats["imported"] += 1
+            stats["bytes"] += sealed["size"]
+        ready.clear()
+        elapsed = time.perf_counter() - started
+        print(f"[import] {stats['imported']}/{stats['total']} capsules "
+              f"({stats['bytes'] / 1e6:.1f} MB, {stats['imported'] / elapsed:.1f} capsules/s)")
+
+    try:
+        with executor_cls(max_workers=workers) as executor:
+            while True:
+                # keep about two jobs per worker queued, reserving ids a batch at a time
+                while len(in_flight) < workers * 2:
+                    if not queued:
+                        chunk = list(islice(source, batch_size))
+                        if not chunk:
+                            break
+                        salts = [os.urandom(16) for _ in chunk]
+                        ids = engine.reserve_capsules(
+                            (item["title"], item["unlock_time"], item["type"], salt, key_scheme, kdf_params)
+                            for item, salt in zip(chunk, salts)
+                        )
+                        reserved.update(ids)
+                        queued.extend(zip(ids, chunk, salts))
+                    capsule_id, item, salt = queued.popleft()
+                    job = {
+                        "capsule_id": capsule_id, "path": str(item["path"]), "type": item["type"],
+                        "salt": salt, "kdf_params": kdf_params, "master_key": master_key,
+                        "password": None if master_key is not None else password,
+                        "files_path": str(engine.files_path), "thumbnails": thumbnails,
+                    }
+                    in_flight[executor.submit(_seal_job, job)] = (capsule_id, item)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, timeout=PENDING_RECLAIM_SECONDS / 4, return_when=FIRST_COMPLETED)
+                for future in done:
+                    capsule_id, item = in_flight.pop(future)
+                    try:
+                        ready.append(future.result())
+                    except Exception as e:
+                        print(f"[import] Failed to import '{item['title']}' ({item['path']}): {e}")
+                        engine.discard_capsules([capsule_id])
+                        reserved.discard(capsule_id)
+                        stats["failed"] += 1
+                if len(ready) >= batch_size:
+                    publish()
+                if reserved and time.monotonic() - refreshed > PENDING_RECLAIM_SECONDS / 4:
+                    engine.refresh_pending(reserved)
+                    refreshed = time.monotonic()
+            if ready:
+                publish()
+    finally:
+        # workers have stopped by now, so nothing is still writing these capsules' blobs
+        if reserved:
+            engine.discard_capsules(reserved)
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
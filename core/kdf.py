@@ -0,0 +1,143 @@
+# core/kdf.py
+import json
+import time
+from typing import Callable, Dict, Union
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.backends import default_backend
+
+KEY_LENGTH = 32
+
+# Parameters of every capsule created before KDFs were recorded per capsule.
+DEFAULT_PARAMS = {"name": "pbkdf2-sha256", "iterations": 390000}
+
+# name -> (derive(password_bytes, salt, params) -> key, default params)
+_REGISTRY: Dict[str, tuple] = {}
+
+def register_kdf(name: str, derive: Callable[[bytes, bytes, dict], bytes], defaults: dict):
+    _REGISTRY[name] = (derive, dict(defaults, name=name))
+
+def _pbkdf2(password: bytes, salt: bytes, params: dict) -> bytes:
+    return PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=KEY_LENGTH,
+        salt=salt,
+        iterations=int(params["iterations"]),
+        backend=default_backend()
+    ).derive(password)
+
+def _scrypt(password: bytes, salt: bytes, params: dict) -> bytes:
+    return Scrypt(
+        salt=salt,
+        length=KEY_LENGTH,
+        n=int(params["n"]),
+        r=int(params["r"]),
+        p=int(params["p"]),
+        backend=default_backend()
+    ).derive(password)
+
+register_kdf("pbkdf2-sha256", _pbkdf2, {"iterations": 390000})
+register_kdf("scrypt", _scrypt, {"n": 2 ** 15, "r": 8, "p": 1})
+
+# Argon2id: cryptography >= 44 ships it; otherwise fall back to argon2-cffi if installed.
+try:
+    from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+
+    def _argon2id(password: bytes, salt: bytes, params: dict) -> bytes:
+        return Argon2id(
+            salt=salt,
+            length=KEY_LENGTH,
+            iterations=int(params["iterations"]),
+            lanes=int(params["lanes"]),
+            memory_cost=int(params["memory_cost"]),
+        ).derive(password)
+except ImportError:
+    try:
+        from argon2.low_level import Type, hash_secret_raw
+
+        def _argon2id(password: bytes, salt: bytes, params: dict) -> bytes:
+            return hash_secret_raw(
+                password, salt,
+                time_cost=int(params["iterations"]),
+                memory_cost=int(params["memory_cost"]),
+                parallelism=int(params["lanes"]),
+                hash_len=KEY_LENGTH,
+                type=Type.ID,
+            )
+    except ImportError:
+        _argon2id = None
+
+if _argon2id is not None:
+    register_kdf("argon2id", _argon2id, {"iterations": 3, "lanes": 4, "memory_cost": 64 * 1024})
+
+def available_kdfs() -> list:
+    return list(_REGISTRY)
+
+def preferred_kdf() -> str:
+    """Strongest KDF available on this install (memory-hard first)."""
+    for name in ("argon2id", "scrypt"):
+        if name in _REGISTRY:
+            return name
+    return "pbkdf2-sha256"  # always registered
+
+def default_params(name: str) -> dict:
+    if name not in _REGISTRY:
+        raise ValueError(f"Unknown or unavailable KDF: {name}")
+    return dict(_REGISTRY[name][1])
+
+def decode_params(params: Union[None, str, bytes, dict]) -> dict:
+    """Normalize stored KDF parameters; None means the legacy PBKDF2 default."""
+    if params is None:
+        return dict(DEFAULT_PARAMS)
+    if isinstance(params, (str, bytes)):
+        return json.loads(params)
+    return dict(params)
+
+def encode_params(params: Union[None, str, dict]) -> str:
+    """Canonical JSON form, as stored in the capsules table and used as a cache key."""
+    return json.dumps(decode_params(params), sort_keys=True, separators=(",", ":"))
+
+def derive(password: str, salt: bytes, params=None) -> bytes:
+    """
+    Derive a 32-byte key from password+salt with the KDF named in `params`.
+    """
+    params = decode_params(params)
+    entry = _REGISTRY.get(params.get("name"))
+    if entry is None:
+        raise ValueError(f"Unknown or unavailable KDF: {params.get('name')}")
+    return entry[0](password.encode("utf-8"), salt, params)
+
+def time_kdf(params, rounds: int = 1) -> float:
+    """Average seconds for one derivation with `params` on this machine."""
+    salt = b"\x00" * 16
+    start = time.perf_counter()
+    for _ in range(rounds):
+        derive("calibration", salt, params)
+    return (time.perf_counter() - start) / rounds
+
+def calibrate(name: str, target_seconds: float, max_memory_kib: int = 1024 * 1024) -> dict:
+    """
+    Pick parameters for `name` whose derivation takes about `target_seconds` here.
+    PBKDF2 and Argon2id scale their iteration count linearly; scrypt doubles its
+    work factor N while it stays under the target and `max_memory_kib`.
+    """
+    params = default_params(name)
+    if name == "pbkdf2-sha256":
+        probe = dict(params, iterations=100000)
+        per_iteration = time_kdf(probe) / probe["iterations"]
+        params["iterations"] = max(100000, int(target_seconds / per_iteration))
+    elif name == "scrypt":
+        params["n"] = 2 ** 14
+        while True:
+            bigger = dict(params, n=params["n"] * 2)
+            if bigger["n"] * bigger["r"] * 128 // 1024 > max_memory_kib:
+                break
+            if time_kdf(bigger) > target_seconds:
+                break
+            params = bigger
+    elif name == "argon2id":
+        params["memory_cost"] = min(params["memory_cost"], max_memory_kib)
+        per_pass = time_kdf(dict(params, iterations=1))
+        params["iterations"] = max(1, int(target_seconds / per_pass))
+    return params
@@ -1,10 +1,24 @@
+import io
+import os
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
-from core.storage import load_locked_capsules, read_encrypted_blob, mark_unlocked
-from core.encryption import decrypt_data
-from utils.keymanager import prompt_password_and_derive
-from gui.player import play_video_from_bytes, show_image_from_bytes, show_text_from_bytes
+from functools import partial
+from typing import List, Optional
+from core.storage import (
+    get_engine, load_locked_capsules, next_unlock_time, open_encrypted_blob,
+    mark_unlocked, mark_unlocked_many, vault_salt,
+)
+from core.wakeup import WakeupListener
+from core.compression import decompressing_writer
+from core.encryption import decrypt_stream
+from utils.keymanager import (
+    KEY_SCHEME_VAULT, derive_capsule_key, derive_capsule_subkey, derive_master_key,
+    prompt_password_and_derive,
+)
+from utils import metrics
+from utils.secure_temp import open_secure_temp_file, secure_delete
 
 # Optional: Desktop notifications and sound alerts
 try:
@@ -22,25 +36,187 @@ def notify_capsule_unlocked(title):
     except Exception:
         pass
 
-def _display_plaintext_by_type(ctype: str, plaintext: bytes, title: Optional[str]):
-    """Dispatch to appropriate player."""
+def _blob_size(src) -> Optional[int]:
+    try:
+        return os.fstat(src.fileno()).st_size
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+def decrypt_capsule(src, nonce: bytes, key: bytes, ctype: str, compression: str = "none",
+                     shared_temp: bool = False):
+    """
+    Stream-decrypt (and decompress) a capsule blob. Videos are decrypted into a
+    secure temp file and the path is returned, so they are never held in memory
+    whole; other types are returned as bytes. `shared_temp`: the path is handed
+    to another process, so it cannot be a memfd.
+    """
+    if ctype == "video":
+        f, path = open_secure_temp_file(suffix=".mp4", size_hint=_blob_size(src), shared=shared_temp)
+        try:
+            with f, decompressing_writer(f, compression) as out:
+                decrypt_stream(src, out, key, legacy_nonce=nonce)
+        except Exception:
+            secure_delete(path)
+            raise
+        return path
+    buf = io.BytesIO()
+    with decompressing_writer(buf, compression) as out:
+        decrypt_stream(src, out, key, legacy_nonce=nonce)
+    return buf.getvalue()
+
+def _display_plaintext_by_type(ctype: str, plaintext, title: Optional[str]):
+    """Dispatch to appropriate player. For videos `plaintext` is a temp file path."""
+    # imported on first display: gui.player loads OpenCV, which headless checks never need
+    from gui.player import play_video_from_file, show_image_from_bytes, show_text_from_bytes
     if ctype == "video":
-        play_video_from_bytes(plaintext, window_title=title or "Video")
+        try:
+            play_video_from_file(plaintext, window_title=title or "Video")
+        finally:
+            secure_delete(plaintext)
     elif ctype == "photo" or ctype.startswith("image"):
         show_image_from_bytes(plaintext, window_title=title or "Photo")
     else:
         show_text_from_bytes(plaintext, title=title)
 
-def check_and_unlock(auto_password: str = None):
+def _unlock_job(cap: dict, password: str, master_keys: Optional[dict] = None, shared_temp: bool = False):
+    """
+    Batch-unlock worker: derive the key and decrypt one capsule.
+    Capsules under the vault key scheme use the master key the parent derived once
+    for their KDF parameters (`master_keys`), so they only cost an HKDF here.
+    Runs in a pool worker, so it never raises; per-capsule failures come back as
+    (None, message, timings) and plaintext as (plaintext, None, timings), where
+    timings maps phase -> seconds for the parent to record (worker processes have
+    their own metrics registry).
+    """
+    timings = {}
+    start = time.perf_counter()
+    blob = open_encrypted_blob(cap["file_path"])
+    timings["blob_open"] = time.perf_counter() - start
+    if blob is None:
+        return None, "Encrypted file missing", timings
+    try:
+        with blob:
+            start = time.perf_counter()
+            master_key = (master_keys or {}).get(cap.get("kdf_params"))
+            if cap.get("key_scheme") == KEY_SCHEME_VAULT and master_key is not None:
+                key = derive_capsule_subkey(master_key, cap["salt"])
+            else:
+                key = derive_capsule_key(password, cap["salt"], cap.get("key_scheme", "pbkdf2"),
+                                         kdf_params=cap.get("kdf_params"))
+            timings["key"] = time.perf_counter() - start
+            start = time.perf_counter()
+            plaintext = decrypt_capsule(blob, cap["nonce"], key, cap.get("type", "text"),
+                                         cap.get("compression", "none"), shared_temp=shared_temp)
+            timings["decrypt"] = time.perf_counter() - start
+            return plaintext, None, timings
+    except Exception as e:
+        return None, f"Decryption failed ({type(e).__name__}: {e}); wrong password or corrupted file", timings
+
+def _unlock_batch(capsules: List[dict], auto_password: str, workers: Optional[int], pool: str) -> int:
+    """
+    Fan KDF + decryption for all due capsules out over a worker pool, at most two
+    per worker ahead of the display, show them in schedule order and mark the
+    displayed ones unlocked in one transaction. Decrypted videos that are never
+    shown (display error, Ctrl-C) are securely deleted. Returns how many were unlocked.
+    """
+    executor_cls = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+    print(f"[unlock] {len(capsules)} capsules due; decrypting with a {pool} pool...")
+    # one slow KDF per distinct master-key parameter set, not per capsule
+    master_keys = {}
+    vault_params = {cap.get("kdf_params") for cap in capsules if cap.get("key_scheme") == KEY_SCHEME_VAULT}
+    salt = vault_salt() if vault_params else None
+    if salt is not None:
+        for params in vault_params:
+            try:
+                with metrics.timer("unlock_seconds", phase="master_key"):
+                    master_keys[params] = derive_master_key(auto_password, salt, params)
+            except Exception as e:
+                print(f"[unlock] Master key derivation failed: {e}")
+    unlocked = []
+    job = partial(_unlock_job, password=auto_password, master_keys=master_keys, shared_temp=pool == "process")
+    # Decrypt at most this many capsules ahead of the one on screen, so decrypted
+    # videos waiting in memory (memfd or /dev/shm) stay bounded however many are due.
+    window = (workers or os.cpu_count() or 1) * 2
+    queued = iter(capsules)
+    pending = deque()  # (capsule, future) in schedule order; the head is shown next
+    with executor_cls(max_workers=workers) as executor:
+        def fill():
+            while len(pending) < window:
+                cap = next(queued, None)
+                if cap is None:
+                    return
+                pending.append((cap, executor.submit(job, cap)))
+
+        try:
+            fill()
+            while pending:
+                cap, future = pending[0]
+                plaintext, error, timings = future.result()
+                fill()
+                pending.popleft()  # from here on the display path owns the plaintext
+                cid = cap["id"]
+                for phase, seconds in timings.items():
+                    metrics.observe("unlock_seconds", seconds, phase=phase)
+                if error is not None:
+                    print(f"[unlock] Capsule {cid} '{cap['title']}': {error}. Skipping.")
+                    metrics.inc("unlock_failures_total", reason="decrypt")
+                    continue
+                try:
+                    with metrics.timer("unlock_seconds", phase="display"):
+                        _display_plaintext_by_type(cap.get("type", "text"), plaintext, cap["title"])
+                except Exception as e:
+                    print(f"[unlock] Failed during display for capsule {cid}: {e}")
+                    metrics.inc("unlock_failures_total", reason="display")
+                    continue
+                unlocked.append(cap)
+        finally:
+            # interrupted: destroy the decrypted videos that were never shown
+            for cap, future in pending:
+                future.cancel()
+            for cap, future in pending:
+                if future.cancelled():
+                    continue
+                try:
+                    plaintext, error, _ = future.result()
+                except Exception:
+                    continue
+                if error is None and cap.get("type", "text") == "video":
+                    secure_delete(plaintext)
+
+    if not unlocked:
+        return 0
+    try:
+        with metrics.timer("unlock_seconds", phase="db_update"):
+            mark_unlocked_many([cap["id"] for cap in unlocked])
+    except Exception as e:
+        print(f"[unlock] Failed to mark capsules as unlocked: {e}")
+        metrics.inc("unlock_failures_total", len(unlocked), reason="db")
+        return 0
+    metrics.inc("capsules_unlocked_total", len(unlocked))
+    for cap in unlocked:
+        print(f"[unlock] Capsule {cap['id']} marked as unlocked.")
+        notify_capsule_unlocked(cap["title"])
+    return len(unlocked)
+
+def check_and_unlock(auto_password: str = None, workers: Optional[int] = None, pool: str = "process") -> int:
     """
     Check DB for locked capsules whose unlock_time <= now.
     For each, prompt for password (derived key), decrypt, display, and mark unlocked.
+    With auto_password and several capsules due, key derivation and decryption run
+    in parallel on a `pool` ("process" or "thread") of `workers` (default: CPU count);
+    pass workers=1 to stay serial.
+    Returns the number of capsules unlocked.
     """
     now = datetime.now()
     capsules = load_locked_capsules(before=now)
     if not capsules:
         # nothing to do
-        return
+        return 0
+
+    if auto_password is not None and len(capsules) > 1 and workers != 1:
+        return _unlock_batch(capsules, auto_password, workers, pool)
+
+    unlocked = 0
 
     for cap in capsules:
         cid = cap["id"]
@@ -48,62 +224,118 @@ def check_and_unlock(auto_password: str = None):
         ctype = cap.get("type", "text")
         print(f"[unlock] Capsule {cid} '{title}' scheduled for {cap['unlock_time']} is due. Attempting to unlock...")
 
-        # Read encrypted blob
-        blob = read_encrypted_blob(cap["file_path"])
+        # Open encrypted blob for streaming
+        with metrics.timer("unlock_seconds", phase="blob_open"):
+            blob = open_encrypted_blob(cap["file_path"])
         if blob is None:
             print(f"[unlock] ERROR: Encrypted file missing for capsule {cid}. Skipping.")
+            metrics.inc("unlock_failures_total", reason="missing")
             continue
 
         salt = cap["salt"]
         nonce = cap["nonce"]
-        # prompt for password (user typed) and derive key; this returns the derived key
+        key_scheme = cap.get("key_scheme", "pbkdf2")
+        v_salt = vault_salt() if key_scheme == KEY_SCHEME_VAULT else None
+        # prompt for password (user typed) and derive key; vault-scheme capsules reuse
+        # the cached master key, so only the first one with a given password is slow
+        # (the "key" phase includes typing the password when prompting)
         try:
-            if auto_password is not None:
-                from utils.keymanager import derive_key_from_password
-                key = derive_key_from_password(auto_password, salt)
-            else:
-                key = prompt_password_and_derive(salt)
+            with metrics.timer("unlock_seconds", phase="key"):
+                if auto_password is not None:
+                    key = derive_capsule_key(auto_password, salt, key_scheme, v_salt, cap.get("kdf_params"))
+                else:
+                    key = prompt_password_and_derive(salt, key_scheme, v_salt, cap.get("kdf_params"))
         except Exception as e:
+            blob.close()
             print(f"[unlock] Password entry failed or aborted for capsule {cid}: {e}")
+            metrics.inc("unlock_failures_total", reason="password")
             continue
 
-        # decrypt: your decrypt_data signature may be (nonce, ciphertext, key)
+        # decrypt segment by segment; legacy single-shot blobs fall back to the stored nonce
         try:
-            plaintext = decrypt_data(nonce, blob, key)
+            with blob, metrics.timer("unlock_seconds", phase="decrypt"):
+                plaintext = decrypt_capsule(blob, nonce, key, ctype, cap.get("compression", "none"))
         except Exception as e:
             print(f"[unlock] Decryption failed for capsule {cid}: {e}")
             print("         (wrong password or corrupted file). Skipping.")
+            metrics.inc("unlock_failures_total", reason="decrypt")
             continue
 
         # display according to type
         try:
-            _display_plaintext_by_type(ctype, plaintext, title)
+            with metrics.timer("unlock_seconds", phase="display"):
+                _display_plaintext_by_type(ctype, plaintext, title)
         except Exception as e:
             print(f"[unlock] Failed during display for capsule {cid}: {e}")
+            metrics.inc("unlock_failures_total", reason="display")
             # Do not mark unlocked if display failed
             continue
 
         # mark unlocked in DB
         try:
-            mark_unlocked(cid)
+            with metrics.timer("unlock_seconds", phase="db_update"):
+                mark_unlocked(cid)
+            unlocked += 1
+            metrics.inc("capsules_unlocked_total")
             print(f"[unlock] Capsule {cid} marked as unlocked.")
             notify_capsule_unlocked(title)
         except Exception as e:
             print(f"[unlock] Failed to mark capsule {cid} as unlocked: {e}")
+            metrics.inc("unlock_failures_total", reason="db")
+    return unlocked
+
+def _seconds_until_next_due(max_wait: float) -> float:
+    """Sleep budget: until the next locked capsule is due, capped at max_wait."""
+    now = datetime.now()
+    next_due = next_unlock_time(after=now)
+    metrics.set_gauge("autounlock_next_due_seconds",
+                      (next_due - now).total_seconds() if next_due is not None else -1)
+    if next_due is None:
+        return max_wait
+    # small margin so we wake just after the due second rather than just before it
+    return max(0.0, min(max_wait, (next_due - now).total_seconds() + 0.05))
 
-def auto_unlock_loop(poll_interval_seconds: int = 10, auto_password: str = None):
+def auto_unlock_loop(poll_interval_seconds: int = 10, auto_password: str = None,
+                     workers: Optional[int] = None, pool: str = "process",
+                     metrics_file: Optional[str] = None, metrics_port: Optional[int] = None):
     """
-    Run check_and_unlock() repeatedly until killed.
-    Intended for `python main.py autounlock` usage (you already added that command).
+    Run check_and_unlock() until killed, sleeping exactly until the next capsule is due.
+    Creating a capsule wakes the loop early (core.wakeup), so poll_interval_seconds is
+    only a safety upper bound on each sleep; it also paces retries of due capsules that
+    failed to unlock.
+    Metrics (see utils.metrics) are exported to a Prometheus textfile after every
+    check if `metrics_file` is set, and served on http://127.0.0.1:<metrics_port>/metrics
+    if `metrics_port` is set.
+    Intended for `python main.py autounlock` usage.
     WARNING: This process must be kept running. For true OS-level scheduling prefer cron/schtasks.
     """
-    print(f"[autounlock] Starting auto-unlock loop (poll every {poll_interval_seconds}s). Ctrl-C to stop.")
+    print(f"[autounlock] Starting auto-unlock loop (sleeping until next due capsule, "
+          f"at most {poll_interval_seconds}s). Ctrl-C to stop.")
+    if metrics_file or metrics_port:
+        metrics.enable()
+    server = metrics.serve_http(metrics_port) if metrics_port else None
+    if server is not None:
+        print(f"[autounlock] Serving metrics on http://127.0.0.1:{metrics_port}/metrics")
+    listener = WakeupListener(get_engine().db_path)
     try:
         while True:
             try:
-                check_and_unlock(auto_password=auto_password)
+                check_and_unlock(auto_password=auto_password, workers=workers, pool=pool)
+                metrics.inc("autounlock_checks_total")
+                timeout = _seconds_until_next_due(poll_interval_seconds)
             except Exception as e:
                 print(f"[autounlock] Error during check_and_unlock: {e}")
-            time.sleep(poll_interval_seconds)
+                timeout = poll_interval_seconds
+            if metrics_file:
+                try:
+                    metrics.write_textfile(metrics_file)
+                except OSError as e:
+                    print(f"[autounlock] Could not write metrics file: {e}")
+            if listener.wait(timeout):
+                print("[autounlock] New capsule created; rescheduling.")
     except KeyboardInterrupt:
-        print("\n[autounlock] Stopped by user.")
\ No newline at end of file
+        print("\n[autounlock] Stopped by user.")
+    finally:
+        listener.close()
+        if server is not None:
+            server.shutdown()
@@ -0,0 +1,283 @@
+# core/scrub.py
+import mmap
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Optional
+from core.blobstore import DIGEST
+from core.storage import StorageEngine, get_engine
+
+# Blobs are hashed in slices of this size (hashlib releases the GIL on large
+# updates, so pool threads hash in parallel).
+HASH_CHUNK = 8 * 1024 * 1024
+# Incremental scrubs re-read a blob whose file is unchanged once it was last
+# verified this long ago, so the whole vault is still re-read over that window.
+DEFAULT_MAX_AGE_DAYS = 30
+ROW_PAGE = 10000
+RESULT_BATCH = 1000
+
+def _hash_view(view) -> bytes:
+    h = DIGEST()
+    for start in range(0, len(view), HASH_CHUNK):
+        h.update(view[start:start + HASH_CHUNK])
+    return h.digest()
+
+def _hash_stream(f, length: int) -> bytes:
+    h = DIGEST()
+    while length > 0:
+        chunk = f.read(min(HASH_CHUNK, length))
+        if not chunk:
+            break
+        h.update(chunk)
+        length -= len(chunk)
+    return h.digest()
+
+class _MappedFile:
+    """Read-only mmap of a whole file (falling back to reads where mmap fails), hashed by range."""
+
+    def __init__(self, path: Path):
+        self._f = open(path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._map = None
+        self._view = None
+        if self.size:
+            try:
+                self._map = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+            except (ValueError, OSError):
+                self._map = None
+
+    def digest(self, offset: int, length: int) -> bytes:
+        if self._view is not None:
+            return _hash_view(self._view[offset:offset + length])
+        self._f.seek(offset)
+        return _hash_stream(self._f, length)
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _needs_hash(row: dict, incremental: bool, stale_before: int, stat=None) -> bool:
+    if not incremental or row["digest"] is None or row["verified_at"] is None:
+        return True
+    if row["verified_at"] < stale_before:
+        return True
+    # shard and legacy files: any rewrite since the last scrub changes size or mtime
+    return stat is not None and (stat.st_size, stat.st_mtime_ns) != (row["file_size"], row["file_mtime_ns"])
+
+def _verdict(row: dict, size: int, digest: Optional[bytes]):
+    """Problem text for a blob of `size` bytes hashing to `digest` (None: not hashed), or None if fine."""
+    if row["size"] is not None and size != row["size"]:
+        return f"size {size} != recorded {row['size']}"
+    if digest is not None and row["digest"] is not None and digest != row["digest"]:
+        return "digest mismatch"
+    return None
+
+def _check_file(row: dict, path: Path, incremental: bool, stale_before: int):
+    """Worker: verify one blob stored in its own file. Returns a list of result tuples."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return [("missing", row, f"file not found: {path}", None)]
+    except OSError as e:
+        return [("error", row, f"{path}: {e}", None)]
+    digest = None
+    if _needs_hash(row, incremental, stale_before, st):
+        try:
+            with _MappedFile(path) as mapped:
+                digest = mapped.digest(0, mapped.size)
+        except OSError as e:
+            return [("error", row, f"{path}: {e}", None)]
+    problem = _verdict(row, st.st_size, digest)
+    if problem:
+        return [("corrupt", row, problem, None)]
+    return [("ok", row, (st.st_size, st.st_mtime_ns, digest), None)]
+
+def _check_pack(path: Path, members, incremental: bool, stale_before: int):
+    """
+    Worker: verify every blob stored in one pack file, in offset order, through one
+    mapping. Pack ranges are append-only, so a member is re-hashed only by age.
+    Also reports the pack's bytes no capsule refers to.
+    """
+    results = []
+    members = sorted(members, key=lambda m: m[1])
+    try:
+        mapped = _MappedFile(path)
+    except FileNotFoundError:
+        return [("missing", row, f"pack file not found: {path.name}", None) for row, _, _ in members]
+    except OSError as e:
+        return [("error", row, f"{path.name}: {e}", None) for row, _, _ in members]
+    referenced = 0
+    with mapped:
+        for row, offset, length in members:
+            if offset + length > mapped.size:
+                results.append(("missing", row, f"{path.name} ends at {mapped.size}, blob at {offset}+{length}", None))
+                continue
+            referenced += length
+            digest = None
+            if _needs_hash(row, incremental, stale_before):
+                try:
+                    digest = mapped.digest(offset, length)
+                except OSError as e:
+                    results.append(("error", row, f"{path.name}: {e}", None))
+                    continue
+            problem = _verdict(row, length, digest)
+            if problem:
+                results.append(("corrupt", row, problem, None))
+            else:
+                results.append(("ok", row, (length, None, digest), None))
+        unreferenced = mapped.size - referenced
+    results.append(("pack", None, path.name, unreferenced))
+    return results
+
+def _check_inline(engine: StorageEngine, row: dict, locator: str, incremental: bool, stale_before: int):
+    try:
+        with engine.open_blob(locator) as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [("missing", row, "inline blob row missing", None)]
+    digest = DIGEST(data).digest() if _needs_hash(row, incremental, stale_before) else None
+    problem = _verdict(row, len(data), digest)
+    if problem:
+        return [("corrupt", row, problem, None)]
+    return [("ok", row, (len(data), None, digest), None)]
+
+def scrub_vault(workers: Optional[int] = None, incremental: bool = False,
+                max_age_days: float = DEFAULT_MAX_AGE_DAYS, engine: Optional[StorageEngine] = None,
+                progress=print) -> Dict[str, Any]:
+    """
+    Verify every capsule blob without any password: it must exist, have the recorded
+    size and hash to the digest recorded at save time. Shard files and pack files are
+    hashed on a thread pool through read-only mmaps. Capsules saved before digests
+    were recorded get theirs recorded (trust on first scrub).
+    With `incremental`, existence and size are still checked for every blob, but a
+    blob is only re-hashed if its file changed since it last passed or that was more
+    than `max_age_days` ago.
+    Also reports orphans: shard and pack files, inline blobs and thumbnails that no
+    capsule refers to, and pack bytes no capsule uses. Returns the report.
+    """
+    engine = engine or get_engine()
+    blobs = engine.blobs
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    now = int(time.time())
+    stale_before = now - int(max_age_days * 86400)
+    started = time.perf_counter()
+    report = {
+        "capsules": 0, "pending": 0, "ok": 0, "hashed": 0, "bytes_hashed": 0, "recorded": 0,
+        "problems": [], "orphans": [], "unreferenced_pack_bytes": {},
+    }
+    referenced_files = set()  # resolved shard/legacy paths some capsule points at
+    pending_ids = set()
+    packs = {}                # pack path -> [(row, offset, length)]
+    verified, digests = [], []
+
+    def flush():
+        if verified or digests:
+            engine.record_scrub(verified, digests)
+            verified.clear()
+            digests.clear()
+
+    def collect(results):
+        for kind, row, detail, extra in results:
+            if kind == "pack":
+                if extra:
+                    report["unreferenced_pack_bytes"][detail] = extra
+                continue
+            if kind != "ok":
+                report["problems"].append({"id": row["id"], "kind": kind, "detail": detail})
+                continue
+            report["ok"] += 1
+            size, mtime_ns, digest = detail
+            if digest is None:
+                continue  # not re-hashed (unchanged, verified recently): its last pass stands
+            report["hashed"] += 1
+            report["bytes_hashed"] += size
+            if row["digest"] is None:
+                report["recorded"] += 1
+                digests.append((row["id"], size, digest))
+            verified.append((row["id"], now, size, mtime_ns))
+        if len(verified) + len(digests) >= RESULT_BATCH:
+            flush()
+
+    def pages():
+        # the hot table, then each archive partition
+        for partition in [None] + engine.partitions():
+            after_id = 0
+            while True:
+                page = engine.scrub_rows(after_id, ROW_PAGE, partition)
+                if not page:
+                    break
+                after_id = page[-1][0]
+                yield page
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for page in pages():
+            for cid, status, locator, size, digest, verified_at, file_size, mtime_ns in page:
+                if status == "pending":
+                    report["pending"] += 1
+                    pending_ids.add(cid)
+                    continue
+                report["capsules"] += 1
+                row = {"id": cid, "size": size, "digest": digest, "verified_at": verified_at,
+                       "file_size": file_size, "file_mtime_ns": mtime_ns}
+                if not locator:
+                    report["problems"].append({"id": cid, "kind": "dangling", "detail": "no blob recorded"})
+                    continue
+                tier, path, offset, length = blobs.locate(locator)
+                if tier == "inline":
+                    collect(_check_inline(engine, row, locator, incremental, stale_before))
+                    continue
+                if tier == "pack":
+                    if row["size"] is None:
+                        row["size"] = length
+                    packs.setdefault(path, []).append((row, offset, length))
+                    continue
+                referenced_files.add(path)
+                in_flight.add(executor.submit(_check_file, row, path, incremental, stale_before))
+                # bounded window: results are recorded as they come in
+                while len(in_flight) >= workers * 4:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+        for path, members in packs.items():
+            in_flight.add(executor.submit(_check_pack, path, members, incremental, stale_before))
+        for future in in_flight:
+            collect(future.result())
+    flush()
+
+    # files on disk that no capsule refers to
+    if blobs.shards_path.is_dir():
+        for dirpath, _, filenames in os.walk(blobs.shards_path):
+            for name in filenames:
+                path = Path(dirpath) / name
+                if path in referenced_files:
+                    continue
+                stem = name.split(".", 1)[0]
+                if stem.isdigit() and int(stem) in pending_ids:
+                    continue  # being written by a save or import in progress
+                report["orphans"].append({"kind": "file", "path": str(path)})
+    if blobs.packs_path.is_dir():
+        for path in sorted(blobs.packs_path.glob("pack-*.pack")):
+            if path not in packs:
+                report["orphans"].append({"kind": "pack", "path": str(path)})
+    for kind, ids in engine.orphaned_rows().items():
+        report["orphans"].extend({"kind": kind, "id": cid} for cid in ids if cid not in pending_ids)
+
+    report["seconds"] = time.perf_counter() - started
+    if progress:
+        seconds = max(report["seconds"], 1e-9)
+        progress(f"[scrub] {report['capsules']} capsules checked, {report['hashed']} blobs hashed "
+                 f"({report['bytes_hashed'] / 1e6:.1f} MB, {report['bytes_hashed'] / 1e6 / seconds:.1f} MB/s) "
+                 f"in {report['seconds']:.2f} s")
+    return report
@@ -1,17 +1,47 @@
 # core/storage.py
+import heapq
+import io
+import math
+import os
 import sqlite3
+import stat
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, BinaryIO, Iterator, NamedTuple, Optional
+from core.blobstore import INLINE_PREFIX, PACK_MAX, PACK_PREFIX, BlobStore
+from core.compression import compress_stream
+from core.encryption import decrypt_stream, encrypt_stream
+from core.wakeup import notify_capsule_created
+from utils import metrics
+from utils.keymanager import derive_thumbnail_key
 
 DB_PATH = Path(__file__).parent.parent / "data" / "capsules.db"
 FILES_PATH = Path(__file__).parent.parent / "data" / "capsule_files"
 
-def init_db():
-    FILES_PATH.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
+# Applied to every connection the engine opens.
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # durable across app crashes in WAL mode, cheap commits
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",    # ~16 MB page cache
+    "PRAGMA busy_timeout = 5000",
+)
+
+def _to_epoch(dt: datetime) -> int:
+    """Unlock times are stored as integer epoch seconds, rounded up so a capsule never opens early."""
+    return math.ceil(dt.timestamp())
+
+def _iso_to_epoch(value):
+    """Convert a v1 ISO unlock_time; raises ValueError or TypeError if it does not parse."""
+    if value is None:
+        return None
+    return _to_epoch(datetime.fromisoformat(value))
+
+def _migrate_v1(conn: sqlite3.Connection):
+    """Original schema (unlock_time as ISO text)."""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS capsules (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title TEXT,
@@ -23,86 +53,1204 @@ def init_db():
             status TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+
+def _migrate_v2(conn: sqlite3.Connection):
+    """
+    Store unlock_time as integer epoch seconds and index locked capsules by it, so
+    the due-capsule query is an index range scan instead of a string-compare scan.
+    """
+    # A value that does not parse fails the whole upgrade (rolled back) rather than
+    # becoming a NULL unlock time, which would leave that capsule locked for good.
+    unreadable = []
+    for capsule_id, value in conn.execute("SELECT id, unlock_time FROM capsules"):
+        try:
+            _iso_to_epoch(value)
+        except (TypeError, ValueError):
+            unreadable.append(f"{capsule_id} ({value!r})")
+    if unreadable:
+        raise RuntimeError(
+            "Cannot upgrade the database: unreadable unlock_time for capsule id "
+            + ", ".join(unreadable) + ". Fix those rows (ISO 8601 text) and run again."
+        )
+    conn.create_function("iso_to_epoch", 1, _iso_to_epoch, deterministic=True)
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'capsules'").fetchone()
+    conn.execute("""
+        CREATE TABLE capsules_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            unlock_time INTEGER,
+            type TEXT,
+            file_path TEXT,
+            salt BLOB,
+            nonce BLOB,
+            status TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT INTO capsules_v2 (id, title, unlock_time, type, file_path, salt, nonce, status)
+        SELECT id, title, iso_to_epoch(unlock_time), type, file_path, salt, nonce, status
+        FROM capsules
+    """)
+    conn.execute("DROP TABLE capsules")
+    conn.execute("ALTER TABLE capsules_v2 RENAME TO capsules")
+    if seq is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'capsules'", (seq[0],))
+    conn.execute("""
+        CREATE INDEX idx_capsules_locked_unlock_time
+        ON capsules (unlock_time) WHERE status = 'locked'
+    """)
+
+def _migrate_v3(conn: sqlite3.Connection):
+    """
+    Vault-level settings (e.g. the master-key salt) and a per-capsule key scheme.
+    Existing capsules keep per-capsule PBKDF2.
+    """
+    conn.execute("""
+        CREATE TABLE vault_meta (
+            name TEXT PRIMARY KEY,
+            value BLOB
+        )
+    """)
+    conn.execute("ALTER TABLE capsules ADD COLUMN key_scheme TEXT NOT NULL DEFAULT 'pbkdf2'")
+
+def _migrate_v4(conn: sqlite3.Connection):
+    """Per-capsule KDF parameters (JSON, see core.kdf); NULL means legacy PBKDF2-SHA256/390k."""
+    conn.execute("ALTER TABLE capsules ADD COLUMN kdf_params TEXT")
+
+def _migrate_v5(conn: sqlite3.Connection):
+    """Inline storage for small ciphertexts (see core.blobstore)."""
+    conn.execute("""
+        CREATE TABLE capsule_blobs (
+            capsule_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    """)
+
+def _migrate_v6(conn: sqlite3.Connection):
+    """Compression codec applied before encryption (see core.compression); existing capsules are uncompressed."""
+    conn.execute("ALTER TABLE capsules ADD COLUMN compression TEXT NOT NULL DEFAULT 'none'")
+
+def _migrate_v7(conn: sqlite3.Connection):
+    """Indexes for browsing: keyset pages ordered by unlock time, optionally per status."""
+    conn.execute("CREATE INDEX idx_capsules_unlock_time ON capsules (unlock_time)")
+    conn.execute("CREATE INDEX idx_capsules_status_unlock_time ON capsules (status, unlock_time)")
+
+def _migrate_v8(conn: sqlite3.Connection):
+    """Encrypted preview thumbnails (photo thumbnail or video poster strip), one per capsule."""
+    conn.execute("""
+        CREATE TABLE capsule_thumbnails (
+            capsule_id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    """)
+
+def _migrate_v9(conn: sqlite3.Connection):
+    """
+    Ciphertext size and digest recorded at save time (NULL for older capsules until
+    their first scrub), and when each blob was last verified (see core.scrub).
+    """
+    conn.execute("ALTER TABLE capsules ADD COLUMN blob_size INTEGER")
+    conn.execute("ALTER TABLE capsules ADD COLUMN blob_digest BLOB")
+    conn.execute("""
+        CREATE TABLE blob_scrub (
+            capsule_id INTEGER PRIMARY KEY,
+            verified_at INTEGER NOT NULL,
+            file_size INTEGER,
+            file_mtime_ns INTEGER
+        )
+    """)
+
+def _migrate_v10(conn: sqlite3.Connection):
+    """Registry of cold archive partitions: fully unlocked months moved out of the hot table."""
+    conn.execute("""
+        CREATE TABLE catalog_partitions (
+            period TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            capsules INTEGER NOT NULL,
+            first_unlock INTEGER,
+            last_unlock INTEGER,
+            archived_at INTEGER NOT NULL
+        )
+    """)
+
+def _migrate_v11(conn: sqlite3.Connection):
+    """
+    Digests recorded by a scrub for capsules saved before digests existed, kept with
+    the scrub state: archived capsules' rows are read-only, the hot database is not.
+    """
+    conn.execute("ALTER TABLE blob_scrub ADD COLUMN blob_size INTEGER")
+    conn.execute("ALTER TABLE blob_scrub ADD COLUMN blob_digest BLOB")
+    conn.execute("""
+        UPDATE blob_scrub SET (blob_size, blob_digest) = (
+            SELECT c.blob_size, c.blob_digest FROM capsules c WHERE c.id = blob_scrub.capsule_id
+        )
+    """)
+
+def _migrate_v12(conn: sqlite3.Connection):
+    """When each pending row was reserved, so rows left by a crashed save can be reclaimed."""
+    conn.execute("ALTER TABLE capsules ADD COLUMN reserved_at INTEGER")
+
+def _migrate_v13(conn: sqlite3.Connection):
+    """Indexes for keyset pages ordered by title or type (the rowid breaks ties)."""
+    conn.execute("CREATE INDEX idx_capsules_title ON capsules (title)")
+    conn.execute("CREATE INDEX idx_capsules_type ON capsules (type)")
+
+# MIGRATIONS[i] upgrades a database from user_version i to i + 1.
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5, _migrate_v6, _migrate_v7,
+              _migrate_v8, _migrate_v9, _migrate_v10, _migrate_v11, _migrate_v12, _migrate_v13]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Columns list_capsules() can order by (whitelisted: they are put into the SQL text).
+SORT_COLUMNS = ("unlock_time", "id", "title", "type", "status")
+
+# Rows fetched per round trip while streaming query results.
+STREAM_BATCH = 500
+
+# A pending row older than this belongs to a save or import that crashed before
+# publishing it (saves publish within seconds, imports a batch at a time).
+PENDING_RECLAIM_SECONDS = 60 * 60
+# Pack files are rewritten by compact_packs() once this share of them is unused.
+PACK_COMPACT_WASTE = 0.25
+
+# Archive partitions: capsules of a local calendar month whose capsules are all
+# unlocked move from the hot table into their own SQLite file, <db stem>-archive/
+# YYYY-MM.db, which is then made read-only. Locked capsules never leave the hot
+# table, so the scheduler's queries and every write only touch it; listing, counting
+# and lookups also open the partitions whose unlock-time range can match.
+ARCHIVE_COLUMNS = ("id", "title", "unlock_time", "type", "file_path", "salt", "nonce", "status",
+                   "key_scheme", "kdf_params", "compression", "blob_size", "blob_digest")
+_ARCHIVE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS capsules (
+        id INTEGER PRIMARY KEY, title TEXT, unlock_time INTEGER, type TEXT, file_path TEXT,
+        salt BLOB, nonce BLOB, status TEXT, key_scheme TEXT, kdf_params TEXT, compression TEXT,
+        blob_size INTEGER, blob_digest BLOB
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_capsules_unlock_time ON capsules (unlock_time)",
+    "CREATE INDEX IF NOT EXISTS idx_capsules_title ON capsules (title)",
+    "CREATE INDEX IF NOT EXISTS idx_capsules_type ON capsules (type)",
+    "CREATE TABLE IF NOT EXISTS capsule_blobs (capsule_id INTEGER PRIMARY KEY, data BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS capsule_thumbnails (capsule_id INTEGER PRIMARY KEY, data BLOB NOT NULL)",
+)
+_PERIOD_SQL = "strftime('%Y-%m', unlock_time, 'unixepoch', 'localtime')"
+
+class _PackChanged(Exception):
+    """A pack member's locator changed while compact_packs() was copying it."""
+
+def _keyset_clause(sort: str, descending: bool, after: tuple):
+    """
+    WHERE clause (and params) for rows strictly after cursor `after` in ORDER BY
+    sort, id. SQLite sorts NULLs first ascending and last descending, and a row
+    value comparison with a NULL is never true, so NULL sort values are handled
+    explicitly rather than dropped from every page but the first.
+    """
+    value, capsule_id = after
+    if value is None:
+        if descending:
+            return f"({sort} IS NULL AND id < ?)", [capsule_id]
+        return f"({sort} IS NOT NULL OR id > ?)", [capsule_id]
+    if descending:
+        return f"(({sort}, id) < (?, ?) OR {sort} IS NULL)", [value, capsule_id]
+    return f"({sort}, id) > (?, ?)", [value, capsule_id]
+
+def _sort_key(value, capsule_id):
+    """Python key ordering like SQLite's ORDER BY value, id (NULLs first), to merge partitions."""
+    return (value is not None, value, capsule_id)
+
+class CapsuleRecord(NamedTuple):
+    """One capsule's listing metadata (no key material), as streamed by iter_capsules()."""
+    id: int
+    title: str
+    unlock_time: Optional[datetime]
+    type: str
+    status: str
+    compression: str
+    has_thumbnail: bool
+
+def _capsule_filters(status, capsule_type, unlock_from, unlock_to, title=None):
+    """WHERE clauses and parameters shared by the listing, counting and stats queries."""
+    clauses, params = ["status != 'pending'"], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if capsule_type:
+        clauses.append("type = ?")
+        params.append(capsule_type)
+    if title:
+        # case-insensitive substring match; LIKE wildcards in the text are literal
+        escaped = title.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("title LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    if unlock_from is not None:
+        clauses.append("unlock_time >= ?")
+        params.append(math.floor(unlock_from.timestamp()))
+    if unlock_to is not None:
+        clauses.append("unlock_time <= ?")
+        params.append(math.floor(unlock_to.timestamp()))
+    return clauses, params
+
+def seal_capsule(blobs: BlobStore, capsule_id: int, content, capsule_type: str, key: bytes,
+                 thumbnail: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Compress and encrypt a capsule's payload (and thumbnail) into `blobs`, doing
+    everything that needs no database connection, so it can run in worker processes.
+    Returns what StorageEngine.publish_capsules() needs to record it.
+    """
+    writer = blobs.writer(capsule_id)
+    try:
+        source, compression = compress_stream(content, capsule_type)
+        nonce = encrypt_stream(source, writer, key)
+        encrypted_thumbnail = None
+        if thumbnail:
+            buf = io.BytesIO()
+            encrypt_stream(thumbnail, buf, derive_thumbnail_key(key))
+            encrypted_thumbnail = buf.getvalue()
+        locator = writer.seal()
+    except BaseException:
+        writer.abort()
+        raise
+    return {
+        "capsule_id": capsule_id,
+        "nonce": nonce,
+        "compression": compression,
+        "locator": locator,
+        "data": writer.data() if locator is None else None,
+        "thumbnail": encrypted_thumbnail,
+        "blob_size": writer.size,
+        "blob_digest": writer.digest(),
+    }
+
+class StorageEngine:
+    """
+    Owns the SQLite connections for one vault.
+    Each thread gets one long-lived connection (reopened after a fork), tuned with
+    WAL journaling; the schema and capsule directory are set up once per process.
+    Writes go through transaction(), which issues explicit BEGIN IMMEDIATE/COMMIT.
+    """
+
+    def __init__(self, db_path=DB_PATH, files_path=FILES_PATH):
+        self.db_path = Path(db_path)
+        self.files_path = Path(files_path)
+        self.blobs = BlobStore(self.files_path)
+        self.archive_path = self.db_path.with_name(self.db_path.stem + "-archive")
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized_pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None: no implicit transactions, we BEGIN/COMMIT ourselves.
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=5.0)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it (and the schema) on first use."""
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = pid
+        if self._initialized_pid != pid:
+            self._init_schema(conn)
+        return conn
+
+    def _init_schema(self, conn: sqlite3.Connection):
+        with self._init_lock:
+            if self._initialized_pid == os.getpid():
+                return
+            self.files_path.mkdir(parents=True, exist_ok=True)
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self._migrate(conn)
+            self._initialized_pid = os.getpid()
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Apply pending migrations in one transaction, upgrading the file in place."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process may have migrated already.
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(
+                    f"Database schema version {version} is newer than this program supports ({SCHEMA_VERSION})."
+                )
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the block in one write transaction. Nested use joins the outer
+        transaction instead of starting a new one.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        """Close the calling thread's connections."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        for archive in (getattr(self._local, "archives", None) or {}).values():
+            archive.close()
+        self._local.archives = None
+
+    def partitions(self, unlock_from: datetime = None, unlock_to: datetime = None) -> List[Dict[str, Any]]:
+        """Archive partitions, oldest first; only those overlapping [unlock_from, unlock_to] if given."""
+        clauses, params = ["1"], []
+        if unlock_from is not None:
+            clauses.append("last_unlock >= ?")
+            params.append(math.floor(unlock_from.timestamp()))
+        if unlock_to is not None:
+            clauses.append("first_unlock <= ?")
+            params.append(math.floor(unlock_to.timestamp()))
+        rows = self.connection().execute(f"""
+            SELECT period, file, capsules, first_unlock, last_unlock, archived_at
+            FROM catalog_partitions WHERE {' AND '.join(clauses)} ORDER BY period
+        """, params).fetchall()
+        return [{"period": r[0], "file": r[1], "capsules": r[2], "first_unlock": r[3],
+                 "last_unlock": r[4], "archived_at": r[5]} for r in rows]
+
+    def _archive_connection(self, partition: Dict[str, Any]) -> sqlite3.Connection:
+        """
+        This thread's read-only connection to an archive partition, opened on first use.
+        Its `capsules` is a view hiding rows still present in the hot table: appending to
+        a partition commits the copy before the hot rows are deleted (two files, so not
+        one transaction), and until then the hot row is the one that counts.
+        """
+        pid = os.getpid()
+        archives = getattr(self._local, "archives", None)
+        if archives is None or self._local.archives_pid != pid:
+            archives = self._local.archives = {}
+            self._local.archives_pid = pid
+        conn = archives.get(partition["file"])
+        if conn is None:
+            uri = (self.archive_path / partition["file"]).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None)
+            conn.execute("ATTACH DATABASE ? AS hot", (self.db_path.resolve().as_uri() + "?mode=ro",))
+            # temp objects shadow main ones, so every query on `capsules` sees the view
+            conn.execute("""
+                CREATE TEMP VIEW capsules AS SELECT * FROM main.capsules c
+                WHERE NOT EXISTS (SELECT 1 FROM hot.capsules h WHERE h.id = c.id)
+            """)
+            archives[partition["file"]] = conn
+        return conn
+
+    def _catalogs(self, status: str = None, unlock_from: datetime = None,
+                  unlock_to: datetime = None) -> List[sqlite3.Connection]:
+        """
+        Connections holding capsules that can match: the hot table, plus the archive
+        partitions overlapping the unlock-time range unless only locked (or pending)
+        capsules are wanted, which are never archived.
+        """
+        conn = self.connection()
+        if status not in (None, "unlocked"):
+            return [conn]
+        return [conn] + [self._archive_connection(p) for p in self.partitions(unlock_from, unlock_to)]
+
+    def _lookup(self, sql: str, params) -> Optional[tuple]:
+        """fetchone() from the hot table, then from each archive partition until a row turns up."""
+        row = self.connection().execute(sql, params).fetchone()
+        if row is None:
+            for partition in self.partitions():
+                row = self._archive_connection(partition).execute(sql, params).fetchone()
+                if row is not None:
+                    break
+        return row
+
+    def archive_capsules(self, keep_days: float = 30) -> List[Dict[str, Any]]:
+        """
+        Move every month whose capsules are all unlocked, the last one more than
+        `keep_days` ago, into its read-only archive partition. Safe to re-run: a month
+        that gains capsules later (created with a past unlock time) is appended to its
+        partition, and an interrupted run is completed.
+        """
+        cutoff = math.floor(datetime.now().timestamp() - keep_days * 86400)
+        periods = [r[0] for r in self.connection().execute(f"""
+            SELECT {_PERIOD_SQL} AS period FROM capsules
+            WHERE unlock_time IS NOT NULL
+            GROUP BY period
+            HAVING SUM(status != 'unlocked') = 0 AND MAX(unlock_time) < ?
+            ORDER BY period
+        """, (cutoff,))]
+        return [self._archive_period(period) for period in periods]
+
+    def _archive_period(self, period: str) -> Dict[str, Any]:
+        self.archive_path.mkdir(parents=True, exist_ok=True)
+        name = f"{period}.db"
+        path = self.archive_path / name
+        if path.exists():
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+        columns = ", ".join(ARCHIVE_COLUMNS)
+        # Copy into the partition first (its own file, so this cannot be one transaction
+        # with the hot database), then delete from the hot table and register it. Readers
+        # ignore partition rows still in the hot table (see _archive_connection), so a
+        # crash in between leaves no duplicates; re-running completes the move.
+        cold = sqlite3.connect(path, isolation_level=None)
+        try:
+            cold.execute("PRAGMA journal_mode = DELETE")  # one self-contained file once closed
+            for statement in _ARCHIVE_SCHEMA:
+                cold.execute(statement)
+            cold.execute("ATTACH DATABASE ? AS hot", (str(self.db_path),))
+            cold.execute("BEGIN")
+            try:
+                cold.execute(f"""
+                    INSERT OR REPLACE INTO main.capsules ({columns})
+                    SELECT {columns} FROM hot.capsules
+                    WHERE status = 'unlocked' AND unlock_time IS NOT NULL AND {_PERIOD_SQL} = ?
+                """, (period,))
+                for table in ("capsule_blobs", "capsule_thumbnails"):
+                    cold.execute(f"""
+                        INSERT OR REPLACE INTO main.{table} (capsule_id, data)
+                        SELECT h.capsule_id, h.data FROM hot.{table} h JOIN main.capsules c ON c.id = h.capsule_id
+                    """)
+            except BaseException:
+                cold.execute("ROLLBACK")
+                raise
+            cold.execute("COMMIT")
+            cold.execute("DETACH DATABASE hot")
+            ids = [r[0] for r in cold.execute("SELECT id FROM capsules")]
+            count, first, last = cold.execute(
+                "SELECT COUNT(*), MIN(unlock_time), MAX(unlock_time) FROM capsules"
+            ).fetchone()
+        finally:
+            cold.close()
+        moved = 0
+        with self.transaction() as conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                moved += conn.execute(f"DELETE FROM capsules WHERE status = 'unlocked' AND id IN ({marks})",
+                                      chunk).rowcount
+                conn.execute(f"DELETE FROM capsule_blobs WHERE capsule_id IN ({marks})", chunk)
+                conn.execute(f"DELETE FROM capsule_thumbnails WHERE capsule_id IN ({marks})", chunk)
+            conn.execute("""
+                INSERT OR REPLACE INTO catalog_partitions
+                    (period, file, capsules, first_unlock, last_unlock, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (period, name, count, first, last, math.floor(datetime.now().timestamp())))
+        os.chmod(path, stat.S_IRUSR)
+        return {"period": period, "file": str(path), "moved": moved, "capsules": count}
+
+    def init_db(self):
+        self.connection()
+
+    def get_meta(self, name: str, default=None):
+        row = self.connection().execute("SELECT value FROM vault_meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else default
+
+    def set_meta(self, name: str, value):
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO vault_meta (name, value) VALUES (?, ?)", (name, value))
+
+    def vault_salt(self, create: bool = False) -> Optional[bytes]:
+        salt = self.get_meta("vault_salt")
+        if salt is None and create:
+            with self.transaction() as conn:
+                conn.execute("INSERT OR IGNORE INTO vault_meta (name, value) VALUES ('vault_salt', ?)",
+                             (os.urandom(16),))
+                salt = conn.execute("SELECT value FROM vault_meta WHERE name = 'vault_salt'").fetchone()[0]
+        return salt
+
+    def reserve_capsules(self, capsules) -> List[int]:
+        """
+        Insert rows for capsules about to be written, as 'pending', in one transaction.
+        `capsules` yields (title, unlock_time, capsule_type, salt, key_scheme, kdf_params).
+        """
+        now = math.floor(datetime.now().timestamp())
+        with self.transaction() as conn:
+            return [conn.execute("""
+                INSERT INTO capsules (title, unlock_time, type, salt, status, key_scheme, kdf_params, reserved_at)
+                VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)
+            """, (title, _to_epoch(unlock_time), capsule_type, salt, key_scheme, kdf_params, now)).lastrowid
+                for title, unlock_time, capsule_type, salt, key_scheme, kdf_params in capsules]
+
+    def publish_capsules(self, sealed):
+        """
+        Place sealed blobs (see seal_capsule) in their tiers and mark their capsules
+        locked, all in one transaction, so a batch becomes visible together or not at all.
+        Raises RuntimeError, publishing nothing, if a capsule is no longer pending
+        (reclaimed as abandoned).
+        """
+        with self.transaction() as conn:
+            for item in sealed:
+                locator = item["locator"] or self.blobs.place(item["capsule_id"], item["data"], conn)
+                if item["thumbnail"] is not None:
+                    conn.execute("INSERT OR REPLACE INTO capsule_thumbnails (capsule_id, data) VALUES (?, ?)",
+                                 (item["capsule_id"], item["thumbnail"]))
+                if not conn.execute("""
+                    UPDATE capsules SET file_path = ?, nonce = ?, compression = ?, blob_size = ?, blob_digest = ?,
+                                        status = 'locked'
+                    WHERE id = ? AND status = 'pending'
+                """, (locator, item["nonce"], item["compression"], item["blob_size"], item["blob_digest"],
+                      item["capsule_id"])).rowcount:
+                    raise RuntimeError(f"Capsule {item['capsule_id']} is no longer pending; it was reclaimed.")
+        notify_capsule_created(self.db_path)
+
+    def discard_capsules(self, capsule_ids):
+        """Remove still-pending capsules and anything already written for them."""
+        capsule_ids = list(capsule_ids)
+        with self.transaction() as conn:
+            for capsule_id in capsule_ids:
+                if conn.execute("DELETE FROM capsules WHERE id = ? AND status = 'pending'",
+                                (capsule_id,)).rowcount:
+                    conn.execute("DELETE FROM capsule_blobs WHERE capsule_id = ?", (capsule_id,))
+                    conn.execute("DELETE FROM capsule_thumbnails WHERE capsule_id = ?", (capsule_id,))
+                    conn.execute("DELETE FROM blob_scrub WHERE capsule_id = ?", (capsule_id,))
+                    shard = self.blobs.shard_path(capsule_id)
+                    shard.with_name(shard.name + ".partial").unlink(missing_ok=True)
+                    shard.unlink(missing_ok=True)
+
+    def refresh_pending(self, capsule_ids):
+        """Reset the reservation time of pending rows still being worked on, so they are not reclaimed."""
+        capsule_ids = list(capsule_ids)
+        now = math.floor(datetime.now().timestamp())
+        with self.transaction() as conn:
+            for start in range(0, len(capsule_ids), 500):
+                chunk = capsule_ids[start:start + 500]
+                conn.execute(f"""
+                    UPDATE capsules SET reserved_at = ?
+                    WHERE status = 'pending' AND id IN ({','.join('?' * len(chunk))})
+                """, (now, *chunk))
+
+    def reclaim_pending(self, max_age_seconds: float = PENDING_RECLAIM_SECONDS) -> List[int]:
+        """
+        Discard pending rows reserved more than `max_age_seconds` ago (or before
+        reservation times were recorded), with their partial or shard files, inline
+        blobs and thumbnails: what a save or import that crashed left behind.
+        Returns their ids.
+        """
+        cutoff = math.floor(datetime.now().timestamp() - max_age_seconds)
+        ids = [r[0] for r in self.connection().execute("""
+            SELECT id FROM capsules
+            WHERE status = 'pending' AND (reserved_at IS NULL OR reserved_at < ?)
+        """, (cutoff,))]
+        self.discard_capsules(ids)
+        return ids
+
+    def compact_packs(self, min_waste: float = PACK_COMPACT_WASTE) -> List[Dict[str, Any]]:
+        """
+        Rewrite pack files of which at least `min_waste` is used by no capsule (bytes
+        left by discarded saves): live blobs are appended to the current pack in
+        batches, each batch with its locator updates in one write transaction, and
+        the old pack removed once all of them moved. Skips the newest pack (saves
+        append to it) and packs archived capsules point into.
+        Returns one dict per pack: pack, size, freed, moved.
+        """
+        if not self.blobs.packs_path.is_dir():
+            return []
+        conn = self.connection()
+        results = []
+        for pack in sorted(self.blobs.packs_path.glob("pack-*.pack"))[:-1]:
+            prefix = f"{PACK_PREFIX}{pack.name}:"
+            member_sql = "SELECT id, file_path FROM main.capsules WHERE substr(file_path, 1, ?) = ?"
+            if any(self._archive_connection(p).execute(member_sql + " LIMIT 1", (len(prefix), prefix)).fetchone()
+                   for p in self.partitions()):
+                continue
+            members = conn.execute(member_sql, (len(prefix), prefix)).fetchall()
+            size = pack.stat().st_size
+            used = sum(self.blobs.locate(locator)[3] for _, locator in members)
+            if size == 0 or (size - used) / size < min_waste:
+                continue
+            # copy the live ranges in batches. Each batch is appended and its locators
+            # switched in one write transaction: saves append to packs in theirs, so
+            # the two never write the same pack at once. Moved blobs lose their scrub
+            # state, so the next incremental scrub hashes them at the new location.
+            moved = 0
+
+            def flush(batch, batch_members) -> int:
+                if not batch:
+                    return 0
+                with self.transaction() as conn:
+                    _, new_pack, base, _ = self.blobs.locate(self.blobs.append_to_pack(bytes(batch)))
+                    for cid, old, start, length in batch_members:
+                        new = f"{PACK_PREFIX}{new_pack.name}:{base + start}:{length}"
+                        if not conn.execute("UPDATE capsules SET file_path = ? WHERE id = ? AND file_path = ?",
+                                            (new, cid, old)).rowcount:
+                            # moved or archived meanwhile: keep the old pack (the copy is waste)
+                            raise _PackChanged()
+                        conn.execute("DELETE FROM blob_scrub WHERE capsule_id = ?", (cid,))
+                return len(batch_members)
+
+            try:
+                with open(pack, "rb") as f:
+                    batch, batch_members = bytearray(), []
+                    for cid, locator in members:
+                        _, _, offset, length = self.blobs.locate(locator)
+                        f.seek(offset)
+                        batch_members.append((cid, locator, len(batch), length))
+                        batch += f.read(length)
+                        if len(batch) >= PACK_MAX:
+                            moved += flush(batch, batch_members)
+                            batch, batch_members = bytearray(), []
+                    moved += flush(batch, batch_members)
+            except _PackChanged:
+                continue
+            pack.unlink()
+            results.append({"pack": pack.name, "size": size, "freed": size - used, "moved": moved})
+        return results
+
+    def save_capsule(self, title: str, unlock_time: datetime, capsule_type: str,
+                     content, key: bytes, salt: bytes, key_scheme: str = "pbkdf2",
+                     kdf_params: Optional[str] = None, thumbnail: Optional[bytes] = None):
+        # Reserve the row (and so the id the blob is keyed by) as 'pending', encrypt
+        # outside any transaction so other writers are not blocked, then publish it.
+        # A crash in between leaves only a pending row that no query treats as a capsule.
+        with metrics.timer("save_seconds", phase="reserve"):
+            capsule_id = self.reserve_capsules([(title, unlock_time, capsule_type, salt, key_scheme, kdf_params)])[0]
+        try:
+            with metrics.timer("save_seconds", phase="encrypt"):
+                sealed = seal_capsule(self.blobs, capsule_id, content, capsule_type, key, thumbnail)
+            with metrics.timer("save_seconds", phase="publish"):
+                self.publish_capsules([sealed])
+        except BaseException:
+            self.discard_capsules([capsule_id])
+            raise
+        metrics.inc("capsules_saved_total")
+        return capsule_id
+
+    def load_locked_capsules(self, before: datetime = None) -> List[Dict[str, Any]]:
+        if before is None:
+            before = datetime.now()
+        # Served by the partial index on locked capsules: O(log n + due).
+        rows = self.connection().execute("""
+            SELECT id, title, unlock_time, type, file_path, salt, nonce, key_scheme, kdf_params,
+                   compression
+            FROM capsules
+            WHERE status = 'locked' AND unlock_time <= ?
+            ORDER BY unlock_time
+        """, (math.floor(before.timestamp()),)).fetchall()
+
+        capsules = []
+        for r in rows:
+            capsules.append({
+                "id": r[0],
+                "title": r[1],
+                "unlock_time": datetime.fromtimestamp(r[2]),
+                "type": r[3],
+                "file_path": r[4],
+                "salt": r[5],
+                "nonce": r[6],
+                "key_scheme": r[7],
+                "kdf_params": r[8],
+                "compression": r[9],
+            })
+        return capsules
+
+    def next_unlock_time(self, after: datetime = None) -> Optional[datetime]:
+        """Earliest unlock_time of a locked capsule strictly after `after` (index lookup)."""
+        if after is None:
+            after = datetime.now()
+        row = self.connection().execute("""
+            SELECT MIN(unlock_time) FROM capsules
+            WHERE status = 'locked' AND unlock_time > ?
+        """, (math.floor(after.timestamp()),)).fetchone()
+        return datetime.fromtimestamp(row[0]) if row[0] is not None else None
+
+    def list_capsules(self, status: str = None, capsule_type: str = None,
+                      unlock_from: datetime = None, unlock_to: datetime = None,
+                      sort: str = "unlock_time", descending: bool = False,
+                      after: tuple = None, limit: int = 200, title: str = None) -> List[Dict[str, Any]]:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort capsules by {sort!r}")
+        clauses, params = _capsule_filters(status, capsule_type, unlock_from, unlock_to, title)
+        # Keyset pagination: continue strictly after the last (sort value, id) seen,
+        # so a page costs the same however deep the user has scrolled.
+        if after is not None:
+            clause, after_params = _keyset_clause(sort, descending, after)
+            clauses.append(clause)
+            params.extend(after_params)
+        order = "DESC" if descending else "ASC"
+        sql = f"""
+            SELECT id, title, unlock_time, type, status, file_path, {sort},
+                   EXISTS (SELECT 1 FROM capsule_thumbnails WHERE capsule_id = capsules.id)
+            FROM capsules
+            WHERE {' AND '.join(clauses)}
+            ORDER BY {sort} {order}, id {order}
+            LIMIT ?
+        """
+        catalogs = self._catalogs(status, unlock_from, unlock_to)
+        rows = []
+        for conn in catalogs:
+            rows.extend(conn.execute(sql, (*params, limit)).fetchall())
+        if len(catalogs) > 1:
+            # each partition returned its own first page; the merged page is their head
+            rows.sort(key=lambda r: _sort_key(r[6], r[0]), reverse=descending)
+            del rows[limit:]
+
+        return [{
+            "id": r[0],
+            "title": r[1],
+            "unlock_time": datetime.fromtimestamp(r[2]) if r[2] is not None else None,
+            "type": r[3],
+            "status": r[4],
+            "file_path": r[5],
+            "cursor": (r[6], r[0]),
+            "has_thumbnail": bool(r[7]),
+        } for r in rows]
+
+    def count_capsules(self, status: str = None, capsule_type: str = None,
+                       unlock_from: datetime = None, unlock_to: datetime = None, title: str = None) -> int:
+        clauses, params = _capsule_filters(status, capsule_type, unlock_from, unlock_to, title)
+        sql = f"SELECT COUNT(*) FROM capsules WHERE {' AND '.join(clauses)}"
+        return sum(conn.execute(sql, params).fetchone()[0]
+                   for conn in self._catalogs(status, unlock_from, unlock_to))
+
+    def iter_capsules(self, status: str = None, capsule_type: str = None, title: str = None,
+                      unlock_from: datetime = None, unlock_to: datetime = None,
+                      sort: str = "unlock_time", descending: bool = False) -> Iterator[CapsuleRecord]:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort capsules by {sort!r}")
+        clauses, params = _capsule_filters(status, capsule_type, unlock_from, unlock_to, title)
+        order = "DESC" if descending else "ASC"
+        sql = f"""
+            SELECT id, title, unlock_time, type, status, compression,
+                   EXISTS (SELECT 1 FROM capsule_thumbnails WHERE capsule_id = capsules.id)
+            FROM capsules
+            WHERE {' AND '.join(clauses)}
+            ORDER BY {sort} {order}, id {order}
+        """
+        streams = [self._stream_records(conn, sql, params)
+                   for conn in self._catalogs(status, unlock_from, unlock_to)]
+        if len(streams) == 1:
+            return streams[0]
+        # every partition streams in order, so a k-way merge keeps the output ordered
+        return heapq.merge(*streams, key=lambda rec: _sort_key(getattr(rec, sort), rec.id), reverse=descending)
+
+    def _stream_records(self, conn: sqlite3.Connection, sql: str, params) -> Iterator[CapsuleRecord]:
+        cursor = conn.execute(sql, params)
+        try:
+            # SQLite steps the statement as rows are fetched, so only one batch is in memory
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH)
+                if not rows:
+                    break
+                for r in rows:
+                    yield CapsuleRecord(
+                        r[0], r[1], datetime.fromtimestamp(r[2]) if r[2] is not None else None,
+                        r[3], r[4], r[5], bool(r[6]),
+                    )
+        finally:
+            cursor.close()
+
+    def capsule_stats(self, status: str = None, capsule_type: str = None, title: str = None,
+                      unlock_from: datetime = None, unlock_to: datetime = None) -> Dict[str, Any]:
+        clauses, params = _capsule_filters(status, capsule_type, unlock_from, unlock_to, title)
+        where = " AND ".join(clauses)
+        conn = self.connection()
+        merged, with_thumbnail = {}, 0
+        for catalog in self._catalogs(status, unlock_from, unlock_to):
+            for status_, type_, count, first, last in catalog.execute(f"""
+                SELECT status, type, COUNT(*), MIN(unlock_time), MAX(unlock_time)
+                FROM capsules
+                WHERE {where}
+                GROUP BY status, type
+            """, params):
+                if (status_, type_) in merged:
+                    count_, first_, last_ = merged[(status_, type_)]
+                    count += count_
+                    first = min((x for x in (first, first_) if x is not None), default=None)
+                    last = max((x for x in (last, last_) if x is not None), default=None)
+                merged[(status_, type_)] = (count, first, last)
+            with_thumbnail += catalog.execute(f"""
+                SELECT COUNT(*) FROM capsules JOIN capsule_thumbnails ON capsule_id = capsules.id
+                WHERE {where}
+            """, params).fetchone()[0]
+        groups = [(k[0], k[1], *v) for k, v in sorted(merged.items(), key=lambda kv: _sort_key(*kv[0]))]
+        # locked capsules are all in the hot table
+        next_due = conn.execute(f"""
+            SELECT MIN(unlock_time) FROM capsules
+            WHERE {where} AND status = 'locked' AND unlock_time > ?
+        """, (*params, math.floor(datetime.now().timestamp()))).fetchone()[0]
+
+        def when(epoch):
+            return datetime.fromtimestamp(epoch) if epoch is not None else None
+
+        by_status, by_type = {}, {}
+        for status_, type_, count, _, _ in groups:
+            by_status[status_] = by_status.get(status_, 0) + count
+            by_type[type_] = by_type.get(type_, 0) + count
+        firsts = [g[3] for g in groups if g[3] is not None]
+        lasts = [g[4] for g in groups if g[4] is not None]
+        return {
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "by_type": by_type,
+            "groups": [{"status": g[0], "type": g[1], "count": g[2],
+                        "first_unlock": when(g[3]), "last_unlock": when(g[4])} for g in groups],
+            "first_unlock": when(min(firsts)) if firsts else None,
+            "last_unlock": when(max(lasts)) if lasts else None,
+            "next_unlock": when(next_due),
+            "with_thumbnail": with_thumbnail,
+            "partitions": len(self.partitions()),
+        }
+
+    def scrub_rows(self, after_id: int = 0, limit: int = 10000,
+                   partition: Optional[Dict[str, Any]] = None) -> List[tuple]:
+        """
+        One page (by id) of what core.scrub checks: (id, status, file_path, blob_size,
+        blob_digest, verified_at, file_size, file_mtime_ns), pending rows included.
+        Reads the hot table, or an archive `partition` (see partitions()).
+        """
+        conn = self.connection()
+        if partition is None:
+            return conn.execute("""
+                SELECT c.id, c.status, c.file_path, COALESCE(c.blob_size, s.blob_size),
+                       COALESCE(c.blob_digest, s.blob_digest), s.verified_at, s.file_size, s.file_mtime_ns
+                FROM capsules c LEFT JOIN blob_scrub s ON s.capsule_id = c.id
+                WHERE c.id > ?
+                ORDER BY c.id
+                LIMIT ?
+            """, (after_id, limit)).fetchall()
+        rows = self._archive_connection(partition).execute("""
+            SELECT id, status, file_path, blob_size, blob_digest FROM capsules
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (after_id, limit)).fetchall()
+        # scrub state, and digests a scrub recorded, stay in the (writable) hot database
+        states = {}
+        for start in range(0, len(rows), 500):
+            chunk = [r[0] for r in rows[start:start + 500]]
+            states.update((r[0], r[1:]) for r in conn.execute(f"""
+                SELECT capsule_id, blob_size, blob_digest, verified_at, file_size, file_mtime_ns FROM blob_scrub
+                WHERE capsule_id IN ({','.join('?' * len(chunk))})
+            """, chunk))
+        pages = []
+        for cid, status, locator, size, digest in rows:
+            state = states.get(cid, (None,) * 5)
+            if digest is None:
+                size, digest = state[0], state[1]
+            pages.append((cid, status, locator, size, digest) + state[2:])
+        return pages
+
+    def record_scrub(self, verified, digests=()):
+        """
+        Store scrub results in one transaction: `verified` yields (capsule_id, verified_at,
+        file_size, file_mtime_ns) for blobs that passed; `digests` yields (capsule_id,
+        size, digest) for capsules saved before digests were recorded, each of which
+        must also be in `verified`. Those digests are kept in blob_scrub, which works
+        for archived capsules too, and copied into hot capsule rows.
+        """
+        digests = list(digests)
+        with self.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO blob_scrub (capsule_id, verified_at, file_size, file_mtime_ns)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (capsule_id) DO UPDATE SET verified_at = excluded.verified_at,
+                    file_size = excluded.file_size, file_mtime_ns = excluded.file_mtime_ns
+            """, verified)
+            conn.executemany("""
+                UPDATE blob_scrub SET blob_size = ?, blob_digest = ? WHERE capsule_id = ? AND blob_digest IS NULL
+            """, ((size, digest, capsule_id) for capsule_id, size, digest in digests))
+            conn.executemany("""
+                UPDATE capsules SET blob_size = ?, blob_digest = ? WHERE id = ? AND blob_digest IS NULL
+            """, ((size, digest, capsule_id) for capsule_id, size, digest in digests))
+
+    def orphaned_rows(self) -> Dict[str, List[int]]:
+        """Ids of inline blobs and thumbnails whose capsule no longer uses them."""
+        conn = self.connection()
+        return {
+            "inline": [r[0] for r in conn.execute("""
+                SELECT b.capsule_id FROM capsule_blobs b LEFT JOIN capsules c ON c.id = b.capsule_id
+                WHERE c.id IS NULL OR c.file_path IS NOT 'inline:' || b.capsule_id
+            """)],
+            "thumbnail": [r[0] for r in conn.execute("""
+                SELECT t.capsule_id FROM capsule_thumbnails t LEFT JOIN capsules c ON c.id = t.capsule_id
+                WHERE c.id IS NULL
+            """)],
+        }
+
+    def get_capsule(self, capsule_id: int) -> Optional[Dict[str, Any]]:
+        r = self._lookup("""
+            SELECT id, title, unlock_time, type, status, file_path, salt, nonce, key_scheme,
+                   kdf_params, compression
+            FROM capsules WHERE id = ?
+        """, (capsule_id,))
+        if r is None:
+            return None
+        return {
+            "id": r[0],
+            "title": r[1],
+            "unlock_time": datetime.fromtimestamp(r[2]) if r[2] is not None else None,
+            "type": r[3],
+            "status": r[4],
+            "file_path": r[5],
+            "salt": r[6],
+            "nonce": r[7],
+            "key_scheme": r[8],
+            "kdf_params": r[9],
+            "compression": r[10],
+        }
+
+    def load_thumbnail(self, capsule_id: int, key: bytes) -> Optional[bytes]:
+        row = self._lookup("SELECT data FROM capsule_thumbnails WHERE capsule_id = ?", (capsule_id,))
+        if row is None:
+            return None
+        out = io.BytesIO()
+        decrypt_stream(io.BytesIO(row[0]), out, derive_thumbnail_key(key))
+        return out.getvalue()
+
+    def read_encrypted_blob(self, file_path: str) -> Optional[bytes]:
+        f = self.open_encrypted_blob(file_path)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def open_blob(self, locator: str) -> BinaryIO:
+        """Open a blob by locator, inline ones in archive partitions included. Raises FileNotFoundError."""
+        try:
+            return self.blobs.open(locator, self.connection())
+        except FileNotFoundError:
+            if not locator.startswith(INLINE_PREFIX):
+                raise
+        for partition in self.partitions():
+            try:
+                return self.blobs.open(locator, self._archive_connection(partition))
+            except FileNotFoundError:
+                continue
+        raise FileNotFoundError(f"inline blob {locator}")
+
+    def open_encrypted_blob(self, file_path: str) -> Optional[BinaryIO]:
+        if not file_path:
+            return None
+        try:
+            return self.open_blob(file_path)
+        except FileNotFoundError:
+            print(f"Capsule file not found: {file_path}")
+            return None
+
+    def mark_unlocked(self, capsule_id: int):
+        with self.transaction() as conn:
+            conn.execute("UPDATE capsules SET status = 'unlocked' WHERE id = ?", (capsule_id,))
+
+    def mark_unlocked_many(self, capsule_ids):
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE capsules SET status = 'unlocked' WHERE id = ?",
+                ((cid,) for cid in capsule_ids),
+            )
+
+    def check_capsules(self):
+        found = False
+        for cap in self.iter_capsules(sort="id"):
+            found = True
+            unlock_time = cap.unlock_time.isoformat() if cap.unlock_time is not None else "?"
+            print(f"ID: {cap.id}, Title: {cap.title}, Unlock Time: {unlock_time}, Status: {cap.status}")
+        if not found:
+            print("No capsules found.")
+
+_engine: Optional[StorageEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> StorageEngine:
+    """Return the process-wide engine for the default vault."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = StorageEngine(DB_PATH, FILES_PATH)
+    return _engine
+
+def configure(db_path=None, files_path=None) -> StorageEngine:
+    """
+    Point the module-level functions at another vault (e.g. a scratch vault for
+    benchmarks). Returns the new default engine.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = StorageEngine(db_path or DB_PATH, files_path or FILES_PATH)
+    return _engine
+
+def init_db():
+    get_engine().init_db()
+
+def vault_salt(create: bool = False) -> Optional[bytes]:
+    """
+    Return the vault-wide salt for the master key, generating and storing it on
+    first use when `create` is set.
+    """
+    return get_engine().vault_salt(create)
+
+def get_kdf_params() -> Optional[str]:
+    """
+    KDF parameters (JSON) new capsules in this vault should use, as chosen by
+    `main.py calibrate`; None if the vault was never calibrated.
+    """
+    value = get_engine().get_meta("kdf_params")
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+def set_kdf_params(kdf_params: str):
+    get_engine().set_meta("kdf_params", kdf_params)
 
 def save_capsule(title: str, unlock_time: datetime, capsule_type: str,
-                 encrypted_data: bytes, nonce: bytes, salt: bytes):
-    init_db()
-    file_name = f"{title}_{int(unlock_time.timestamp())}.tccap"
-    file_path = FILES_PATH / file_name
-    with open(file_path, "wb") as f:
-        f.write(encrypted_data)
-
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO capsules (title, unlock_time, type, file_path, salt, nonce, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (title, unlock_time.isoformat(), capsule_type, str(file_path), salt, nonce, "locked"))
-    conn.commit()
-    conn.close()
+                 content, key: bytes, salt: bytes, key_scheme: str = "pbkdf2",
+                 kdf_params: Optional[str] = None, thumbnail: Optional[bytes] = None):
+    """
+    Compress `content` (bytes or a readable binary stream) when its type and a probe
+    say it pays off, encrypt it with `key` chunk by chunk into the blob store tier
+    that fits its size, and record the capsule as locked.
+    `key_scheme` and `kdf_params` (JSON) record how `key` was derived from the password.
+    `thumbnail` (a small JPEG) is stored alongside, encrypted with a key derived from `key`.
+    Returns the new capsule id.
+    """
+    return get_engine().save_capsule(title, unlock_time, capsule_type, content, key, salt, key_scheme,
+                                     kdf_params, thumbnail)
+
+def reserve_capsules(capsules) -> List[int]:
+    """
+    Reserve ids for capsules about to be written (rows stay 'pending' until published).
+    `capsules` yields (title, unlock_time, capsule_type, salt, key_scheme, kdf_params).
+    """
+    return get_engine().reserve_capsules(capsules)
+
+def publish_capsules(sealed):
+    """
+    Record a batch of capsules sealed with seal_capsule() as locked, in one transaction.
+    """
+    get_engine().publish_capsules(sealed)
+
+def discard_capsules(capsule_ids):
+    """
+    Delete reserved capsules that will not be published, with any blob data written for them.
+    """
+    get_engine().discard_capsules(capsule_ids)
+
+def reclaim_pending(max_age_seconds: float = PENDING_RECLAIM_SECONDS) -> List[int]:
+    """
+    Discard what crashed saves and imports left behind: pending rows older than
+    `max_age_seconds` and their files. Returns their ids.
+    """
+    return get_engine().reclaim_pending(max_age_seconds)
+
+def compact_packs(min_waste: float = PACK_COMPACT_WASTE) -> List[Dict[str, Any]]:
+    """
+    Rewrite pack files at least `min_waste` unused, dropping bytes no capsule refers to.
+    Safe alongside saves; a reader that looked up a locator in a removed pack fails to
+    open it and has to look it up again.
+    """
+    return get_engine().compact_packs(min_waste)
 
 def load_locked_capsules(before: datetime = None) -> List[Dict[str, Any]]:
     """
     Return list of capsules whose unlock_time <= before and status == 'locked'.
     If before is None, uses current time.
     """
-    init_db()
-    if before is None:
-        before = datetime.now()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, title, unlock_time, type, file_path, salt, nonce
-        FROM capsules
-        WHERE status = 'locked' AND unlock_time <= ?
-    """, (before.isoformat(),))
-    rows = cur.fetchall()
-    conn.close()
-
-    capsules = []
-    for r in rows:
-        capsules.append({
-            "id": r[0],
-            "title": r[1],
-            "unlock_time": datetime.fromisoformat(r[2]),
-            "type": r[3],
-            "file_path": r[4],
-            "salt": r[5],
-            "nonce": r[6],
-        })
-    return capsules
+    return get_engine().load_locked_capsules(before)
+
+def next_unlock_time(after: datetime = None) -> Optional[datetime]:
+    """
+    Return when the next locked capsule falls due after `after` (default: now),
+    or None if nothing is scheduled.
+    """
+    return get_engine().next_unlock_time(after)
+
+def list_capsules(status: str = None, capsule_type: str = None,
+                  unlock_from: datetime = None, unlock_to: datetime = None,
+                  sort: str = "unlock_time", descending: bool = False,
+                  after: tuple = None, limit: int = 200, title: str = None) -> List[Dict[str, Any]]:
+    """
+    Return one page of capsules matching the filters, ordered by `sort` (one of
+    SORT_COLUMNS) then id. Pass the "cursor" of a page's last row as `after` to
+    get the next page. `title` matches a case-insensitive substring.
+    """
+    return get_engine().list_capsules(status, capsule_type, unlock_from, unlock_to,
+                                      sort, descending, after, limit, title)
+
+def count_capsules(status: str = None, capsule_type: str = None,
+                   unlock_from: datetime = None, unlock_to: datetime = None, title: str = None) -> int:
+    """
+    Number of capsules matching the same filters as list_capsules().
+    """
+    return get_engine().count_capsules(status, capsule_type, unlock_from, unlock_to, title)
+
+def iter_capsules(status: str = None, capsule_type: str = None, title: str = None,
+                  unlock_from: datetime = None, unlock_to: datetime = None,
+                  sort: str = "unlock_time", descending: bool = False) -> Iterator[CapsuleRecord]:
+    """
+    Stream every capsule matching the filters as CapsuleRecords, ordered by `sort`
+    then id. Rows are fetched in batches from a live cursor, so memory use does not
+    grow with the vault; close the generator (or exhaust it) to release the cursor.
+    """
+    return get_engine().iter_capsules(status, capsule_type, title, unlock_from, unlock_to, sort, descending)
+
+def capsule_stats(status: str = None, capsule_type: str = None, title: str = None,
+                  unlock_from: datetime = None, unlock_to: datetime = None) -> Dict[str, Any]:
+    """
+    Aggregate counts for capsules matching the filters, computed in SQL: total, by
+    status, by type, per (status, type) group with its unlock-time range, the next
+    upcoming unlock, how many have a thumbnail and the number of archive partitions.
+    """
+    return get_engine().capsule_stats(status, capsule_type, title, unlock_from, unlock_to)
+
+def get_capsule(capsule_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Return one capsule's metadata (key material included, no payload), or None.
+    """
+    return get_engine().get_capsule(capsule_id)
+
+def load_thumbnail(capsule_id: int, key: bytes) -> Optional[bytes]:
+    """
+    Decrypt a capsule's preview thumbnail (JPEG) with the capsule key; None if it
+    has none. Raises cryptography's InvalidTag if the key is wrong.
+    """
+    return get_engine().load_thumbnail(capsule_id, key)
+
+def archive_capsules(keep_days: float = 30) -> List[Dict[str, Any]]:
+    """
+    Move months whose capsules are all unlocked (the last more than `keep_days` ago)
+    out of the hot catalog into read-only per-month archive partitions. Returns one
+    dict per partition written: period, file, moved, capsules.
+    """
+    return get_engine().archive_capsules(keep_days)
+
+def catalog_partitions() -> List[Dict[str, Any]]:
+    """
+    The vault's archive partitions, oldest first.
+    """
+    return get_engine().partitions()
 
 def read_encrypted_blob(file_path: str) -> bytes:
-    try:
-        with open(file_path, "rb") as f:
-            return f.read()
-    except FileNotFoundError:
-        print(f"Capsule file not found: {file_path}")
-        return None
+    """
+    Read a whole capsule blob. `file_path` is the locator stored with the capsule:
+    inline, pack-file range, sharded file or legacy absolute path.
+    """
+    return get_engine().read_encrypted_blob(file_path)
+
+def open_encrypted_blob(file_path: str) -> Optional[BinaryIO]:
+    """
+    Open a capsule blob for streaming reads. Caller closes the returned file.
+    """
+    return get_engine().open_encrypted_blob(file_path)
 
 def mark_unlocked(capsule_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE capsules SET status = 'unlocked' WHERE id = ?", (capsule_id,))
-    conn.commit()
-    conn.close()
+    get_engine().mark_unlocked(capsule_id)
+
+def mark_unlocked_many(capsule_ids):
+    """
+    Mark several capsules unlocked in a single transaction.
+    """
+    get_engine().mark_unlocked_many(capsule_ids)
 
 def check_capsules():
     """
     Check all capsules and print their status.
     """
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT id, title, unlock_time, status FROM capsules")
-    rows = cur.fetchall()
-    conn.close()
-
-    if not rows:
-        print("No capsules found.")
-        return
-
-    for r in rows:
-        print(f"ID: {r[0]}, Title: {r[1]}, Unlock Time: {r[2]}, Status: {r[3]}")
\ No newline at end of file
+    get_engine().check_capsules()
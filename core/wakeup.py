@@ -0,0 +1,70 @@
+# core/wakeup.py
+import select
+import socket
+from pathlib import Path
+from typing import Optional
+
+def _port_file(db_path) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(db_path.name + ".wake")
+
+class WakeupListener:
+    """
+    Loopback UDP socket the auto-unlock scheduler sleeps on.
+    Its port is published next to the vault database so that writers can wake the
+    scheduler as soon as a capsule is created (see notify_capsule_created).
+    """
+
+    def __init__(self, db_path):
+        self._port_file = _port_file(db_path)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.setblocking(False)
+        self._port_file.parent.mkdir(parents=True, exist_ok=True)
+        self._port_file.write_text(str(self._sock.getsockname()[1]))
+
+    def fileno(self) -> int:
+        """The socket's descriptor, for event loops (call drain() when it is readable)."""
+        return self._sock.fileno()
+
+    def drain(self):
+        """Discard everything queued: a burst of creates needs only one reschedule."""
+        while True:
+            try:
+                self._sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # e.g. Windows reports ICMP port-unreachable on the next recv
+                return
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """
+        Sleep until a wake-up arrives or `timeout` seconds pass.
+        Returns True if woken by a notification.
+        """
+        readable, _, _ = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return False
+        self.drain()
+        return True
+
+    def close(self):
+        try:
+            if self._port_file.read_text() == str(self._sock.getsockname()[1]):
+                self._port_file.unlink()
+        except OSError:
+            pass
+        self._sock.close()
+
+def notify_capsule_created(db_path):
+    """
+    Best-effort wake-up of a scheduler running against `db_path`.
+    Does nothing when no scheduler is listening.
+    """
+    try:
+        port = int(_port_file(db_path).read_text())
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"wake", ("127.0.0.1", port))
+    except (OSError, ValueError):
+        pass
@@ -1,86 +1,500 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-from core.storage import init_db, check_capsules, DB_PATH
-import sqlite3
-import os
+from tkinter import ttk, messagebox, simpledialog
+from cryptography.exceptions import InvalidTag
+from core.daemon import query_daemon
+from core.scheduler import decrypt_capsule
+from core.storage import (
+    list_capsules, count_capsules, get_capsule, load_thumbnail, open_encrypted_blob, vault_salt,
+)
+from gui.player import VideoPlayer, decode_image
+from core import kdf
+from gui.thumbnail_cache import ThumbnailCache
+from utils.keycache import KeyCache
+from utils.keymanager import (
+    KEY_SCHEME_VAULT, clear_key_cache, derive_capsule_key, derive_capsule_subkey, derive_master_key,
+)
+from utils.secure_temp import secure_delete
+import io
+import queue
+import threading
+from datetime import datetime, timedelta
 from PIL import Image, ImageTk
 import cv2
 
+PAGE_SIZE = 200
+# Fetch the next page once the visible part of the list passes this fraction.
+PREFETCH_AT = 0.9
+COLUMNS = (("ID", "id"), ("Title", "title"), ("Unlock Time", "unlock_time"), ("Type", "type"), ("Status", "status"))
+STATUS_CHOICES = ("All", "locked", "unlocked")
+TYPE_CHOICES = ("All", "text", "photo", "video")
+# Derived keys are kept this long after the password is entered; the password itself is not kept.
+KEY_TTL_SECONDS = 15 * 60
+
+class NeedPassword(Exception):
+    """No cached key opens this capsule; the password has to be asked for."""
+
+def is_due(capsule) -> bool:
+    """Whether a capsule's content may be shown: it is unlocked or its unlock time has passed."""
+    if capsule["status"] == "unlocked":
+        return True
+    return capsule["unlock_time"] is not None and capsule["unlock_time"] <= datetime.now()
+
+class QueryWorker(threading.Thread):
+    """
+    Runs storage queries off the Tk thread, one at a time in submission order.
+    Results are put on `results` as (tag, result, error) for the Tk side to poll.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.start()
+
+    def submit(self, tag, fn, **kwargs):
+        self.requests.put((tag, fn, kwargs))
+
+    def run(self):
+        while True:
+            tag, fn, kwargs = self.requests.get()
+            if fn is None:
+                return
+            try:
+                self.results.put((tag, fn(**kwargs), None))
+            except Exception as e:
+                self.results.put((tag, None, e))
+
+    def stop(self):
+        self.requests.put((None, None, None))
+
 class CapsuleListApp:
+    """
+    Capsule browser. Rows are fetched a page at a time (keyset pagination) on a
+    QueryWorker as the user scrolls, so opening the window costs one page however
+    many capsules there are. Sorting and filters run in SQL; Refresh re-reads the
+    loaded range and applies only the differences to the tree.
+    Photo and video capsules are previewed from their small encrypted thumbnail,
+    never the full blob, and only once they are due; decoded thumbnails are kept in
+    a ThumbnailCache. Keys derived from the password (master keys and per-capsule
+    keys) are cached for KEY_TTL_SECONDS and wiped on close; the password is not kept.
+    """
+
     def __init__(self, root):
         self.root = root
         self.root.title("TimeCapsule - Capsule List")
-        self.tree = ttk.Treeview(root, columns=("ID", "Title", "Unlock Time", "Type", "Status"), show="headings")
-        for col in ("ID", "Title", "Unlock Time", "Type", "Status"):
-            self.tree.heading(col, text=col)
+        self.worker = QueryWorker()
+        self._generation = 0  # bumped on every reload; older results are dropped
+        self._rows = {}       # tree item id -> capsule row
+        self._cursor = None
+        self._loading = False
+        self._exhausted = False
+        self._total = None
+        self.sort = "unlock_time"
+        self.descending = False
+        self.filters = {}
+        self.thumbnails = ThumbnailCache()
+        self.keys = KeyCache(ttl_seconds=KEY_TTL_SECONDS, max_entries=1024)
+
+        bar = tk.Frame(root)
+        bar.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(bar, text="Status").pack(side=tk.LEFT)
+        self.status_var = tk.StringVar(value="All")
+        ttk.Combobox(bar, textvariable=self.status_var, values=STATUS_CHOICES, width=9,
+                     state="readonly").pack(side=tk.LEFT, padx=(2, 8))
+        tk.Label(bar, text="Type").pack(side=tk.LEFT)
+        self.type_var = tk.StringVar(value="All")
+        ttk.Combobox(bar, textvariable=self.type_var, values=TYPE_CHOICES, width=7,
+                     state="readonly").pack(side=tk.LEFT, padx=(2, 8))
+        tk.Label(bar, text="Unlock from").pack(side=tk.LEFT)
+        self.from_var = tk.StringVar()
+        tk.Entry(bar, textvariable=self.from_var, width=11).pack(side=tk.LEFT, padx=2)
+        tk.Label(bar, text="to").pack(side=tk.LEFT)
+        self.to_var = tk.StringVar()
+        tk.Entry(bar, textvariable=self.to_var, width=11).pack(side=tk.LEFT, padx=2)
+        tk.Button(bar, text="Apply", command=self.apply_filters).pack(side=tk.LEFT, padx=8)
+
+        body = tk.Frame(root)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(body, columns=[c for c, _ in COLUMNS], show="headings")
+        for col, key in COLUMNS:
+            self.tree.heading(col, text=col, command=lambda k=key: self.sort_by(k))
             self.tree.column(col, width=120)
-        self.tree.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        self.thumb_label = tk.Label(body, text="No preview", width=40, anchor=tk.CENTER)
+        self.thumb_label.pack(side=tk.RIGHT, fill=tk.Y, padx=5)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+        self.count_label = tk.Label(root, text="Loading...")
+        self.count_label.pack(pady=(5, 0))
+        self.daemon_label = tk.Label(root, text="")
+        self.daemon_label.pack()
         self.preview_btn = tk.Button(root, text="Preview Capsule", command=self.preview_capsule)
         self.preview_btn.pack(pady=5)
-        self.refresh_btn = tk.Button(root, text="Refresh", command=self.load_capsules)
+        self.refresh_btn = tk.Button(root, text="Refresh", command=self.refresh)
         self.refresh_btn.pack(pady=5)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         self.load_capsules()
+        self._poll()
+
+    def _query(self, **extra):
+        return dict(self.filters, sort=self.sort, descending=self.descending, **extra)
 
     def load_capsules(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT id, title, unlock_time, type, status, file_path FROM capsules")
-        for row in cur.fetchall():
-            self.tree.insert("", tk.END, values=row[:5], tags=(row[3], row[4], row[5]))
-        conn.close()
+        """Clear the list and start again from the first page (filters or sort changed)."""
+        self._generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self._rows = {}
+        self._cursor = None
+        self._loading = False
+        self._exhausted = False
+        self._request_page()
+        self._request_count()
+        self._request_daemon_status()
+
+    def refresh(self):
+        """Re-read the rows loaded so far and apply only what changed."""
+        self._loading = True
+        limit = max(len(self._rows), PAGE_SIZE)
+        self.worker.submit((self._generation, "refresh", limit), list_capsules, **self._query(limit=limit))
+        self._request_count()
+        self._request_daemon_status()
+
+    def _request_page(self):
+        if self._loading or self._exhausted:
+            return
+        self._loading = True
+        self.worker.submit((self._generation, "page", PAGE_SIZE), list_capsules,
+                           **self._query(after=self._cursor, limit=PAGE_SIZE))
+
+    def _request_count(self):
+        self.worker.submit((self._generation, "count", None), count_capsules, **self.filters)
+
+    def _request_daemon_status(self):
+        # the autounlock daemon answers from its in-memory schedule, not the database
+        self.worker.submit((self._generation, "daemon", None), query_daemon, cmd="next", limit=1)
+
+    def _show_daemon_status(self, response):
+        if response is None or not response.get("ok"):
+            self.daemon_label.config(text="Autounlock daemon: not running")
+        elif response["capsules"]:
+            cap = response["capsules"][0]
+            when = cap["unlock_time"].replace("T", " ")
+            self.daemon_label.config(text=f"Autounlock daemon: next is '{cap['title']}' at {when}")
+        else:
+            self.daemon_label.config(text="Autounlock daemon: nothing scheduled")
+
+    def _poll(self):
+        try:
+            while True:
+                (generation, kind, extra), result, error = self.worker.results.get_nowait()
+                if kind == "decrypt":
+                    self._on_decrypted(extra, result, error)
+                    continue
+                if kind == "daemon":
+                    self._show_daemon_status(result)
+                    continue
+                if generation != self._generation:
+                    continue
+                if error is not None:
+                    self._loading = False
+                    messagebox.showerror("Capsules", f"Could not load capsules: {error}")
+                elif kind == "count":
+                    self._total = result
+                    self._update_count()
+                else:
+                    self._on_rows(kind, result, extra)
+        except queue.Empty:
+            pass
+        finally:
+            # a failing callback (a display error, say) must not stop the list updating
+            self.root.after(50, self._poll)
+
+    def _on_rows(self, kind, rows, limit):
+        if kind == "page":
+            for row in rows:
+                iid = str(row["id"])
+                self._rows[iid] = row
+                if self.tree.exists(iid):
+                    # its sort key changed since an earlier page (e.g. it was unlocked): move it here
+                    self.tree.item(iid, values=self._values(row))
+                    self.tree.move(iid, "", tk.END)
+                else:
+                    self.tree.insert("", tk.END, iid=iid, values=self._values(row))
+        else:
+            self._apply_diff(rows)
+        if rows:
+            self._cursor = rows[-1]["cursor"]
+        self._exhausted = len(rows) < limit
+        self._loading = False
+        self._update_count()
+        # Keep fetching until the view is filled (or the user has scrolled near the end).
+        self.root.after_idle(lambda: self._on_scroll(*self.tree.yview()))
+
+    def _apply_diff(self, rows):
+        new_ids = [str(row["id"]) for row in rows]
+        wanted = set(new_ids)
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+        old_rows, self._rows = self._rows, {}
+        for index, row in enumerate(rows):
+            iid = new_ids[index]
+            values = self._values(row)
+            old = old_rows.get(iid)
+            if old is None:
+                self.tree.insert("", index, iid=iid, values=values)
+            elif self._values(old) != values:
+                self.tree.item(iid, values=values)
+            self._rows[iid] = row
+        # Only reorder when a sort key actually changed.
+        if self.tree.get_children() != tuple(new_ids):
+            for index, iid in enumerate(new_ids):
+                self.tree.move(iid, "", index)
+
+    @staticmethod
+    def _values(row):
+        unlock_time = row["unlock_time"].strftime("%Y-%m-%d %H:%M:%S") if row["unlock_time"] else ""
+        return (row["id"], row["title"], unlock_time, row["type"], row["status"])
+
+    def _update_count(self):
+        shown = len(self._rows)
+        total = f" of {self._total}" if self._total is not None else ""
+        self.count_label.config(text=f"Showing {shown}{total}")
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= PREFETCH_AT:
+            self._request_page()
+
+    def sort_by(self, key):
+        if key == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort, self.descending = key, False
+        self.load_capsules()
+
+    def apply_filters(self):
+        try:
+            unlock_from = self._parse_date(self.from_var.get())
+            unlock_to = self._parse_date(self.to_var.get())
+        except ValueError:
+            messagebox.showerror("Filter", "Dates must be YYYY-MM-DD.")
+            return
+        self.filters = {
+            "status": None if self.status_var.get() == "All" else self.status_var.get(),
+            "capsule_type": None if self.type_var.get() == "All" else self.type_var.get(),
+            "unlock_from": unlock_from,
+            # the "to" date is inclusive
+            "unlock_to": unlock_to + timedelta(days=1, seconds=-1) if unlock_to else None,
+        }
+        self.load_capsules()
+
+    @staticmethod
+    def _parse_date(text):
+        text = text.strip()
+        return datetime.strptime(text, "%Y-%m-%d") if text else None
+
+    def close(self):
+        self.worker.stop()
+        self.thumbnails.clear()
+        self.keys.clear()
+        clear_key_cache()
+        self.root.destroy()
+
+    def _capsule_key(self, cap, password=None):
+        """
+        Runs on the worker: the capsule's key from the cache, else derived from `password`
+        (a cached master key is enough for vault-scheme capsules). Raises NeedPassword
+        if neither is available.
+        """
+        key = self.keys.get(("capsule", cap["id"]))
+        if key is not None:
+            return key
+        if cap["key_scheme"] == KEY_SCHEME_VAULT:
+            params = kdf.encode_params(cap["kdf_params"])
+            master_key = self.keys.get(("master", params))
+            if master_key is None:
+                if password is None:
+                    raise NeedPassword()
+                salt = vault_salt()
+                if salt is None:
+                    raise ValueError("Capsule uses the vault master key but the vault has no salt.")
+                master_key = derive_master_key(password, salt, cap["kdf_params"])
+                self.keys.put(("master", params), master_key)
+            key = derive_capsule_subkey(master_key, cap["salt"])
+        else:
+            if password is None:
+                raise NeedPassword()
+            # one slow KDF per capsule under this scheme; cached so it runs once
+            key = derive_capsule_key(password, cap["salt"], cap["key_scheme"], kdf_params=cap["kdf_params"])
+        self.keys.put(("capsule", cap["id"]), key)
+        return key
+
+    def _fetch_thumbnail(self, capsule_id, password=None):
+        """Runs on the worker: get the capsule key, decrypt and decode its thumbnail."""
+        cached = self.thumbnails.get(capsule_id)
+        if cached is not None:
+            return cached
+        cap = get_capsule(capsule_id)
+        if cap is None or not is_due(cap):
+            return None
+        data = load_thumbnail(capsule_id, self._capsule_key(cap, password))
+        if data is None:
+            return None
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        self.thumbnails.put(capsule_id, img)
+        return img
+
+    def _fetch_content(self, capsule_id, password=None):
+        """
+        Runs on the worker: decrypt an unlocked capsule's payload the way an unlock
+        does. Returns bytes, or for videos the path of a secure temp file.
+        """
+        cap = get_capsule(capsule_id)
+        if cap is None or cap["status"] != "unlocked":
+            raise ValueError("Capsule is not unlocked.")
+        key = self._capsule_key(cap, password)
+        blob = open_encrypted_blob(cap["file_path"])
+        if blob is None:
+            raise FileNotFoundError("Capsule file not found.")
+        with blob:
+            return decrypt_capsule(blob, cap["nonce"], key, cap["type"], cap["compression"])
+
+    def _ask_password(self):
+        password = simpledialog.askstring(
+            "Password", "Password to decrypt capsule previews:", show="*", parent=self.root
+        )
+        return password or None
+
+    def _decrypt(self, row, fetch, callback, ask=True):
+        """
+        Run `fetch(capsule_id, password)` on the worker and call `callback(result)`
+        with its result. With `ask` unset, gives up instead of prompting when no
+        cached key opens the capsule.
+        """
+        self.worker.submit((self._generation, "decrypt", (row, fetch, callback, ask)), fetch,
+                           capsule_id=row["id"])
+
+    def _on_decrypted(self, request, result, error):
+        row, fetch, callback, ask = request
+        if isinstance(error, NeedPassword):
+            password = self._ask_password() if ask else None
+            if password is not None:
+                # the password only travels with this request; the worker keeps the derived keys
+                self.worker.submit((self._generation, "decrypt", (row, fetch, callback, False)), fetch,
+                                   capsule_id=row["id"], password=password)
+            return
+        if isinstance(error, InvalidTag):
+            self.keys.clear()
+            messagebox.showerror("Preview", "Wrong password for this capsule.")
+        elif error is not None:
+            messagebox.showerror("Preview", f"Cannot load preview: {error}")
+        elif result is not None:
+            callback(result)
+
+    def with_thumbnail(self, row, callback, ask=True):
+        """
+        Call `callback(image)` with a due capsule's decoded thumbnail: straight away
+        if cached, otherwise after it is decrypted on the worker.
+        """
+        if not is_due(row):
+            return
+        cached = self.thumbnails.get(row["id"])
+        if cached is not None:
+            callback(cached)
+            return
+        self._decrypt(row, self._fetch_thumbnail, callback, ask)
+
+    def _on_select(self, event=None):
+        selected = self.tree.selection()
+        row = self._rows.get(selected[0]) if selected else None
+        self.thumb_label.config(image="", text="No preview")
+        self.thumb_label.image = None
+        if row is not None and row["has_thumbnail"]:
+            # only decrypt on selection if a cached key opens it
+            self.with_thumbnail(row, lambda img, iid=selected[0]: self._show_in_pane(iid, img), ask=False)
+
+    def _show_in_pane(self, iid, img):
+        if self.tree.selection()[:1] != (iid,):
+            return
+        img = img.copy()
+        img.thumbnail((280, 210))
+        imgtk = ImageTk.PhotoImage(img)
+        self.thumb_label.config(image=imgtk, text="")
+        self.thumb_label.image = imgtk
+
+    def show_thumbnail(self, img, title):
+        win = tk.Toplevel(self.root)
+        win.title(f"Preview: {title}")
+        imgtk = ImageTk.PhotoImage(img)
+        label = tk.Label(win, image=imgtk)
+        label.image = imgtk
+        label.pack()
 
     def preview_capsule(self):
         selected = self.tree.selection()
         if not selected:
             messagebox.showinfo("Preview", "Select a capsule to preview.")
             return
-        item = self.tree.item(selected[0])
-        values = item["values"]
-        capsule_id, title, unlock_time, ctype, status = values
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT file_path FROM capsules WHERE id=?", (capsule_id,))
-        file_path = cur.fetchone()[0]
-        conn.close()
-        if not os.path.exists(file_path):
-            messagebox.showerror("Preview", "Capsule file not found.")
+        row = self._rows[selected[0]]
+        title, ctype = row["title"], row["type"]
+        if not is_due(row):
+            when = row["unlock_time"].strftime("%Y-%m-%d %H:%M:%S") if row["unlock_time"] else "an unknown time"
+            messagebox.showinfo("Preview", f"'{title}' is locked until {when}.")
+            return
+        if ctype in ("photo", "video") and row["has_thumbnail"]:
+            # the thumbnail is enough for a preview; the full blob stays untouched
+            iid = selected[0]
+            def show(img):
+                self._show_in_pane(iid, img)
+                self.show_thumbnail(img, title)
+            self.with_thumbnail(row, show)
+            return
+        if row["status"] != "unlocked":
+            messagebox.showinfo("Preview", f"'{title}' is due but not unlocked yet; unlock it to see its content.")
             return
-        if ctype == "photo":
-            self.show_image(file_path, title)
-        elif ctype == "video":
-            self.play_video(file_path, title)
+        # the full content is decrypted on the worker, exactly as an unlock would
+        if ctype == "video":
+            # decrypted into a secure temp file (memfd where available) for the player
+            self._decrypt(row, self._fetch_content, lambda path: self._play_and_delete(path, title))
+        elif ctype == "photo":
+            self._decrypt(row, self._fetch_content, lambda data: self.show_image(data, title))
         else:
-            with open(file_path, "rb") as f:
-                data = f.read()
-            self.show_text(data, title)
+            self._decrypt(row, self._fetch_content, lambda data: self.show_text(data, title))
 
-    def show_image(self, file_path, title):
+    def show_image(self, data, title):
+        try:
+            img = decode_image(data, max_size=(480, 360))
+        except RuntimeError:
+            messagebox.showerror("Preview", "Cannot decode image.")
+            return
         win = tk.Toplevel(self.root)
         win.title(f"Preview: {title}")
-        img = Image.open(file_path)
-        img.thumbnail((480, 360))
-        imgtk = ImageTk.PhotoImage(img)
+        imgtk = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
         label = tk.Label(win, image=imgtk)
         label.image = imgtk
         label.pack()
 
+    def _play_and_delete(self, path, title):
+        try:
+            self.play_video(path, title)
+        finally:
+            secure_delete(path)
+
     def play_video(self, file_path, title):
-        cap = cv2.VideoCapture(file_path)
-        if not cap.isOpened():
+        try:
+            player = VideoPlayer(file_path, max_size=(480, 360))
+        except RuntimeError:
             messagebox.showerror("Preview", "Cannot open video.")
             return
-        cv2.namedWindow(title, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(title, 480, 360)
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            cv2.imshow(title, frame)
-            if cv2.waitKey(33) & 0xFF == ord('q'):
-                break
-        cap.release()
+        with player:
+            cv2.namedWindow(title, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(title, *player.display_size)
+            player.play(title)
         cv2.destroyWindow(title)
 
     def show_text(self, data, title):
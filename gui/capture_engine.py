@@ -0,0 +1,126 @@
+# gui/capture_engine.py
+import threading
+import time
+import tkinter as tk
+import cv2
+from PIL import Image, ImageTk
+from capture.source import open_source
+
+class FrameGrabber(threading.Thread):
+    """
+    Reads a FrameSource (camera by default) on a background thread and keeps only
+    the latest frame.
+    Each frame is resized to `frame_size` for capture/recording, and a preview copy
+    is downscaled to `preview_size` and converted to RGB here, off the Tk thread.
+    `on_frame`, if set, is called from this thread with every captured frame.
+    """
+
+    def __init__(self, source=None, frame_size=(960, 720)):
+        super().__init__(daemon=True)
+        self.source = open_source(source)
+        self.frame_size = frame_size
+        self.preview_size = frame_size
+        self.on_frame = None
+        self.fps = 0.0  # measured capture rate (moving average)
+        self._lock = threading.Lock()
+        self._frame = None
+        self._preview = None
+        self._seq = 0
+        self._running = True
+        self.start()
+
+    def run(self):
+        last = None
+        while self._running:
+            ret, frame = self.source.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            if (frame.shape[1], frame.shape[0]) != self.frame_size:
+                frame = cv2.resize(frame, self.frame_size)
+            preview_size = self.preview_size
+            preview = frame
+            if preview_size != self.frame_size:
+                preview = cv2.resize(frame, preview_size, interpolation=cv2.INTER_AREA)
+            preview = cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)
+
+            now = time.perf_counter()
+            if last is not None and now > last:
+                rate = 1.0 / (now - last)
+                self.fps = rate if not self.fps else 0.9 * self.fps + 0.1 * rate
+            last = now
+
+            with self._lock:
+                self._frame = frame
+                self._preview = preview
+                self._seq += 1
+            on_frame = self.on_frame
+            if on_frame is not None:
+                on_frame(frame)
+        self.source.release()
+
+    def latest_frame(self):
+        """Most recent full-size BGR frame, or None before the first one arrives."""
+        with self._lock:
+            return self._frame
+
+    def latest_preview(self):
+        """(sequence number, RGB preview array) of the most recent frame."""
+        with self._lock:
+            return self._seq, self._preview
+
+    def stop(self):
+        self._running = False
+        self.join(timeout=1.0)
+
+class PreviewRenderer:
+    """
+    Draws a FrameGrabber's preview into one reused canvas image item.
+    New frames are pasted into the same PhotoImage; ticks with no new frame cost
+    nothing. If drawing takes too large a share of the capture frame interval the
+    preview resolution is lowered (and raised again once there is headroom).
+    """
+
+    def __init__(self, canvas, grabber: FrameGrabber, size, min_scale=0.4):
+        self.canvas = canvas
+        self.grabber = grabber
+        self.size = size
+        self.min_scale = min_scale
+        self.scale = 1.0
+        self.photo = None
+        self.item = canvas.create_image(size[0] // 2, size[1] // 2, anchor=tk.CENTER)
+        self._seq = 0
+        self._cost = 0.0  # seconds per drawn frame (moving average)
+
+    def tick(self) -> int:
+        """Draw the newest frame if there is one; returns the delay (ms) until the next tick."""
+        seq, preview = self.grabber.latest_preview()
+        if preview is not None and seq != self._seq:
+            self._seq = seq
+            start = time.perf_counter()
+            img = Image.fromarray(preview)
+            if self.photo is None or (self.photo.width(), self.photo.height()) != img.size:
+                self.photo = ImageTk.PhotoImage(image=img)
+                self.canvas.itemconfig(self.item, image=self.photo)
+            else:
+                self.photo.paste(img)
+            cost = time.perf_counter() - start
+            self._cost = cost if not self._cost else 0.8 * self._cost + 0.2 * cost
+            self._adapt()
+        # poll at about twice the capture rate so no frame waits long
+        interval = 1.0 / self.grabber.fps if self.grabber.fps else 0.015
+        return max(5, int(interval * 500))
+
+    def _adapt(self):
+        if not self.grabber.fps:
+            return
+        budget = 1.0 / self.grabber.fps
+        scale = self.scale
+        if self._cost > 0.6 * budget and scale > self.min_scale:
+            scale = max(self.min_scale, scale * 0.8)
+        elif self._cost < 0.25 * budget and scale < 1.0:
+            scale = min(1.0, scale * 1.25)
+        if scale != self.scale:
+            self.scale = scale
+            self._cost = 0.0
+            self.grabber.preview_size = (int(self.size[0] * scale), int(self.size[1] * scale))
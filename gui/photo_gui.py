@@ -1,20 +1,19 @@
 import tkinter as tk
 from tkinter import messagebox
-import cv2
-from PIL import Image, ImageTk
-import tempfile
-import os
+from capture.pipeline import encode_photo
+from gui.capture_engine import FrameGrabber, PreviewRenderer
 
 class PhotoCaptureApp:
-    def __init__(self, window, window_title, countdown=3):
+    def __init__(self, window, window_title, countdown=3, source=None):
         self.window = window
         self.window.title(window_title)
-        self.video_source = 0
+        self.video_source = source
         self.width = 960  
         self.height = 720  
-        self.vid = cv2.VideoCapture(self.video_source)
+        self.grabber = FrameGrabber(self.video_source, (self.width, self.height))
         self.canvas = tk.Canvas(window, width=self.width, height=self.height)
         self.canvas.pack()
+        self.preview = PreviewRenderer(self.canvas, self.grabber, (self.width, self.height))
         self.btn_prepare = tk.Button(window, text="Prepare Photo", width=20, command=self.start_countdown)
         self.btn_prepare.pack(anchor=tk.CENTER, expand=True)
         self.btn_capture = tk.Button(window, text="Capture Photo", width=20, command=self.capture_photo, state=tk.DISABLED)
@@ -23,7 +22,6 @@ class PhotoCaptureApp:
         self.btn_quit.pack(anchor=tk.CENTER, expand=True)
         self.label = tk.Label(window, text="Adjust your orientation, then click 'Prepare Photo'.")
         self.label.pack(anchor=tk.CENTER, expand=True)
-        self.delay = 15
         self.photo_bytes = None
         self.captured = False
         self.countdown = countdown
@@ -44,39 +42,26 @@ class PhotoCaptureApp:
             self.btn_capture.config(state=tk.NORMAL)
 
     def capture_photo(self):
-        ret, frame = self.vid.read()
-        if ret:
-            frame = cv2.resize(frame, (self.width, self.height))  # Resize to match window
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, frame)
-            with open(temp_path, "rb") as f:
-                self.photo_bytes = f.read()
-            os.remove(temp_path)
+        frame = self.grabber.latest_frame()  # already sized to match window
+        if frame is not None:
+            self.photo_bytes = encode_photo(frame)  # in memory, never on disk
             messagebox.showinfo("Photo", "Photo captured! Close window to finish.")
             self.captured = True
             self.btn_capture.config(state=tk.DISABLED)
             self.label.config(text="Photo captured. You may close the window.")
 
     def update(self):
-        ret, frame = self.vid.read()
-        if ret:
-            frame = cv2.resize(frame, (self.width, self.height))  
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.canvas.imgtk = imgtk
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
+        delay = self.preview.tick()
         if not self.captured:
-            self.window.after(self.delay, self.update)
+            self.window.after(delay, self.update)
 
     def quit(self):
-        self.vid.release()
+        self.grabber.stop()
         self.window.destroy()
 
-def capture_photo_gui():
+def capture_photo_gui(source=None):
     root = tk.Tk()
-    app = PhotoCaptureApp(root, "Photo Capture")
+    app = PhotoCaptureApp(root, "Photo Capture", source=source)
     root.mainloop()
     return app.photo_bytes
 
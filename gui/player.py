@@ -1,59 +1,258 @@
 # gui/player.py
-import cv2
+import io
+import queue
+import threading
+import time
 from utils.secure_temp import create_secure_temp_file, secure_delete
-from typing import Optional
+from typing import Any, Dict, Optional
 
-def play_video_from_bytes(data: bytes, window_title: str = "TimeCapsule Video"):
-    path = create_secure_temp_file(data, suffix=".mp4")
-    try:
-        while True:
-            cap = cv2.VideoCapture(path)
-            if not cap.isOpened():
-                cap.release()
-                raise RuntimeError("Unable to open video with OpenCV. Your system may lack codec support.")
-            cv2.namedWindow(window_title, cv2.WINDOW_NORMAL)
-            cv2.resizeWindow(window_title, 960, 720)
-            while True:
-                ret, frame = cap.read()
-                if not ret:
+# cv2 is imported inside the video/image functions: text capsules are shown through
+# this module too, and should not need OpenCV (or a display) to be installed.
+
+DISPLAY_SIZE = (960, 720)          # frames larger than this are scaled down to fit
+QUEUE_FRAMES = 16                  # decoded frames buffered ahead of the display
+REPLAY_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_FPS = 30.0
+
+class VideoPlayer:
+    """
+    Plays a video through a decoder thread. The thread reads frames, scales them to
+    fit `max_size` and fills a bounded queue; the display side shows each frame at
+    its presentation time from the container's FPS. A frame that is already more
+    than one frame late is dropped, and the decoder skips the colour conversion and
+    scaling of frames that are late before they are decoded, so playback keeps real
+    time on slow machines. Decoded frames are kept (up to `cache_bytes`) so a replay
+    needs no decoding; otherwise the open source is rewound, not reopened.
+    """
+
+    def __init__(self, path: str, max_size=DISPLAY_SIZE, queue_frames: int = QUEUE_FRAMES,
+                 cache_bytes: int = REPLAY_CACHE_BYTES):
+        import cv2
+        self._cv2 = cv2
+        self._path = path
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            self._cap.release()
+            raise RuntimeError("Unable to open video with OpenCV. Your system may lack codec support.")
+        fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and 1 <= fps <= 240 else DEFAULT_FPS
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or max_size[0]
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or max_size[1]
+        self._scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+        self.display_size = (max(1, round(width * self._scale)), max(1, round(height * self._scale)))
+        self._queue_frames = queue_frames
+        self._cache_bytes = cache_bytes
+        self._cache = []
+        self._cache_complete = False
+        self._decoded_once = False
+        self._start = None
+
+    def _fit(self, frame):
+        if self._scale >= 1.0:
+            return frame
+        return self._cv2.resize(frame, self.display_size, interpolation=self._cv2.INTER_AREA)
+
+    def _rewind(self):
+        if not self._cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0):
+            self._cap.release()
+            self._cap = self._cv2.VideoCapture(self._path)
+
+    @staticmethod
+    def _put(out: queue.Queue, item, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _decode(self, out: queue.Queue, stop: threading.Event):
+        """Decoder thread: read, drop or scale frames, and queue (index, frame); None ends."""
+        caching = not self._decoded_once
+        cached_bytes = 0
+        interval = 1.0 / self.fps
+        index = 0
+        try:
+            while not stop.is_set():
+                start = self._start
+                if start is not None and time.perf_counter() > start + (index + 1) * interval:
+                    # already late: demux/decode only, skip conversion and scaling
+                    if not self._cap.grab():
+                        break
+                    caching = False
+                    self._cache = []
+                    index += 1
+                    continue
+                ok, frame = self._cap.read()
+                if not ok:
+                    break
+                frame = self._fit(frame)
+                if caching:
+                    cached_bytes += frame.nbytes
+                    if cached_bytes <= self._cache_bytes:
+                        self._cache.append(frame)
+                    else:
+                        caching = False
+                        self._cache = []
+                self._put(out, (index, frame), stop)
+                index += 1
+            else:
+                caching = False  # stopped early: the cache is incomplete
+            self._cache_complete = caching
+        finally:
+            self._decoded_once = True
+            self._put(out, None, stop)
+
+    def play(self, window_title: str) -> Dict[str, Any]:
+        """
+        Show the video in an OpenCV window, paced to its FPS; 'q' stops.
+        Returns {"shown", "dropped", "quit"}.
+        """
+        cv2 = self._cv2
+        stats = {"shown": 0, "dropped": 0, "quit": False}
+        stop = threading.Event()
+        decoder = None
+        if self._cache_complete:
+            frames = iter(enumerate(self._cache))
+        else:
+            if self._decoded_once:
+                self._rewind()
+            out = queue.Queue(maxsize=self._queue_frames)
+            decoder = threading.Thread(target=self._decode, args=(out, stop), daemon=True)
+            frames = iter(out.get, None)
+        interval = 1.0 / self.fps
+        self._start = None
+        try:
+            if decoder is not None:
+                decoder.start()
+            for index, frame in frames:
+                now = time.perf_counter()
+                if self._start is None:
+                    self._start = now - index * interval
+                due = self._start + index * interval
+                if now > due + interval:
+                    stats["dropped"] += 1
+                    continue
+                if due > now and cv2.waitKey(max(1, int((due - now) * 1000))) & 0xFF == ord('q'):
+                    stats["quit"] = True
                     break
                 cv2.imshow(window_title, frame)
-                if cv2.waitKey(33) & 0xFF == ord('q'):
+                stats["shown"] += 1
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    stats["quit"] = True
                     break
-            cap.release()
+        finally:
+            stop.set()
+            if decoder is not None:
+                decoder.join()
+        return stats
+
+    def close(self):
+        self._cap.release()
+        self._cache = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def play_video_from_file(path: str, window_title: str = "TimeCapsule Video"):
+    """
+    Play a decrypted video file, offering replays until the user declines.
+    """
+    import cv2
+    with VideoPlayer(path) as player:
+        while True:
+            cv2.namedWindow(window_title, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(window_title, *player.display_size)
+            player.play(window_title)
             cv2.destroyWindow(window_title)
             replay = input("Replay video? (y/n): ").strip().lower()
             if replay != "y":
                 break
-    finally:
-        secure_delete(path)
 
-def show_image_from_bytes(data: bytes, window_title: str = "TimeCapsule Photo"):
+def play_video_from_bytes(data: bytes, window_title: str = "TimeCapsule Video"):
     """
-    Display an image using OpenCV (via PIL for more formats).
+    Play decrypted video bytes. OpenCV needs a path, so the bytes go to the fastest
+    secure temp backend available (memfd, tmpfs, then disk; see utils.secure_temp).
     """
-    path = create_secure_temp_file(data, suffix=".jpg")
+    path = create_secure_temp_file(data, suffix=".mp4")
     try:
-        img = cv2.imread(path)
-        if img is None:
-            # fallback: use PIL to convert then read
-            from PIL import Image
-            tmp = Image.open(path)
-            tmp_path = create_secure_temp_file(tmp.tobytes(), suffix=".bmp")
-            img = cv2.imread(tmp_path)
-            secure_delete(tmp_path)
-
-        if img is None:
-            raise RuntimeError("Cannot decode image for display.")
-        cv2.namedWindow(window_title, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_title, 960, 720)
-        cv2.imshow(window_title, img)
-        print("Press any key in the image window to continue...")
-        cv2.waitKey(0)
-        cv2.destroyWindow(window_title)
+        play_video_from_file(path, window_title=window_title)
     finally:
         secure_delete(path)
 
+def _source_size(data: bytes):
+    """(width, height) from the image header, without decoding pixels; None if unknown."""
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+def _decode_flag(cv2, source_size, max_size) -> int:
+    """Largest IMREAD_REDUCED_COLOR_* whose output still covers max_size (JPEG scales while decoding)."""
+    if source_size is None or max_size is None:
+        return cv2.IMREAD_COLOR
+    ratio = min(source_size[0] / max_size[0], source_size[1] / max_size[1])
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if ratio >= factor:
+            return flag
+    return cv2.IMREAD_COLOR
+
+def _decode_with_pil(data: bytes, max_size):
+    """Fallback for formats OpenCV cannot read (GIF, palette/CMYK TIFF, ...). BGR array or None."""
+    import cv2
+    import numpy as np
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            if max_size is not None:
+                img.draft("RGB", max_size)  # JPEG: decode at 1/2, 1/4 or 1/8 scale
+                img.thumbnail(max_size)
+            rgb = np.asarray(img.convert("RGB"))
+    except Exception:
+        return None
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+def decode_image(data: bytes, max_size=DISPLAY_SIZE):
+    """
+    Decode an image from memory into a BGR array no larger than `max_size` (None: full size).
+    Large sources are decoded at reduced resolution (OpenCV IMREAD_REDUCED_*, PIL draft),
+    so a photo shown in a small window is never fully decoded. Raises RuntimeError if
+    neither OpenCV nor PIL can read it.
+    """
+    import cv2
+    import numpy as np
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), _decode_flag(cv2, _source_size(data), max_size))
+    if img is None:
+        img = _decode_with_pil(data, max_size)
+    if img is None:
+        raise RuntimeError("Cannot decode image for display.")
+    if max_size is not None:
+        height, width = img.shape[:2]
+        scale = min(max_size[0] / width, max_size[1] / height)
+        if scale < 1.0:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+    return img
+
+def show_image_from_bytes(data: bytes, window_title: str = "TimeCapsule Photo"):
+    """
+    Display an image using OpenCV (PIL for formats OpenCV cannot read), decoded in memory.
+    """
+    import cv2
+    img = decode_image(data)
+    cv2.namedWindow(window_title, cv2.WINDOW_NORMAL)
+    cv2.resizeWindow(window_title, img.shape[1], img.shape[0])
+    cv2.imshow(window_title, img)
+    print("Press any key in the image window to continue...")
+    cv2.waitKey(0)
+    cv2.destroyWindow(window_title)
+
 def show_text_from_bytes(data: bytes, title: Optional[str] = None):
     """
     Print text in console and wait for user acknowledgement.
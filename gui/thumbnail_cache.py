@@ -0,0 +1,47 @@
+# gui/thumbnail_cache.py
+import threading
+from collections import OrderedDict
+
+class ThumbnailCache:
+    """
+    LRU cache of decoded thumbnails (PIL images) keyed by capsule id, bounded by
+    the memory their pixels take rather than by entry count. Lives only in
+    process memory; nothing decoded is written anywhere.
+    """
+
+    def __init__(self, budget_bytes: int = 32 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self._entries = OrderedDict()  # capsule id -> (PIL image, size in bytes)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cost(image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, capsule_id):
+        with self._lock:
+            entry = self._entries.get(capsule_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(capsule_id)
+            return entry[0]
+
+    def put(self, capsule_id, image):
+        cost = self._cost(image)
+        with self._lock:
+            old = self._entries.pop(capsule_id, None)
+            if old is not None:
+                self.used_bytes -= old[1]
+            if cost > self.budget_bytes:
+                return
+            self._entries[capsule_id] = (image, cost)
+            self.used_bytes += cost
+            while self.used_bytes > self.budget_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
@@ -1,83 +1,141 @@
 import tkinter as tk
 from tkinter import messagebox
 import cv2
-from PIL import Image, ImageTk
-import tempfile
-import os
+from capture.pipeline import MemoryVideoSink
+from gui.capture_engine import FrameGrabber, PreviewRenderer
+import queue
+import threading
+
+class FrameEncoder(threading.Thread):
+    """
+    Background video encoder fed through a bounded queue.
+    The UI thread hands frames over with submit(), which never blocks: when the
+    encoder falls behind and the queue is full the new frame is dropped and
+    counted, so memory stays at most `max_queued` frames however long the
+    recording runs.
+    """
+
+    def __init__(self, path, fps, frame_size, max_queued=32):
+        super().__init__(daemon=True)
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.writer = cv2.VideoWriter(path, fourcc, fps, frame_size)
+        if not self.writer.isOpened():
+            self.writer.release()
+            raise RuntimeError("Unable to open video writer with OpenCV. Your system may lack codec support.")
+        self.frames = queue.Queue(maxsize=max_queued)
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.start()
+
+    def submit(self, frame):
+        try:
+            self.frames.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            self.writer.write(frame)
+            self.frames_written += 1
+        self.writer.release()
+
+    def finish(self):
+        """Flush queued frames and close the file. Blocks for at most one queue's worth of encoding."""
+        self.frames.put(None)
+        self.join()
 
 class VideoCaptureApp:
-    def __init__(self, window, window_title, fps=20.0):
+    def __init__(self, window, window_title, fps=20.0, max_queued_frames=32, source=None):
         self.window = window
         self.window.title(window_title)
-        self.video_source = 0
+        self.video_source = source
         self.width = 960  
         self.height = 720  
-        self.vid = cv2.VideoCapture(self.video_source)
+        self.grabber = FrameGrabber(self.video_source, (self.width, self.height))
         self.fps = fps
         self.recording = False
-        self.frames = []
+        self.max_queued_frames = max_queued_frames
+        self.encoder = None
+        self.sink = None
         self.canvas = tk.Canvas(window, width=self.width, height=self.height)
         self.canvas.pack()
+        self.preview = PreviewRenderer(self.canvas, self.grabber, (self.width, self.height))
         self.btn_record = tk.Button(window, text="Start Recording", width=20, command=self.toggle_recording)
         self.btn_record.pack(anchor=tk.CENTER, expand=True)
         self.btn_quit = tk.Button(window, text="Quit", width=10, command=self.quit)
         self.btn_quit.pack(anchor=tk.CENTER, expand=True)
         self.label = tk.Label(window, text="Adjust your orientation, then click 'Start Recording'.")
         self.label.pack(anchor=tk.CENTER, expand=True)
-        self.delay = 15
+        self.video_bytes = None
         self.update()
         self.window.protocol("WM_DELETE_WINDOW", self.quit)
-        self.video_bytes = None
 
     def toggle_recording(self):
         if not self.recording:
+            if not self.start_encoder():
+                return
+            # every captured frame goes to the encoder straight from the grabber thread
+            self.grabber.on_frame = self.encoder.submit
             self.recording = True
-            self.frames = []
             self.btn_record.config(text="Stop Recording")
             self.label.config(text="Recording... Click 'Stop Recording' to finish.")
         else:
             self.recording = False
+            self.grabber.on_frame = None
             self.btn_record.config(text="Start Recording")
             self.label.config(text="Adjust your orientation, then click 'Start Recording'.")
             self.save_video()
 
     def update(self):
-        ret, frame = self.vid.read()
-        if ret:
-            frame = cv2.resize(frame, (self.width, self.height))  # Resize to match window
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.canvas.imgtk = imgtk
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
-            if self.recording:
-                self.frames.append(frame)
-        self.window.after(self.delay, self.update)
+        delay = self.preview.tick()
+        self.window.after(delay, self.update)
+
+    def start_encoder(self) -> bool:
+        # encode into anonymous memory rather than a temp file on disk
+        self.sink = MemoryVideoSink(".mp4")
+        try:
+            self.encoder = FrameEncoder(self.sink.path, self.fps, (self.width, self.height),
+                                        max_queued=self.max_queued_frames)
+        except RuntimeError as e:
+            self.sink.close()
+            messagebox.showerror("Video", str(e))
+            return False
+        return True
 
     def save_video(self):
-        if not self.frames:
-            messagebox.showinfo("Video", "No frames recorded.")
+        encoder, self.encoder = self.encoder, None
+        encoder.finish()
+        try:
+            if not encoder.frames_written:
+                messagebox.showinfo("Video", "No frames recorded.")
+                return
+            video_bytes = self.sink.read()
+        finally:
+            self.sink.close()
+        if not video_bytes:
+            messagebox.showerror("Video", "Recording failed: the encoder produced no data.")
             return
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-        temp_path = temp_file.name
-        height, width, _ = self.frames[0].shape
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(temp_path, fourcc, self.fps, (width, height))
-        for frame in self.frames:
-            out.write(frame)
-        out.release()
-        with open(temp_path, "rb") as f:
-            self.video_bytes = f.read()
-        os.remove(temp_path)
-        messagebox.showinfo("Video", "Video captured! Close window to finish.")
+        self.video_bytes = video_bytes
+        message = "Video captured! Close window to finish."
+        if encoder.frames_dropped:
+            message += f"\n({encoder.frames_dropped} frames dropped because the encoder fell behind.)"
+        messagebox.showinfo("Video", message)
 
     def quit(self):
-        self.vid.release()
+        self.grabber.on_frame = None
+        if self.encoder is not None:
+            self.recording = False
+            self.encoder.finish()
+            self.sink.close()
+        self.grabber.stop()
         self.window.destroy()
 
-def record_video_gui():
+def record_video_gui(source=None):
     root = tk.Tk()
-    app = VideoCaptureApp(root, "Video Capture")
+    app = VideoCaptureApp(root, "Video Capture", source=source)
     root.mainloop()
     return app.video_bytes
 
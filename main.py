@@ -1,24 +1,53 @@
 import argparse
+import csv
+import json
 import os
 import getpass
+import sys
+from itertools import islice
 from datetime import datetime
-from core.encryption import encrypt_data
 from core.metadata import parse_unlock_time
-from core.storage import save_capsule, init_db, check_capsules
-from utils.keymanager import derive_key_from_password
+from core import kdf
+from core.storage import (
+    SORT_COLUMNS, save_capsule, init_db, check_capsules, vault_salt, get_kdf_params, set_kdf_params,
+    archive_capsules, capsule_stats, catalog_partitions, compact_packs, iter_capsules, reclaim_pending,
+)
+from utils.keymanager import (
+    KEY_SCHEME_PASSWORD, KEY_SCHEME_VAULT, derive_capsule_subkey, derive_key_from_password,
+    derive_master_key,
+)
 from core.scheduler import check_and_unlock, auto_unlock_loop
+from core.importer import import_capsules, read_manifest, scan_directory
+from utils import metrics
 from capture.text import capture_text
-from gui.photo_gui import capture_photo_gui as capture_photo
-from gui.video_gui import record_video_gui as record_video
+# capture.thumbnail and the capture GUIs pull in OpenCV, PIL and Tk; they are imported
+# where a photo or video is actually handled so headless commands start fast and run
+# without those libraries.
 
-def _derive_key_and_save(title, unlock_time, ctype, content, password):
+def _derive_key_and_save(title, unlock_time, ctype, content, password, use_vault_key=False):
     salt = os.urandom(16)
-    key = derive_key_from_password(password, salt)
-    nonce, encrypted = encrypt_data(content, key)
-    save_capsule(title, unlock_time, ctype, encrypted, nonce, salt)
+    # the vault's calibrated KDF, recorded on the capsule so later recalibration can't break it
+    kdf_params = kdf.encode_params(get_kdf_params())
+    if use_vault_key:
+        # one (cached) slow KDF for the vault master key, then a cheap HKDF per capsule
+        master_key = derive_master_key(password, vault_salt(create=True), kdf_params)
+        key = derive_capsule_subkey(master_key, salt)
+        key_scheme = KEY_SCHEME_VAULT
+    else:
+        key = derive_key_from_password(password, salt, kdf_params)
+        key_scheme = KEY_SCHEME_PASSWORD
+    thumbnail = None
+    if ctype in ("photo", "video"):
+        try:
+            from capture.thumbnail import make_thumbnail
+            thumbnail = make_thumbnail(ctype, content)
+        except Exception as e:
+            print(f"Could not create a preview thumbnail ({e}); saving without one.")
+    save_capsule(title, unlock_time, ctype, content, key, salt, key_scheme=key_scheme, kdf_params=kdf_params,
+                 thumbnail=thumbnail)
     print(f"Saved capsule '{title}' scheduled for {unlock_time.isoformat()}")
 
-def create_capsule_flow():
+def create_capsule_flow(use_vault_key=False):
     title = input("Title: ").strip()
     if not title:
         print("Title cannot be empty.")
@@ -40,13 +69,15 @@ def create_capsule_flow():
     if ctype == "text":
         content = capture_text()
     elif ctype == "photo":
+        from gui.photo_gui import capture_photo_gui as capture_photo
         content = capture_photo()
-        if content is None:
+        if not content:
             print("Photo capture cancelled or failed.")
             return
     elif ctype == "video":
+        from gui.video_gui import record_video_gui as record_video
         content = record_video()
-        if content is None:
+        if not content:
             print("Video capture cancelled or failed.")
             return
 
@@ -55,41 +86,370 @@ def create_capsule_flow():
         print("Password cannot be empty.")
         return
 
-    _derive_key_and_save(title, unlock_time, ctype, content, password)
+    _derive_key_and_save(title, unlock_time, ctype, content, password, use_vault_key=use_vault_key)
 
-def main():
-    parser = argparse.ArgumentParser(prog="timecapsule")
-    parser.add_argument(
-        "command",
-        nargs="?",
-        default="help",
-        choices=["create", "unlock", "init", "help", "check", "autounlock"],
-    )
-    parser.add_argument(
-        "--interval", type=int, default=60, help="Polling interval for autounlock (seconds)"
-    )
-    parser.add_argument(
-        "--password", type=str, default=None, help="Password for auto-unlock (use with caution!)"
-    )
-    args = parser.parse_args()
+def import_flow(path, unlock=None, password=None, use_vault_key=False, workers=None, pool="process",
+                batch_size=64, thumbnails=True):
+    """
+    Bulk-create capsules from a directory (every file, all with the `unlock` time)
+    or a JSONL manifest, without prompts other than the password.
+    """
+    if not path or not os.path.exists(path):
+        print("Give a directory or .jsonl manifest to import.")
+        return
+    try:
+        if os.path.isdir(path):
+            items = scan_directory(path, unlock)
+        else:
+            items = read_manifest(path)
+    except (OSError, ValueError) as e:
+        print(f"Cannot import: {e}")
+        return
+    if not items:
+        print("Nothing to import.")
+        return
+
+    if password is None:
+        password = getpass.getpass(f"Password for the {len(items)} imported capsules: ")
+    if not password:
+        print("Password cannot be empty.")
+        return
+
+    stats = import_capsules(items, password, use_vault_key=use_vault_key, workers=workers, pool=pool,
+                            batch_size=batch_size, thumbnails=thumbnails)
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"Imported {stats['imported']} of {stats['total']} capsules "
+          f"({stats['bytes'] / 1e6:.1f} MB) in {stats['seconds']:.2f} s: "
+          f"{stats['imported'] / seconds:.1f} capsules/s, {stats['bytes'] / 1e6 / seconds:.1f} MB/s")
+    if stats["failed"]:
+        print(f"{stats['failed']} files failed and were skipped.")
+
+def daemon_flow(action="stats", limit=10):
+    """
+    Ask the running autounlock daemon (autounlock --daemon) about its schedule, or
+    tell it to re-read the vault (notify) or check for due capsules now (check).
+    """
+    from core.daemon import query_daemon  # asyncio is only needed by the daemon commands
+    response = query_daemon(action, limit=limit)
+    if response is None:
+        print("No autounlock daemon is running for this vault (start one with: python main.py autounlock --daemon).")
+        return
+    if not response.get("ok"):
+        print(f"Daemon error: {response.get('error')}")
+        return
+    if "capsules" in response:
+        if not response["capsules"]:
+            print("No capsules.")
+        for cap in response["capsules"]:
+            print(f"ID: {cap['id']}, Title: {cap['title']}, Type: {cap['type']}, Unlock Time: {cap['unlock_time']}")
+    elif "stats" in response:
+        for name, value in response["stats"].items():
+            print(f"{name}: {value}")
+    elif action == "check":
+        print("Check scheduled.")
+    elif action == "notify":
+        print(f"Daemon reloaded its schedule ({response.get('locked')} locked capsules).")
+    else:
+        print("Daemon is running.")
+
+LIST_FIELDS = ("id", "title", "unlock_time", "type", "status", "compression", "has_thumbnail")
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _parse_filter_time(text):
+    """--from/--to accept the same formats as capsule creation (e.g. 2030-01-01, 7d)."""
+    return parse_unlock_time(text) if text else None
+
+def _filters(args):
+    return {
+        "status": args.status,
+        "capsule_type": args.type,
+        "title": args.title,
+        "unlock_from": _parse_filter_time(args.unlock_from),
+        "unlock_to": _parse_filter_time(args.unlock_to),
+    }
+
+def list_flow(args, out=sys.stdout):
+    """
+    Print capsules matching the filters as a table, JSON or CSV. Records are streamed
+    from the database and written one at a time, so output starts immediately and
+    memory stays flat however large the vault is.
+    """
+    try:
+        filters = _filters(args)
+    except ValueError as e:
+        print(f"Invalid --from/--to: {e}")
+        return
+    records = iter_capsules(sort=args.sort, descending=args.desc, **filters)
+    if args.limit is not None:
+        records = islice(records, args.limit)
+    if args.format == "json":
+        out.write("[")
+        for i, rec in enumerate(records):
+            out.write(("," if i else "") + "\n  " + json.dumps({k: _json_value(v) for k, v in rec._asdict().items()}))
+        out.write("\n]\n")
+    elif args.format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(LIST_FIELDS)
+        for rec in records:
+            writer.writerow([_json_value(v) for v in rec])
+    else:
+        count = 0
+        for rec in records:
+            count += 1
+            unlock_time = rec.unlock_time.strftime("%Y-%m-%d %H:%M") if rec.unlock_time else "?"
+            out.write(f"{rec.id:>8}  {unlock_time:<16}  {rec.status:<9}  {rec.type:<6}  {rec.title}\n")
+        if not count:
+            out.write("No capsules found.\n")
+
+def stats_flow(args, out=sys.stdout):
+    """Print capsule counts for the filters (aggregated in SQL) as text, JSON or CSV."""
+    try:
+        filters = _filters(args)
+    except ValueError as e:
+        print(f"Invalid --from/--to: {e}")
+        return
+    stats = capsule_stats(**filters)
+    if args.format == "json":
+        out.write(json.dumps(stats, default=_json_value, indent=2) + "\n")
+    elif args.format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(("status", "type", "count", "first_unlock", "last_unlock"))
+        for group in stats["groups"]:
+            writer.writerow([_json_value(group[k]) for k in ("status", "type", "count", "first_unlock", "last_unlock")])
+    else:
+        def when(dt):
+            return dt.strftime("%Y-%m-%d %H:%M") if dt else "-"
+        out.write(f"Capsules: {stats['total']} ({stats['with_thumbnail']} with thumbnails)\n")
+        for name, counts in (("By status", stats["by_status"]), ("By type", stats["by_type"])):
+            out.write(f"{name}: " + (", ".join(f"{k} {v}" for k, v in counts.items()) or "-") + "\n")
+        out.write(f"Unlock times: {when(stats['first_unlock'])} .. {when(stats['last_unlock'])}\n")
+        out.write(f"Next unlock: {when(stats['next_unlock'])}\n")
+        if stats["partitions"]:
+            out.write(f"Archive partitions: {stats['partitions']}\n")
+
+def archive_flow(keep_days=30):
+    """
+    Move fully unlocked months out of the hot catalog into read-only archive
+    partitions, so the scheduler's and the GUI's queries on the hot table stay small.
+    """
+    written = archive_capsules(keep_days=keep_days)
+    for part in written:
+        print(f"[archive] {part['period']}: moved {part['moved']} capsules ({part['capsules']} in {part['file']})")
+    partitions = catalog_partitions()
+    print(f"{sum(p['moved'] for p in written)} capsules archived; "
+          f"{len(partitions)} archive partitions hold {sum(p['capsules'] for p in partitions)} capsules.")
+
+def scrub_flow(incremental=False, max_age_days=30, workers=None, output_format="table", repair=False):
+    """
+    Verify every capsule blob against the size and digest recorded at save time and
+    list orphaned files and rows. Exits with status 1 if a blob is missing or damaged,
+    so it can run unattended (e.g. nightly with --incremental). With `repair`, first
+    reclaim what crashed saves left behind and compact wasteful pack files.
+    """
+    from core.scrub import scrub_vault
+    reclaimed, compacted = [], []
+    if repair:
+        reclaimed = reclaim_pending()
+        compacted = compact_packs()
+    report = scrub_vault(workers=workers, incremental=incremental, max_age_days=max_age_days,
+                         progress=None if output_format == "json" else print)
+    if repair:
+        report["reclaimed_pending"] = reclaimed
+        report["compacted_packs"] = compacted
+    if output_format == "json":
+        print(json.dumps(report, indent=2))
+    else:
+        if reclaimed:
+            print(f"  reclaimed {len(reclaimed)} pending capsules left by interrupted saves or imports")
+        for pack in compacted:
+            print(f"  compacted {pack['pack']}: {pack['freed'] / 1e6:.1f} MB freed, {pack['moved']} blobs moved")
+        for problem in report["problems"]:
+            print(f"  capsule {problem['id']}: {problem['kind']}: {problem['detail']}")
+        for orphan in report["orphans"]:
+            print(f"  orphan {orphan['kind']}: {orphan.get('path', orphan.get('id'))}")
+        wasted = sum(report["unreferenced_pack_bytes"].values())
+        if wasted:
+            print(f"  {wasted / 1e6:.1f} MB of pack space is not used by any capsule")
+        if report["pending"]:
+            print(f"  {report['pending']} pending capsules (an import in progress, or left by an interrupted one; "
+                  f"--repair reclaims those over an hour old)")
+        if report["recorded"]:
+            print(f"  recorded digests for {report['recorded']} capsules saved before digests were kept")
+        print(f"{report['ok']} OK, {len(report['problems'])} damaged or missing, {len(report['orphans'])} orphans.")
+    if report["problems"]:
+        sys.exit(1)
 
+def calibrate_flow(kdf_name=None, target_ms=500):
+    """
+    Benchmark the KDFs on this host and store parameters hitting `target_ms` per
+    derivation as the vault default for new capsules.
+    """
+    kdf_name = kdf_name or kdf.preferred_kdf()
+    print(f"Available KDFs: {', '.join(kdf.available_kdfs())}")
+    print(f"Calibrating {kdf_name} for ~{target_ms} ms per key derivation...")
+    params = kdf.calibrate(kdf_name, target_ms / 1000.0)
+    measured = kdf.time_kdf(params) * 1000
+    print(f"Chosen parameters: {kdf.encode_params(params)} (measured {measured:.0f} ms)")
+    set_kdf_params(kdf.encode_params(params))
+    print("Saved as the default for new capsules. Existing capsules keep their recorded parameters.")
+
+def _run_command(args):
     if args.command == "create":
-        create_capsule_flow()
+        create_capsule_flow(use_vault_key=args.vault_key)
     elif args.command == "unlock":
-        check_and_unlock()
+        check_and_unlock(auto_password=args.password, workers=args.workers, pool=args.pool)
     elif args.command == "init":
         init_db()
+        reclaimed = reclaim_pending()
+        if reclaimed:
+            print(f"Reclaimed {len(reclaimed)} pending capsules left by interrupted saves or imports.")
         print("Initialized database.")
     elif args.command == "check":
         check_capsules()
+    elif args.command == "list":
+        list_flow(args)
+    elif args.command == "stats":
+        stats_flow(args)
+    elif args.command == "import":
+        import_flow(args.target, unlock=args.unlock, password=args.password, use_vault_key=args.vault_key,
+                    workers=args.workers, pool=args.pool, batch_size=args.batch_size,
+                    thumbnails=not args.no_thumbnails)
+    elif args.command == "calibrate":
+        calibrate_flow(kdf_name=args.kdf, target_ms=args.target_ms)
+    elif args.command == "archive":
+        archive_flow(keep_days=args.keep_days)
+    elif args.command == "scrub":
+        scrub_flow(incremental=args.incremental, max_age_days=args.max_age, workers=args.workers,
+                   output_format="json" if args.format == "json" else "table", repair=args.repair)
+    elif args.command == "autounlock" and args.daemon:
+        from core.daemon import UnlockDaemon
+        UnlockDaemon(poll_interval_seconds=args.interval, auto_password=args.password,
+                     workers=args.workers, pool=args.pool,
+                     metrics_file=args.metrics_file, metrics_port=args.metrics_port).run()
     elif args.command == "autounlock":
-        auto_unlock_loop(poll_interval_seconds=args.interval, auto_password=args.password)
+        auto_unlock_loop(poll_interval_seconds=args.interval, auto_password=args.password,
+                         workers=args.workers, pool=args.pool,
+                         metrics_file=args.metrics_file, metrics_port=args.metrics_port)
+    elif args.command == "daemon":
+        daemon_flow(args.target or "stats", limit=args.limit or 10)
     else:
-        print("Usage: python main.py [create|unlock|init|autounlock]")
+        print("Usage: python main.py [create|unlock|init|check|list|stats|autounlock|calibrate|import|daemon|scrub|archive]")
         print("  create      - make a new capsule")
         print("  unlock      - check and reveal ready capsules")
         print("  init        - initialize db/storage")
+        print("  list        - list capsules (filters: --status --type --title --from --to; --format json|csv)")
+        print("  stats       - capsule counts by status and type (same filters)")
         print("  autounlock  - auto-check and unlock capsules in a loop")
+        print("  calibrate   - tune key-derivation cost for this machine")
+        print("  import      - bulk-create capsules from a directory or JSONL manifest")
+        print("  daemon      - query a running autounlock --daemon (stats|next|due|check|notify)")
+        print("  scrub       - verify every capsule blob and find orphans, no password needed (--repair)")
+        print("  archive     - move fully unlocked months into read-only archive partitions")
+
+def main():
+    parser = argparse.ArgumentParser(prog="timecapsule")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="help",
+        choices=["create", "unlock", "init", "help", "check", "list", "stats", "autounlock", "calibrate", "import",
+                 "daemon", "scrub", "archive"],
+    )
+    parser.add_argument(
+        "target", nargs="?", default=None,
+        help="import: directory or JSONL manifest; daemon: stats, next, due, check, notify or ping"
+    )
+    parser.add_argument(
+        "--interval", type=int, default=60,
+        help="Upper bound on autounlock sleep between checks (seconds); it otherwise wakes when a capsule is due"
+    )
+    parser.add_argument(
+        "--password", type=str, default=None, help="Password for auto-unlock (use with caution!)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Parallel workers for batch unlock with --password, import and scrub (default: CPU count)"
+    )
+    parser.add_argument(
+        "--pool", choices=["process", "thread"], default="process",
+        help="Worker pool type for batch unlock and import"
+    )
+    parser.add_argument(
+        "--vault-key", action="store_true",
+        help="Derive the capsule key from the vault master key (one slow KDF unlocks many capsules)"
+    )
+    parser.add_argument(
+        "--kdf", choices=kdf.available_kdfs(), default=None,
+        help="KDF to calibrate (default: strongest available)"
+    )
+    parser.add_argument(
+        "--target-ms", type=int, default=500, help="Target key-derivation latency for calibrate (milliseconds)"
+    )
+    parser.add_argument(
+        "--unlock", type=str, default=None,
+        help="Unlock time for every file of an imported directory (e.g. 30d or 2030-01-01 00:00)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=64, help="Capsules committed per transaction during import"
+    )
+    parser.add_argument(
+        "--no-thumbnails", action="store_true", help="Skip preview thumbnails for imported photos/videos"
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help="autounlock: run as an asyncio daemon with a local control socket (see the daemon command)"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="list: stop after N capsules; daemon next/due: how many (default 10)"
+    )
+    parser.add_argument("--status", choices=["locked", "unlocked"], default=None, help="list/stats: filter by status")
+    parser.add_argument("--type", default=None, help="list/stats: filter by capsule type (text, photo, video, ...)")
+    parser.add_argument("--title", default=None, help="list/stats: titles containing this text (case-insensitive)")
+    parser.add_argument("--from", dest="unlock_from", default=None,
+                        help="list/stats: unlock time at or after (e.g. 2030-01-01 00:00 or 7d)")
+    parser.add_argument("--to", dest="unlock_to", default=None, help="list/stats: unlock time at or before")
+    parser.add_argument("--sort", choices=SORT_COLUMNS, default="unlock_time", help="list: sort column")
+    parser.add_argument("--desc", action="store_true", help="list: sort descending")
+    parser.add_argument("--format", choices=["table", "json", "csv"], default="table",
+                        help="list/stats/scrub: output format (scrub: table or json)")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="scrub: only re-hash blobs that changed or were last verified more than --max-age days ago"
+    )
+    parser.add_argument(
+        "--max-age", type=float, default=30, help="scrub --incremental: re-verify blobs after this many days"
+    )
+    parser.add_argument(
+        "--repair", action="store_true",
+        help="scrub: first reclaim pending capsules left by crashed saves and compact wasteful pack files"
+    )
+    parser.add_argument(
+        "--keep-days", type=float, default=30,
+        help="archive: keep months whose last capsule unlocked within this many days in the hot catalog"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Print a per-phase timing summary when the command finishes"
+    )
+    parser.add_argument(
+        "--metrics-file", type=str, default=None,
+        help="autounlock: write Prometheus metrics to this textfile after every check"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None,
+        help="autounlock: serve Prometheus metrics on http://127.0.0.1:PORT/metrics"
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        metrics.enable()
+    try:
+        _run_command(args)
+    finally:
+        if args.profile:
+            print("\n--- Timing summary ---")
+            print(metrics.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,2 @@
+# tests/__init__.py
+# Unit tests for the on-disk formats. Run with: python -m pytest tests
@@ -0,0 +1,119 @@
+# tests/test_encryption.py
+import io
+import os
+import pytest
+from cryptography.exceptions import InvalidTag
+from core.encryption import (
+    STREAM_MAGIC, TAG_SIZE, _HEADER, decrypt_data, decrypt_stream, encrypt_data, encrypt_stream,
+)
+
+CHUNK = 16
+KEY = bytes(range(32))
+
+def _encrypt(data: bytes, chunk_size: int = CHUNK) -> bytes:
+    out = io.BytesIO()
+    encrypt_stream(data, out, KEY, chunk_size)
+    return out.getvalue()
+
+def _decrypt(blob: bytes, key: bytes = KEY, legacy_nonce: bytes = None) -> bytes:
+    out = io.BytesIO()
+    decrypt_stream(blob, out, key, legacy_nonce)
+    return out.getvalue()
+
+def _segments(blob: bytes):
+    """Split a stream blob into its header and full-size ciphertext segments."""
+    body = blob[_HEADER.size:]
+    size = CHUNK + TAG_SIZE
+    return blob[:_HEADER.size], [body[i:i + size] for i in range(0, len(body), size)]
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 3 * CHUNK + 5])
+def test_round_trip(size):
+    data = os.urandom(size)
+    blob = _encrypt(data)
+    assert blob[:4] == STREAM_MAGIC
+    # one segment per started chunk, and an empty payload still gets its final segment
+    assert len(blob) == _HEADER.size + max(1, -(-size // CHUNK)) * TAG_SIZE + size
+    assert _decrypt(blob) == data
+
+def test_round_trip_from_stream():
+    data = os.urandom(200_000)
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), out, KEY)
+    out.seek(0)
+    assert _decrypt(out) == data
+
+def test_wrong_key_fails():
+    with pytest.raises(InvalidTag):
+        _decrypt(_encrypt(b"secret" * 10), key=bytes(32))
+
+@pytest.mark.parametrize("cut", [1, TAG_SIZE, CHUNK + TAG_SIZE])
+def test_truncation_fails(cut):
+    blob = _encrypt(os.urandom(3 * CHUNK))
+    with pytest.raises(InvalidTag):
+        _decrypt(blob[:-cut])
+
+def test_header_only_fails():
+    with pytest.raises(InvalidTag):
+        _decrypt(_encrypt(b"")[:_HEADER.size])
+
+def test_reordered_segments_fail():
+    header, segments = _segments(_encrypt(os.urandom(3 * CHUNK + 5)))
+    segments[0], segments[1] = segments[1], segments[0]
+    with pytest.raises(InvalidTag):
+        _decrypt(header + b"".join(segments))
+
+def test_dropped_segment_fails():
+    header, segments = _segments(_encrypt(os.urandom(3 * CHUNK + 5)))
+    del segments[1]
+    with pytest.raises(InvalidTag):
+        _decrypt(header + b"".join(segments))
+
+@pytest.mark.parametrize("extra", [b"\x00", os.urandom(CHUNK + TAG_SIZE)])
+def test_appended_bytes_fail(extra):
+    blob = _encrypt(os.urandom(2 * CHUNK + 3))
+    with pytest.raises(InvalidTag):
+        _decrypt(blob + extra)
+
+def test_appended_copy_of_final_segment_fails():
+    # the final segment of a full-chunk payload is itself full-size, so a copy of it
+    # looks like one more segment
+    header, segments = _segments(_encrypt(os.urandom(2 * CHUNK)))
+    with pytest.raises(InvalidTag):
+        _decrypt(header + b"".join(segments) + segments[-1])
+
+def test_tampering_fails():
+    blob = bytearray(_encrypt(os.urandom(CHUNK)))
+    blob[-TAG_SIZE - 1] ^= 1  # ciphertext
+    with pytest.raises(InvalidTag):
+        _decrypt(bytes(blob))
+    blob = bytearray(_encrypt(os.urandom(CHUNK)))
+    blob[_HEADER.size - 1] ^= 1  # nonce prefix, also the associated data
+    with pytest.raises(InvalidTag):
+        _decrypt(bytes(blob))
+
+def test_unsupported_version_rejected():
+    blob = bytearray(_encrypt(b"data"))
+    blob[4] = 2
+    with pytest.raises(ValueError, match="version"):
+        _decrypt(bytes(blob))
+
+def test_legacy_single_shot_blob():
+    data = os.urandom(1000)
+    nonce, blob = encrypt_data(data, KEY)
+    assert decrypt_data(nonce, blob, KEY) == data
+    assert _decrypt(blob, legacy_nonce=nonce) == data
+
+def test_legacy_blob_needs_nonce():
+    _, blob = encrypt_data(b"old capsule", KEY)
+    with pytest.raises(ValueError, match="nonce"):
+        _decrypt(blob)
+
+def test_legacy_blob_wrong_nonce_fails():
+    _, blob = encrypt_data(b"old capsule", KEY)
+    with pytest.raises(InvalidTag):
+        _decrypt(blob, legacy_nonce=bytes(12))
+
+def test_legacy_blob_no_longer_than_header():
+    nonce, blob = encrypt_data(b"", KEY)
+    assert len(blob) <= _HEADER.size
+    assert _decrypt(blob, legacy_nonce=nonce) == b""
@@ -0,0 +1,126 @@
+# tests/test_migrations.py
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from core import scheduler, storage
+from core.encryption import derive_key, encrypt_data
+from utils.secure_temp import secure_delete
+
+PASSWORD = "correct horse"
+
+# The original (unversioned, user_version 0) schema and save path, as the first
+# release wrote them: ISO text unlock times, one single-shot AES-GCM file per
+# capsule at an absolute path, PBKDF2-SHA256/390k keys.
+_BASELINE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS capsules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        unlock_time TEXT,
+        type TEXT,
+        file_path TEXT,
+        salt BLOB,
+        nonce BLOB,
+        status TEXT
+    )
+"""
+
+def _baseline_save(conn, files, title, unlock_time, capsule_type, data, status="locked"):
+    salt = os.urandom(16)
+    nonce, encrypted = encrypt_data(data, derive_key(PASSWORD, salt))
+    file_path = files / f"{title}_{int(unlock_time.timestamp())}.tccap"
+    file_path.write_bytes(encrypted)
+    return conn.execute("""
+        INSERT INTO capsules (title, unlock_time, type, file_path, salt, nonce, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (title, unlock_time.isoformat(), capsule_type, str(file_path), salt, nonce, status)).lastrowid
+
+@pytest.fixture
+def baseline_vault(tmp_path):
+    db, files = tmp_path / "capsules.db", tmp_path / "capsule_files"
+    files.mkdir()
+    past = datetime.now().replace(microsecond=0) - timedelta(days=2)
+    conn = sqlite3.connect(db)
+    conn.execute(_BASELINE_SCHEMA)
+    capsules = {
+        "note": (past.replace(microsecond=250000), "text", b"hello from the past"),
+        "photo": (past, "photo", os.urandom(3000)),
+        "clip": (past + timedelta(hours=1), "video", os.urandom(5000)),
+        "opened": (past - timedelta(days=30), "text", b"already read"),
+        "future": (datetime(2099, 1, 1, 9, 30), "text", b"not yet"),
+    }
+    ids = {}
+    for title, (when, capsule_type, data) in capsules.items():
+        status = "unlocked" if title == "opened" else "locked"
+        ids[title] = _baseline_save(conn, files, title, when, capsule_type, data, status)
+    # a deleted newest capsule: its id must never be handed out again
+    deleted = _baseline_save(conn, files, "deleted", past, "text", b"gone")
+    conn.execute("DELETE FROM capsules WHERE id = ?", (deleted,))
+    conn.commit()
+    conn.close()
+    storage.configure(db, files)
+    yield {"db": db, "ids": ids, "capsules": capsules, "deleted": deleted}
+    storage.configure()
+
+def test_upgrade_preserves_ids_and_sequence(baseline_vault):
+    storage.init_db()
+    conn = sqlite3.connect(baseline_vault["db"])
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == storage.SCHEMA_VERSION
+    rows = dict(conn.execute("SELECT title, id FROM capsules"))
+    assert rows == baseline_vault["ids"]
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'capsules'").fetchone()[0]
+    assert seq == baseline_vault["deleted"]
+    conn.close()
+
+    new_id = storage.save_capsule("new", datetime(2099, 1, 1), "text", b"after upgrade",
+                                  os.urandom(32), os.urandom(16))
+    assert new_id == baseline_vault["deleted"] + 1
+
+def test_upgrade_converts_unlock_times_to_epoch(baseline_vault):
+    storage.init_db()
+    conn = sqlite3.connect(baseline_vault["db"])
+    stored = dict(conn.execute("SELECT title, unlock_time FROM capsules"))
+    conn.close()
+    for title, (when, _, _) in baseline_vault["capsules"].items():
+        # rounded up, so a capsule never opens before its ISO time
+        assert stored[title] == math.ceil(when.timestamp())
+        assert storage.get_capsule(baseline_vault["ids"][title])["unlock_time"] == \
+            datetime.fromtimestamp(math.ceil(when.timestamp()))
+    due = {c["title"] for c in storage.load_locked_capsules()}
+    assert due == {"note", "photo", "clip"}
+
+@pytest.mark.parametrize("workers", [1, 2])  # serial, and the batch path on a thread pool
+def test_legacy_capsules_unlock_after_upgrade(baseline_vault, monkeypatch, workers):
+    shown = {}
+
+    def display(ctype, plaintext, title):
+        if ctype == "video":
+            with open(plaintext, "rb") as f:
+                shown[title] = f.read()
+            secure_delete(plaintext)
+        else:
+            shown[title] = plaintext
+
+    monkeypatch.setattr(scheduler, "_display_plaintext_by_type", display)
+    storage.init_db()
+    assert scheduler.check_and_unlock(auto_password=PASSWORD, workers=workers, pool="thread") == 3
+    expected = baseline_vault["capsules"]
+    assert shown == {title: expected[title][2] for title in ("note", "photo", "clip")}
+    statuses = {c["title"]: c["status"] for c in storage.list_capsules(limit=100)}
+    assert statuses == {"note": "unlocked", "photo": "unlocked", "clip": "unlocked",
+                        "opened": "unlocked", "future": "locked"}
+
+def test_unreadable_unlock_time_aborts_upgrade(baseline_vault):
+    conn = sqlite3.connect(baseline_vault["db"])
+    bad = conn.execute("INSERT INTO capsules (title, unlock_time, type, status) "
+                       "VALUES ('bad', 'next tuesday', 'text', 'locked')").lastrowid
+    conn.commit()
+    conn.close()
+    with pytest.raises(RuntimeError, match=f"capsule id {bad} "):
+        storage.init_db()
+    conn = sqlite3.connect(baseline_vault["db"])
+    # rolled back: still the baseline file, untouched
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    assert conn.execute("SELECT unlock_time FROM capsules WHERE id = ?", (bad,)).fetchone()[0] == "next tuesday"
+    conn.close()
@@ -0,0 +1,168 @@
+# tests/test_storage.py
+import io
+import os
+import sqlite3
+from datetime import datetime
+import pytest
+from core import blobstore, storage
+from core.encryption import decrypt_stream
+from core.scrub import scrub_vault
+
+KEY = bytes(range(32))
+
+def _quiet(*args, **kwargs):
+    pass
+
+@pytest.fixture
+def vault(tmp_path):
+    engine = storage.configure(tmp_path / "capsules.db", tmp_path / "capsule_files")
+    storage.init_db()
+    yield engine
+    storage.configure()
+
+def _save(title, when, data, capsule_type="text"):
+    return storage.save_capsule(title, when, capsule_type, data, KEY, os.urandom(16))
+
+def _read(capsule_id) -> bytes:
+    cap = storage.get_capsule(capsule_id)
+    out = io.BytesIO()
+    with storage.open_encrypted_blob(cap["file_path"]) as blob:
+        decrypt_stream(blob, out, KEY, legacy_nonce=cap["nonce"])
+    return out.getvalue()
+
+def _set(engine, capsule_id, **columns):
+    with engine.transaction() as conn:
+        for column, value in columns.items():
+            conn.execute(f"UPDATE capsules SET {column} = ? WHERE id = ?", (value, capsule_id))
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+def _pages(limit, **query):
+    """Every id, following the keyset cursor `limit` rows at a time."""
+    ids, after = [], None
+    while True:
+        page = storage.list_capsules(after=after, limit=limit, **query)
+        ids += _ids(page)
+        if len(page) < limit:
+            return ids
+        after = page[-1]["cursor"]
+
+# --- pack compaction ---
+
+@pytest.fixture
+def wasted_packs(vault, monkeypatch):
+    """Photo capsules in several small packs, with unreferenced bytes between them."""
+    monkeypatch.setattr(blobstore, "PACK_FILE_MAX", 200_000)
+    contents = {}
+    for i in range(10):
+        data = os.urandom(20_000 + i)  # incompressible, between the inline and pack limits
+        contents[_save(f"photo {i}", datetime(2099, 1, 1), data, "photo")] = data
+        vault.blobs.append_to_pack(os.urandom(30_000))  # what a discarded save leaves
+    return contents
+
+def test_compaction_keeps_blobs_readable(vault, wasted_packs):
+    packs_before = sorted(p.name for p in vault.blobs.packs_path.glob("pack-*.pack"))
+    results = storage.compact_packs()
+    assert results and sum(r["moved"] for r in results) > 0
+    removed = {r["pack"] for r in results}
+    assert removed <= set(packs_before[:-1])  # never the pack saves append to
+    for name in removed:
+        assert not (vault.blobs.packs_path / name).exists()
+    for capsule_id, data in wasted_packs.items():
+        locator = storage.get_capsule(capsule_id)["file_path"]
+        assert locator.split(":")[1] not in removed
+        assert _read(capsule_id) == data
+    report = scrub_vault(progress=_quiet)
+    assert report["problems"] == []
+    assert report["orphans"] == []
+
+def test_compaction_resets_scrub_state_of_moved_blobs(vault, wasted_packs):
+    assert scrub_vault(progress=_quiet)["problems"] == []
+    assert scrub_vault(incremental=True, progress=_quiet)["hashed"] == 0
+    moved = sum(r["moved"] for r in storage.compact_packs())
+    report = scrub_vault(incremental=True, progress=_quiet)
+    assert report["problems"] == []
+    assert report["hashed"] == moved
+
+def test_compaction_leaves_tidy_packs_alone(vault):
+    for i in range(3):
+        _save(f"photo {i}", datetime(2099, 1, 1), os.urandom(20_000), "photo")
+    assert storage.compact_packs() == []
+
+# --- archive partitions ---
+
+# (title, unlock time, status); None titles and unlock times check NULL ordering
+ARCHIVE_FIXTURE = [
+    ("march", datetime(2024, 3, 5, 8), "unlocked"),
+    (None, datetime(2024, 1, 15, 12), "unlocked"),
+    ("january", datetime(2024, 1, 20, 9), "unlocked"),
+    ("february", datetime(2024, 2, 10, 18), "unlocked"),
+    (None, datetime(2024, 2, 10, 18), "unlocked"),
+    ("january", datetime(2024, 1, 2, 7), "unlocked"),
+    ("future", datetime(2099, 5, 1), "locked"),
+    (None, datetime(2099, 6, 1), "locked"),
+    ("no date", None, "locked"),
+    ("recent", datetime.now().replace(microsecond=0), "unlocked"),
+]
+
+@pytest.fixture
+def archived(vault):
+    """ARCHIVE_FIXTURE saved, then its three 2024 months archived. Yields the ids by sort order before archiving."""
+    for title, when, status in ARCHIVE_FIXTURE:
+        capsule_id = _save("placeholder", when or datetime(2099, 1, 1), b"x" * 10)
+        _set(vault, capsule_id, title=title, status=status)
+        if when is None:
+            _set(vault, capsule_id, unlock_time=None)
+    orders = {(sort, desc): _ids(storage.list_capsules(sort=sort, descending=desc, limit=1000))
+              for sort in storage.SORT_COLUMNS for desc in (False, True)}
+    results = storage.archive_capsules(keep_days=30)
+    assert [r["period"] for r in results] == ["2024-01", "2024-02", "2024-03"]
+    assert sum(r["moved"] for r in results) == 6
+    yield orders
+
+def test_archive_moves_only_finished_months(vault, archived):
+    hot = [r[0] for r in vault.connection().execute("SELECT title FROM main.capsules ORDER BY id")]
+    assert hot == ["future", None, "no date", "recent"]
+    assert storage.count_capsules() == len(ARCHIVE_FIXTURE)
+    assert storage.count_capsules(status="locked") == 3
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort", storage.SORT_COLUMNS)
+def test_archive_keeps_merged_order(archived, sort, descending):
+    expected = archived[(sort, descending)]
+    assert _ids(storage.list_capsules(sort=sort, descending=descending, limit=1000)) == expected
+    assert [rec.id for rec in storage.iter_capsules(sort=sort, descending=descending)] == expected
+
+@pytest.mark.parametrize("limit", [1, 2, 3])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort", storage.SORT_COLUMNS)
+def test_paging_across_partitions(archived, sort, descending, limit):
+    assert _pages(limit, sort=sort, descending=descending) == archived[(sort, descending)]
+
+def test_paging_with_null_sort_values(vault):
+    # one hot table, so only the keyset clause decides what each page holds
+    ids = [_save(f"c{i}", datetime(2099, 1, 1 + i % 3), b"x") for i in range(9)]
+    for capsule_id in ids[::2]:
+        _set(vault, capsule_id, title=None, type=None, unlock_time=None)
+    for sort in storage.SORT_COLUMNS:
+        for descending in (False, True):
+            full = _ids(storage.list_capsules(sort=sort, descending=descending, limit=100))
+            assert sorted(full) == ids
+            assert _pages(2, sort=sort, descending=descending) == full
+
+def test_archived_rows_still_in_hot_table_are_not_duplicated(vault, archived):
+    # what a crash between the copy into a partition and the hot delete leaves behind
+    partition = storage.catalog_partitions()[0]
+    columns = ", ".join(storage.ARCHIVE_COLUMNS)
+    conn = sqlite3.connect(vault.db_path)
+    conn.execute("ATTACH DATABASE ? AS cold", (str(vault.archive_path / partition["file"]),))
+    conn.execute(f"INSERT INTO main.capsules ({columns}) SELECT {columns} FROM cold.capsules")
+    conn.commit()
+    conn.close()
+    assert storage.count_capsules() == len(ARCHIVE_FIXTURE)
+    for (sort, descending), expected in archived.items():
+        assert _pages(2, sort=sort, descending=descending) == expected
+    # re-running completes the move
+    storage.archive_capsules(keep_days=30)
+    assert vault.connection().execute("SELECT COUNT(*) FROM main.capsules").fetchone()[0] == 4
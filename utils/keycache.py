@@ -0,0 +1,61 @@
+# utils/keycache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+def _zeroize(buf: bytearray):
+    for i in range(len(buf)):
+        buf[i] = 0
+
+class KeyCache:
+    """
+    Small in-process cache for derived keys, with TTL expiry and LRU eviction.
+    Keys are held in bytearrays that are overwritten with zeros when they expire,
+    are evicted or the cache is cleared. Best-effort only: copies handed out to
+    callers as bytes cannot be wiped.
+    """
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 8):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # cache_key -> (expires_at, bytearray)
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now: float):
+        for cache_key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            _zeroize(self._entries.pop(cache_key)[1])
+
+    def get(self, cache_key: Hashable):
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(cache_key)
+            return bytes(entry[1])
+
+    def put(self, cache_key: Hashable, key: bytes):
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                _zeroize(old[1])
+            self._entries[cache_key] = (now + self.ttl_seconds, bytearray(key))
+            while len(self._entries) > self.max_entries:
+                _zeroize(self._entries.popitem(last=False)[1][1])
+
+    def get_or_derive(self, cache_key: Hashable, derive: Callable[[], bytes]) -> bytes:
+        """Return the cached key, or run derive() once and cache its result."""
+        key = self.get(cache_key)
+        if key is None:
+            key = derive()
+            self.put(cache_key, key)
+        return key
+
+    def clear(self):
+        with self._lock:
+            for _, buf in self._entries.values():
+                _zeroize(buf)
+            self._entries.clear()
@@ -1,28 +1,97 @@
+import atexit
 import getpass
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import hashlib
+import hmac
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
+from core import kdf
+from utils.keycache import KeyCache
 
-def derive_key_from_password(password: str, salt: bytes) -> bytes:
+# How a capsule's key is derived (stored per capsule in the `key_scheme` column).
+# The password KDF and its cost are recorded separately, in `kdf_params`.
+KEY_SCHEME_PASSWORD = "pbkdf2"      # KDF(password, capsule salt) - one slow KDF per capsule (historical name)
+KEY_SCHEME_VAULT = "vault-hkdf"     # HKDF(master key, capsule salt); master = KDF(password, vault salt)
+
+_SUBKEY_INFO = b"epoch-capsule/v1/capsule-key"
+_THUMBNAIL_INFO = b"epoch-capsule/v1/thumbnail-key"
+
+# Master keys, keyed by an HMAC of the password so the password itself is never cached.
+_master_keys = KeyCache(ttl_seconds=300, max_entries=4)
+atexit.register(_master_keys.clear)
+
+def derive_key_from_password(password: str, salt: bytes, kdf_params=None) -> bytes:
+    """
+    Derive a 32-byte key from password and salt.
+    `kdf_params` selects the KDF and its cost (see core.kdf); None means the
+    original PBKDF2-SHA256 at 390,000 iterations.
+    """
+    if not salt or len(salt) < 8:
+        raise ValueError("Invalid salt provided for key derivation.")
+    return kdf.derive(password, salt, kdf_params)
+
+def derive_master_key(password: str, vault_salt: bytes, kdf_params=None) -> bytes:
+    """
+    Derive (or fetch from the in-process cache) the vault master key.
+    Only the first call per password and KDF parameters within the cache TTL pays
+    for the slow KDF.
+    """
+    cache_key = (vault_salt, kdf.encode_params(kdf_params),
+                 hmac.new(vault_salt, password.encode(), hashlib.sha256).digest())
+    return _master_keys.get_or_derive(
+        cache_key, lambda: derive_key_from_password(password, vault_salt, kdf_params)
+    )
+
+def derive_capsule_subkey(master_key: bytes, salt: bytes) -> bytes:
     """
-    Derive a 32-byte key from password and salt using PBKDF2.
+    Derive a capsule's 32-byte key from the vault master key with HKDF-SHA256,
+    using the capsule's own salt.
     """
     if not salt or len(salt) < 8:
         raise ValueError("Invalid salt provided for key derivation.")
-    kdf = PBKDF2HMAC(
+    return HKDF(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=390000,
+        info=_SUBKEY_INFO,
         backend=default_backend()
-    )
-    key = kdf.derive(password.encode())
-    return key
+    ).derive(master_key)
+
+def derive_thumbnail_key(capsule_key: bytes) -> bytes:
+    """
+    Derive the key a capsule's thumbnail is encrypted with from the capsule key
+    (HKDF-SHA256), so the thumbnail and the payload never share a key.
+    """
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=_THUMBNAIL_INFO,
+        backend=default_backend()
+    ).derive(capsule_key)
+
+def derive_capsule_key(password: str, salt: bytes, key_scheme: str = KEY_SCHEME_PASSWORD,
+                       vault_salt: bytes = None, kdf_params=None) -> bytes:
+    """
+    Derive the key for a capsule according to its key scheme and KDF parameters.
+    """
+    if key_scheme == KEY_SCHEME_VAULT:
+        if vault_salt is None:
+            raise ValueError("Capsule uses the vault master key but the vault has no salt.")
+        return derive_capsule_subkey(derive_master_key(password, vault_salt, kdf_params), salt)
+    if key_scheme == KEY_SCHEME_PASSWORD:
+        return derive_key_from_password(password, salt, kdf_params)
+    raise ValueError(f"Unknown key scheme: {key_scheme}")
+
+def clear_key_cache():
+    """Forget (and zero) all cached master keys."""
+    _master_keys.clear()
 
-def prompt_password_and_derive(salt: bytes) -> bytes:
+def prompt_password_and_derive(salt: bytes, key_scheme: str = KEY_SCHEME_PASSWORD,
+                               vault_salt: bytes = None, kdf_params=None) -> bytes:
     """
     Prompts user for password and returns derived key.
     """
     # Use getpass so password isn't echoed
     pwd = getpass.getpass("Enter password to unlock this capsule: ")
-    return derive_key_from_password(pwd, salt)
+    return derive_capsule_key(pwd, salt, key_scheme, vault_salt, kdf_params)
@@ -0,0 +1,199 @@
+# utils/metrics.py
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+# In-process timers, counters, gauges and histograms for the create/unlock hot paths.
+# Disabled by default: every recording call then returns after one flag check and
+# timer() hands out a shared no-op context manager. Enabled by --profile or by the
+# autounlock metrics exporters.
+
+PREFIX = "epoch_capsule_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "save_seconds": "Time spent saving a capsule, by phase (reserve, encrypt, publish).",
+    "capsules_saved_total": "Capsules saved.",
+    "unlock_seconds": "Time spent unlocking capsules, by phase (master_key, key, blob_open, decrypt, display, db_update).",
+    "capsules_unlocked_total": "Capsules unlocked.",
+    "unlock_failures_total": "Capsules that failed to unlock, by reason.",
+    "autounlock_checks_total": "Due-capsule checks run by the autounlock loop.",
+    "autounlock_next_due_seconds": "Seconds until the next locked capsule is due (-1 if none).",
+}
+
+_enabled = False
+_lock = threading.Lock()
+_counters: Dict[Tuple, float] = {}
+_gauges: Dict[Tuple, float] = {}
+_histograms: Dict[Tuple, "_Histogram"] = {}
+
+class _Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(DEFAULT_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+def _key(name: str, labels: dict) -> Tuple:
+    return (name, tuple(sorted(labels.items())))
+
+def inc(name: str, amount: float = 1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def set_gauge(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = _Histogram()
+        hist.add(value)
+
+class _Timer:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name: str, **labels):
+    """Context manager recording the block's duration (seconds) in histogram `name`."""
+    return _Timer(name, labels) if _enabled else _NULL_TIMER
+
+def _labels(labels: Tuple, extra: Tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    described = set()
+
+    def header(name, kind):
+        if name not in described:
+            described.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), value in sorted(_gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for (name, labels), hist in sorted(_histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, hist.counts):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, (('le', '+Inf'),))} {hist.count}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {hist.sum}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path: str):
+    """Write the metrics for node_exporter's textfile collector (atomically, via rename)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+def serve_http(port: int, host: str = "127.0.0.1"):
+    """Serve GET /metrics on a daemon thread; call .shutdown() on the result to stop."""
+    # http.server is only imported by the exporters; it costs ~25 ms at startup otherwise
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def summary() -> str:
+    """Human-readable per-phase timing table for --profile."""
+    with _lock:
+        hists = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    if not hists and not counters:
+        return "No timings recorded."
+    lines = [f"{'phase':<40} {'count':>6} {'total':>10} {'mean':>10} {'max':>10}"]
+    for (name, labels), hist in hists:
+        label = name + _labels(labels)
+        lines.append(f"{label:<40} {hist.count:>6} {hist.sum:>9.3f}s "
+                     f"{hist.sum / hist.count * 1000:>8.1f}ms {hist.max * 1000:>8.1f}ms")
+    for (name, labels), value in counters:
+        lines.append(f"{name + _labels(labels):<40} {value:>6g}")
+    return "\n".join(lines)
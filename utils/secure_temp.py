@@ -1,43 +1,168 @@
 # utils/secure_temp.py
-import tempfile
 import os
+import shutil
 import stat
+import tempfile
+import threading
+from typing import Optional
+
+# Backends for plaintext temp files, fastest first:
+#   memfd - anonymous memory (Linux memfd_create) reached through a /proc/self/fd
+#           symlink; never on disk, but the path is only valid in this process.
+#   tmpfs - a file on a RAM-backed filesystem (/dev/shm); usable by other processes.
+#   disk  - a regular temp file, overwritten with zeros on delete.
+MEMFD = "memfd"
+TMPFS = "tmpfs"
+DISK = "disk"
+TMPFS_DIR = "/dev/shm"
+OVERWRITE_CHUNK = 1 << 20
+# Memory backends are skipped when the expected size exceeds this share of free RAM.
+MEMORY_FRACTION = 0.25
+
+_lock = threading.Lock()
+_open_files = {}  # path -> (backend, memfd or None, symlink dir or None)
+
+def _has_memfd() -> bool:
+    return hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+
+def _has_tmpfs() -> bool:
+    return os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK | os.X_OK)
+
+def _free_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
 
-def create_secure_temp_file(contents: bytes, suffix: str = "") -> str:
+def _fits_in_memory(size_hint: Optional[int], backend: str) -> bool:
+    if size_hint is None:
+        return True
+    free = _free_memory()
+    if free is not None and size_hint > free * MEMORY_FRACTION:
+        return False
+    if backend == TMPFS:
+        st = os.statvfs(TMPFS_DIR)
+        return size_hint <= st.f_bavail * st.f_frsize
+    return True
+
+def available_backends(shared: bool = False) -> list:
+    """Backends usable here, fastest first. `shared`: the path must work in other processes."""
+    backends = []
+    if _has_memfd() and not shared:
+        backends.append(MEMFD)
+    if _has_tmpfs():
+        backends.append(TMPFS)
+    backends.append(DISK)
+    return backends
+
+def choose_backend(size_hint: Optional[int] = None, shared: bool = False) -> str:
+    """The fastest backend that can hold about `size_hint` bytes (unknown size: assume it fits)."""
+    for backend in available_backends(shared):
+        if backend == DISK or _fits_in_memory(size_hint, backend):
+            return backend
+    return DISK
+
+def open_secure_temp_file(suffix: str = "", backend: Optional[str] = None,
+                          size_hint: Optional[int] = None, shared: bool = False):
     """
-    Create a temp file with given bytes, return absolute path.
-    File is created with restrictive permissions.
-    Caller is responsible for calling secure_delete(path) afterwards.
+    Create an empty temp file with restrictive permissions and open it for writing.
+    Returns (file_object, absolute_path); caller closes the file and calls
+    secure_delete(path) afterwards. `backend` defaults to choose_backend(size_hint, shared).
     """
-    fd, path = tempfile.mkstemp(suffix=suffix)
+    backend = backend or choose_backend(size_hint, shared)
+    if backend == MEMFD:
+        fd = os.memfd_create("epoch-capsule", os.MFD_CLOEXEC)
+        try:
+            # OpenCV/FFmpeg pick the container from the extension, so expose the memfd
+            # under a named symlink
+            link_dir = tempfile.mkdtemp()
+            path = os.path.join(link_dir, "data" + suffix)
+            os.symlink(f"/proc/self/fd/{fd}", path)
+            f = os.fdopen(os.dup(fd), "wb")
+        except Exception:
+            os.close(fd)
+            raise
+        with _lock:
+            _open_files[path] = (MEMFD, fd, link_dir)
+        return f, path
+
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=TMPFS_DIR if backend == TMPFS else None)
     try:
         # set restrictive permissions (owner read/write only)
         if hasattr(os, "fchmod"):
             os.fchmod(fd, stat.S_IRUSR | stat.S_IWUSR)
-        with os.fdopen(fd, "wb") as f:
-            f.write(contents)
+        f = os.fdopen(fd, "wb")
     except Exception:
         try:
+            os.close(fd)
             os.remove(path)
         except Exception:
             pass
         raise
+    with _lock:
+        _open_files[path] = (backend, None, None)
+    return f, path
+
+def create_secure_temp_file(contents: bytes, suffix: str = "", backend: Optional[str] = None,
+                            shared: bool = False) -> str:
+    """
+    Create a temp file with given bytes, return absolute path.
+    File is created with restrictive permissions.
+    Caller is responsible for calling secure_delete(path) afterwards.
+    """
+    f, path = open_secure_temp_file(suffix=suffix, backend=backend, size_hint=len(contents), shared=shared)
+    try:
+        with f:
+            f.write(contents)
+    except Exception:
+        secure_delete(path)
+        raise
     return path
 
+def _entry(path: str, pop: bool = False):
+    with _lock:
+        entry = _open_files.pop(path, None) if pop else _open_files.get(path)
+    if entry is not None:
+        return entry
+    # created by another process (e.g. a pool worker); tmpfs paths are recognisable
+    if os.path.dirname(os.path.abspath(path)) == TMPFS_DIR:
+        return TMPFS, None, None
+    return DISK, None, None
+
+def temp_backend(path: str) -> str:
+    """Backend of a path from open_secure_temp_file (DISK for any other path)."""
+    return _entry(path)[0]
+
+def _overwrite(path: str):
+    """Zero the file in OVERWRITE_CHUNK pieces, so memory use does not grow with its size."""
+    length = os.path.getsize(path)
+    zeros = memoryview(bytes(min(length, OVERWRITE_CHUNK)))
+    with open(path, "r+b") as f:
+        remaining = length
+        while remaining > 0:
+            n = min(remaining, len(zeros))
+            f.write(zeros[:n])
+            remaining -= n
+        f.flush()
+        os.fsync(f.fileno())
+
 def secure_delete(path: str):
     """
-    Overwrite file with zeros and remove it.
+    Destroy a temp file. Memory-backed files are simply released (the kernel zeroes
+    freed pages before reuse, though they may have been swapped out); disk files are
+    overwritten with zeros and removed.
     Best-effort — OS/filesystem may still keep copies.
     """
+    backend, fd, link_dir = _entry(path, pop=True)
+    if backend == MEMFD:
+        shutil.rmtree(link_dir, ignore_errors=True)
+        os.close(fd)
+        return
     try:
         if not os.path.exists(path):
             return
-        length = os.path.getsize(path)
-        with open(path, "r+b") as f:
-            f.seek(0)
-            f.write(b"\x00" * length)
-            f.flush()
-            os.fsync(f.fileno())
+        if backend == DISK:
+            _overwrite(path)
         os.remove(path)
     except Exception:
         # Last resort: try to remove